@@ -5,13 +5,10 @@ from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.core.database import get_db
-from app.core.security import decode_token
-from app.models.user import User
-from app.services.auth_service import auth_service
+from app.core.database import get_db, get_session_factory
+from app.services.auth_service import AuthPrincipal, auth_service
 
 security = HTTPBearer()
 
@@ -19,31 +16,24 @@ security = HTTPBearer()
 async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     db: Annotated[AsyncSession, Depends(get_db)],
-) -> User:
-    """Получение текущего аутентифицированного пользователя"""
+) -> AuthPrincipal:
+    """
+    Получение текущего аутентифицированного пользователя
+
+    Возвращает краткие данные из кеша (без запроса к БД в установившемся
+    режиме); полная модель User загружается в endpoint при необходимости.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        token = credentials.credentials
-        payload = decode_token(token)
-
-        if payload.get("type") != "access":
-            raise credentials_exception
-
-        sub = payload.get("sub")
-        if sub is None:
-            raise credentials_exception
-
-        user_id: int = int(sub)
-
-    except (JWTError, ValueError):
+    user_id = auth_service.get_user_id_from_access_token(credentials.credentials)
+    if user_id is None:
         raise credentials_exception
 
-    user = await auth_service.get_user_by_id(db, user_id)
+    user = await auth_service.get_principal(db, user_id)
 
     if user is None:
         raise credentials_exception
@@ -57,8 +47,8 @@ async def get_current_user(
 
 
 async def get_current_active_superuser(
-    current_user: Annotated[User, Depends(get_current_user)]
-) -> User:
+    current_user: Annotated[AuthPrincipal, Depends(get_current_user)]
+) -> AuthPrincipal:
     """Проверка что текущий пользователь - суперпользователь"""
     if not current_user.is_superuser:
         raise HTTPException(
@@ -68,5 +58,8 @@ async def get_current_active_superuser(
 
 
 # Type aliases for convenience
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[AuthPrincipal, Depends(get_current_user)]
 DBSession = Annotated[AsyncSession, Depends(get_db)]
+SessionFactory = Annotated[
+    async_sessionmaker[AsyncSession], Depends(get_session_factory)
+]
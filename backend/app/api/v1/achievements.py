@@ -1,16 +1,19 @@
 """
 Endpoints для достижений
 """
-from fastapi import APIRouter, HTTPException, status
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Response, status
 
 from app.api.deps import CurrentUser, DBSession
+from app.core.config import settings
 from app.schemas.achievement import (
     AchievementDetail,
     ShareAchievementRequest,
     ShareAchievementResponse,
     UserAchievementsList,
 )
-from app.services.achievement_service import achievement_service
+from app.services.achievement_service import SharePayload, achievement_service
 
 router = APIRouter()
 
@@ -83,11 +86,29 @@ async def get_achievement_detail(
     )
 
 
+def _share_response(
+    payload: SharePayload, if_none_match: str | None, cache_control: str
+) -> Response:
+    """Ответ с карточкой шаринга или 304, если у клиента та же версия"""
+    headers = {"ETag": payload.etag, "Cache-Control": cache_control}
+
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or payload.etag in (tag.strip() for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=payload.body, media_type="application/json", headers=headers
+    )
+
+
 @router.post("/share", response_model=ShareAchievementResponse)
 async def share_achievement(
     request: ShareAchievementRequest,
     current_user: CurrentUser,
     db: DBSession,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     """
     Генерация карточки для шаринга достижения в соцсетях
@@ -98,18 +119,48 @@ async def share_achievement(
     - Дату получения
     - Процент редкости
     - Готовый текст для шаринга
+
+    Ссылка для соцсетей: GET /achievements/share/{user_id}/{achievement_code}
     """
-    share_data = await achievement_service.get_share_data(
+    payload = await achievement_service.get_share_payload(
         db, request.achievement_code, current_user.id
     )
 
-    if not share_data:
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Достижение не найдено или не получено",
+        )
+
+    return _share_response(payload, if_none_match, "private, no-cache")
+
+
+@router.get(
+    "/share/{user_id}/{achievement_code}", response_model=ShareAchievementResponse
+)
+async def get_shared_achievement(
+    user_id: int,
+    achievement_code: str,
+    db: DBSession,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Публичная карточка полученного достижения (ссылка для соцсетей)
+
+    Отдается с ETag и Cache-Control: повторные запросы с If-None-Match
+    получают 304 без тела.
+    """
+    payload = await achievement_service.get_share_payload(db, achievement_code, user_id)
+
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Достижение не найдено или не получено",
         )
 
-    return ShareAchievementResponse(**share_data)
+    return _share_response(
+        payload, if_none_match, f"public, max-age={settings.ACHIEVEMENT_SHARE_MAX_AGE}"
+    )
 
 
 @router.post("/check")
@@ -19,24 +19,15 @@ async def register(
     db: DBSession,
 ):
     """Регистрация нового пользователя"""
-    # Проверяем существование пользователя
-    existing_user = await auth_service.get_user_by_username(db, request.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким именем уже существует",
+    try:
+        user = await auth_service.create_user(
+            db=db,
+            username=request.username,
+            email=request.email,
+            password=request.password,
         )
-
-    existing_email = await auth_service.get_user_by_email(db, request.email)
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Email уже используется"
-        )
-
-    # Создаем пользователя
-    user = await auth_service.create_user(
-        db=db, username=request.username, email=request.email, password=request.password
-    )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return user
 
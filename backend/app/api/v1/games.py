@@ -1,6 +1,9 @@
 """
 Endpoints для игр
 """
+import asyncio
+from typing import Annotated
+
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -9,8 +12,9 @@ from fastapi import (
     WebSocketDisconnect,
     status,
 )
+from fastapi.responses import StreamingResponse
 
-from app.api.deps import CurrentUser, DBSession
+from app.api.deps import CurrentUser, DBSession, SessionFactory
 from app.models.game import GameMode, GameStatus
 from app.schemas.game import (
     GameCreate,
@@ -21,9 +25,15 @@ from app.schemas.game import (
     GameMoveResponse,
     GamePublic,
 )
+from app.services.game_rpc_service import game_rpc_service
 from app.services.game_service import game_service
-from app.services.websocket_service import websocket_manager
+from app.services.spectator_service import Spectator, spectator_hub
+from app.services.websocket_service import (
+    SLOW_CONSUMER_CLOSE_CODE,
+    websocket_manager,
+)
 from app.services.wikipedia_service import wikipedia_service
+from app.services.ws_protocol import negotiate
 
 router = APIRouter()
 
@@ -45,6 +55,7 @@ async def create_game(
             max_steps=game_data.max_steps,
             time_limit=game_data.time_limit,
             max_players=game_data.max_players,
+            batch_tick_ms=game_data.batch_tick_ms,
         )
 
         return game
@@ -60,28 +71,36 @@ async def list_games(
     mode: GameMode | None = None,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
 ):
-    """Получение списка игр"""
+    """
+    Получение списка игр
+
+    Для листания используйте next_cursor из предыдущего ответа (keyset-пагинация);
+    page поддерживается для совместимости. total приблизительный.
+    """
     skip = (page - 1) * page_size
 
-    games, total = await game_service.list_games(
-        db=db,
-        status=status_filter,
-        mode=mode,
-        skip=skip,
-        limit=page_size,
-    )
+    try:
+        games, total, next_cursor = await game_service.list_games(
+            db=db,
+            status=status_filter,
+            mode=mode,
+            skip=skip,
+            limit=page_size,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    games_public = [
-        GamePublic(**game.__dict__, participants_count=len(game.participants))
-        for game in games
-    ]
+    games_public = [GamePublic.model_validate(game) for game in games]
 
     return GameListResponse(
         games=games_public,
         total=total,
         page=page,
         page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
@@ -263,6 +282,7 @@ async def make_move(
             username=current_user.username,
             article=move_data.article,
             steps=participant.steps_count,
+            batch_tick_ms=await game_service.get_batch_tick_ms(db, game_id),
         )
 
         # Если победа - уведомляем
@@ -273,6 +293,9 @@ async def make_move(
                 time=participant.time_taken or 0,
                 steps=participant.steps_count,
             )
+            # Последний дошедший до цели игрок завершает игру
+            if await game_service.all_participants_finished(db, game_id):
+                await game_service.finish_game(db, game_id)
 
         return GameMoveResponse(
             success=True,
@@ -290,27 +313,133 @@ async def make_move(
 async def game_websocket(
     websocket: WebSocket,
     game_id: int,
-    db: DBSession,
+    session_factory: SessionFactory,
+    token: Annotated[str | None, Query(description="Access токен игрока")] = None,
+    since: Annotated[
+        int | None, Query(ge=0, description="Номер последнего полученного события")
+    ] = None,
 ):
-    """WebSocket для real-time обновлений игры"""
-    # Проверяем существование игры
-    game = await game_service.get_game(db, game_id)
+    """
+    WebSocket для real-time обновлений игры и ходов игрока
 
-    if not game:
-        await websocket.close(code=1008, reason="Game not found")
-        return
+    Токен проверяется один раз при подключении. Без токена соединение
+    только получает события игры, с токеном - может делать ходы (RPC).
+    Формат исходящих сообщений согласуется через подпротокол (JSON/msgpack).
+
+    При переподключении клиент передает since и получает только
+    пропущенные события (или снимок состояния, если пропущено слишком много).
+
+    Сессия БД не держится все время соединения: она открывается только
+    для проверки при подключении и на время обработки каждого запроса.
+    """
+    context = None
+
+    async with session_factory() as db:
+        # Проверяем существование игры
+        game = await game_service.get_game(db, game_id)
+
+        if not game:
+            await websocket.close(code=1008, reason="Game not found")
+            return
+
+        if token is not None:
+            context = await game_rpc_service.authenticate(db, game_id, token)
+            if context is None:
+                await websocket.close(code=1008, reason="Invalid token")
+                return
 
     # Подключаемся
-    await websocket_manager.connect(websocket, game_id)
+    await websocket_manager.connect(
+        websocket,
+        game_id,
+        resuming=since is not None,
+        subprotocol=negotiate(websocket.scope.get("subprotocols", [])),
+        user_id=context.user_id if context else None,
+    )
+
+    if since is not None:
+
+        async def load_snapshot() -> dict:
+            async with session_factory() as db:
+                return await game_service.get_snapshot(db, game_id) or {}
+
+        await websocket_manager.resume(websocket, game_id, since, load_snapshot)
 
     try:
         while True:
-            # Просто держим соединение открытым
-            # Все сообщения отправляются через websocket_manager
-            _ = await websocket.receive_text()
+            raw = await websocket.receive_text()
+            websocket_manager.touch(websocket)
 
-            # Можно обрабатывать входящие сообщения от клиента
-            # Например, ping/pong для keep-alive
+            async with session_factory() as db:
+                response = await game_rpc_service.handle(db, game_id, context, raw)
+            if response is not None:
+                await websocket_manager.send_personal_message(response, websocket)
 
     except WebSocketDisconnect:
+        pass
+    finally:
         websocket_manager.disconnect(websocket, game_id)
+
+
+async def _join_spectators(session_factory: SessionFactory, game_id: int):
+    async def load_snapshot() -> dict | None:
+        async with session_factory() as db:
+            return await game_service.get_snapshot(db, game_id)
+
+    return await spectator_hub.join(game_id, load_snapshot)
+
+
+async def _send_spectator_frames(websocket: WebSocket, spectator: Spectator):
+    while True:
+        frame = await spectator.queue.get()
+        if frame is None:
+            # Зритель не успевал читать и был отключен
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+            return
+        await websocket.send_text(frame)
+
+
+@router.websocket("/{game_id}/spectate")
+async def spectate_game_websocket(
+    websocket: WebSocket,
+    game_id: int,
+    session_factory: SessionFactory,
+):
+    """
+    WebSocket для зрителей
+
+    Первый кадр - компактный снимок игры, далее дельты состояния
+    участников не чаще раза в SPECTATOR_THROTTLE_MS.
+    """
+    spectator = await _join_spectators(session_factory, game_id)
+    if spectator is None:
+        await websocket.close(code=1008, reason="Game not found")
+        return
+
+    await websocket.accept()
+    sender = asyncio.create_task(_send_spectator_frames(websocket, spectator))
+
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        await spectator_hub.leave(game_id, spectator)
+
+
+@router.get("/{game_id}/spectate/stream")
+async def spectate_game_stream(game_id: int, session_factory: SessionFactory):
+    """Трансляция для зрителей через Server-Sent Events (те же кадры, что в WS)"""
+    spectator = await _join_spectators(session_factory, game_id)
+    if spectator is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Игра не найдена"
+        )
+
+    return StreamingResponse(
+        spectator_hub.stream(game_id, spectator),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
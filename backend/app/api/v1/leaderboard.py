@@ -1,11 +1,13 @@
 """
 Endpoints для таблицы лидеров
 """
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, status
 
 from app.api.deps import DBSession
+from app.models.leaderboard import LeaderboardWindow
+from app.schemas.leaderboard import LeaderboardPosition, LeaderboardRank
 from app.schemas.user import UserPublic
-from app.services.game_service import game_service
+from app.services.leaderboard_service import leaderboard_service
 
 router = APIRouter()
 
@@ -14,7 +16,42 @@ router = APIRouter()
 async def get_leaderboard(
     db: DBSession,
     limit: int = Query(100, ge=1, le=1000),
+    window: LeaderboardWindow = LeaderboardWindow.ALL,
 ):
-    """Получение таблицы лидеров"""
-    users = await game_service.get_leaderboard(db, limit)
-    return users
+    """
+    Получение таблицы лидеров
+
+    window: all - за все время, day/week/season - за текущий день (UTC),
+    ISO-неделю или сезон (квартал); статистика в ответе - за этот период
+    """
+    return await leaderboard_service.get_window_top(db, window, limit)
+
+
+@router.get("/users/{user_id}", response_model=LeaderboardRank)
+async def get_user_rank(
+    user_id: int,
+    db: DBSession,
+    radius: int = Query(5, ge=0, le=50),
+):
+    """Место пользователя в таблице лидеров и соседи по таблице"""
+    rank = await leaderboard_service.get_rank(db, user_id)
+
+    if rank is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не участвует в рейтинге",
+        )
+
+    start = max(rank - 1 - radius, 0)
+    entries = await leaderboard_service.get_range(db, start, rank - 1 + radius)
+
+    return LeaderboardRank(
+        rank=rank,
+        total=await leaderboard_service.get_size(db),
+        around=[
+            LeaderboardPosition(
+                rank=start + offset + 1, user=UserPublic.model_validate(entry)
+            )
+            for offset, entry in enumerate(entries)
+        ],
+    )
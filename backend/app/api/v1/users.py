@@ -13,9 +13,15 @@ router = APIRouter()
 @router.get("/me", response_model=UserProfile)
 async def get_current_user_profile(
     current_user: CurrentUser,
+    db: DBSession,
 ):
     """Получение профиля текущего пользователя"""
-    return current_user
+    user = await auth_service.get_user_by_id(db, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
+        )
+    return user
 
 
 @router.get("/{user_id}", response_model=UserPublic)
@@ -51,12 +57,19 @@ async def get_user_stats(
         (user.total_wins / user.total_games * 100) if user.total_games > 0 else 0.0
     )
 
+    # Средние по завершенным играм из накопительных сумм (O(1))
+    average_steps = None
+    average_time = None
+    if user.finished_games > 0:
+        average_steps = round(user.finished_steps_sum / user.finished_games, 2)
+        average_time = round(user.finished_time_sum / user.finished_games, 2)
+
     return UserStats(
         total_games=user.total_games,
         total_wins=user.total_wins,
         win_rate=round(win_rate, 2),
         best_time=user.best_time,
         best_steps=user.best_steps,
-        average_steps=None,  # TODO: calculate from game history
-        average_time=None,  # TODO: calculate from game history
+        average_steps=average_steps,
+        average_time=average_time,
     )
@@ -8,6 +8,7 @@ from .security import (
     create_refresh_token,
     decode_token,
     get_password_hash,
+    password_hasher,
     verify_password,
 )
 
@@ -20,5 +21,6 @@ __all__ = [
     "create_refresh_token",
     "decode_token",
     "get_password_hash",
+    "password_hasher",
     "verify_password",
 ]
@@ -0,0 +1,243 @@
+"""
+Скрипт выдачи достижений существующим пользователям после изменения каталога
+
+Новое достижение (или измененное условие) обычно проверяется только при
+следующей победе игрока. Скрипт проверяет выбранные правила для всех
+пользователей: диапазон ID делится на непересекающиеся части по числу
+воркеров (отдельных процессов), каждый воркер обходит свою часть чанками
+по возрастанию ID, проверяет правила по статистике из users и записывает
+выдачу пакетными upsert-запросами. Строки не блокируются: выдача
+монотонна, а upsert не трогает уже полученные достижения. Прогресс каждой
+части хранится в backfill_checkpoints под именем с версией каталога:
+прерванный запуск (с тем же --workers) продолжается с места остановки, а
+после следующего изменения каталога обход начинается заново.
+
+Запуск: python -m app.core.backfill_achievements [--codes first_win games_10]
+        [--workers 4] [--batch-size 1000] [--restart]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.backfill_user_stats import get_checkpoint
+from app.core.database import AsyncSessionLocal, init_db
+from app.models.user import User
+from app.services.achievement_catalog import AchievementCatalog, CatalogCache
+from app.services.achievement_rules import RuleIndex, get_user_stats
+from app.services.achievement_service import unlock_upsert
+
+CHECKPOINT_PREFIX = "achievements"
+
+# Строк в одном upsert (ограничение числа параметров запроса в SQLite)
+UPSERT_BATCH_SIZE = 500
+
+
+def select_rules(catalog: AchievementCatalog, codes: list[str] | None) -> RuleIndex:
+    """Правила выбранных достижений (None - все правила каталога)"""
+    if codes is None:
+        return catalog.rules
+
+    rules = []
+    for code in codes:
+        achievement = catalog.get_by_code(code)
+        if achievement is None:
+            raise ValueError(f"Достижение {code} не найдено")
+
+        rule = catalog.rules.get(achievement.id)
+        if rule is None:
+            raise ValueError(f"Условие достижения {code} не вычисляется из статистики")
+        rules.append(rule)
+
+    return RuleIndex(rules)
+
+
+def split_id_range(min_id: int, max_id: int, parts: int) -> list[tuple[int, int]]:
+    """Деление диапазона ID [min_id, max_id] на parts непересекающихся частей"""
+    size = max((max_id - min_id + 1 + parts - 1) // parts, 1)
+    return [
+        (start, min(start + size - 1, max_id))
+        for start in range(min_id, max_id + 1, size)
+    ]
+
+
+async def backfill_chunk(
+    session: AsyncSession, rules: RuleIndex, users: Sequence[Any]
+) -> int:
+    """
+    Выдача достижений чанку пользователей (без commit)
+    Возвращает количество выданных достижений
+    """
+    unlocks = [
+        (user.id, rule) for user in users for rule in rules.met(get_user_stats(user))
+    ]
+
+    now = datetime.now(UTC)
+    granted = 0
+    for start in range(0, len(unlocks), UPSERT_BATCH_SIZE):
+        result = await session.execute(
+            unlock_upsert(session, unlocks[start : start + UPSERT_BATCH_SIZE], now)
+        )
+        granted += len(result.all())
+
+    return granted
+
+
+async def backfill_shard(
+    session_factory: async_sessionmaker[AsyncSession],
+    codes: list[str] | None,
+    id_range: tuple[int, int],
+    checkpoint_name: str,
+    batch_size: int = 1000,
+    restart: bool = False,
+) -> tuple[int, int]:
+    """
+    Обход одной части диапазона ID
+    Возвращает (обработано пользователей, выдано достижений)
+    """
+    min_id, max_id = id_range
+    granted = 0
+    started = time.monotonic()
+
+    async with session_factory() as session:
+        rules = select_rules(await CatalogCache().get(session), codes)
+        checkpoint = await get_checkpoint(session, checkpoint_name, restart)
+
+        while True:
+            result = await session.execute(
+                select(
+                    User.id,
+                    User.total_games,
+                    User.total_wins,
+                    User.best_time,
+                    User.best_steps,
+                )
+                .where(
+                    User.id > max(checkpoint.last_id, min_id - 1),
+                    User.id <= max_id,
+                )
+                .order_by(User.id)
+                .limit(batch_size)
+            )
+            users = result.all()
+
+            if not users:
+                break
+
+            granted += await backfill_chunk(session, rules, users)
+
+            checkpoint.last_id = users[-1].id
+            checkpoint.processed += len(users)
+            await session.commit()
+
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(
+                f"[*] {checkpoint_name}: обработано {checkpoint.processed} "
+                f"(последний ID {checkpoint.last_id} из {max_id}), "
+                f"выдано {granted}, {checkpoint.processed / elapsed:.0f} польз./с"
+            )
+
+        checkpoint.is_completed = True
+        await session.commit()
+
+        return checkpoint.processed, granted
+
+
+def _run_shard(
+    codes: list[str] | None,
+    id_range: tuple[int, int],
+    checkpoint_name: str,
+    batch_size: int,
+    restart: bool,
+) -> tuple[int, int]:
+    """Точка входа процесса-воркера (свой event loop и пул соединений)"""
+    return asyncio.run(
+        backfill_shard(
+            AsyncSessionLocal, codes, id_range, checkpoint_name, batch_size, restart
+        )
+    )
+
+
+async def backfill_achievements(
+    session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    codes: list[str] | None = None,
+    batch_size: int = 1000,
+    workers: int = 1,
+    restart: bool = False,
+) -> tuple[int, int]:
+    """
+    Проверка правил достижений для всех пользователей
+    Возвращает (обработано пользователей, выдано достижений)
+    """
+    async with session_factory() as session:
+        catalog = await CatalogCache().get(session)
+        # Проверяем коды до запуска воркеров
+        select_rules(catalog, codes)
+        result = await session.execute(select(func.min(User.id), func.max(User.id)))
+        min_id, max_id = result.one()
+
+    if min_id is None:
+        return 0, 0
+
+    shards = [
+        (id_range, f"{CHECKPOINT_PREFIX}:v{catalog.version}:{index + 1}/{workers}")
+        for index, id_range in enumerate(split_id_range(min_id, max_id, workers))
+    ]
+
+    if workers == 1:
+        results = [
+            await backfill_shard(
+                session_factory, codes, id_range, name, batch_size, restart
+            )
+            for id_range, name in shards
+        ]
+    else:
+        # spawn: воркеры не наследуют соединения пула родительского процесса
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        executor, _run_shard, codes, id_range, name, batch_size, restart
+                    )
+                    for id_range, name in shards
+                )
+            )
+
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+async def main():
+    """Главная функция: выдаем достижения по текущему каталогу"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--codes", nargs="+", help="Коды проверяемых достижений (по умолчанию все)"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--restart", action="store_true", help="Начать заново, игнорируя прогресс"
+    )
+    args = parser.parse_args()
+
+    await init_db()
+    processed, granted = await backfill_achievements(
+        codes=args.codes,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        restart=args.restart,
+    )
+    print(f"[+] Готово! Обработано: {processed}, выдано достижений: {granted}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Скрипт пересчета накопительной статистики пользователей по истории игр
+
+Обходит пользователей чанками по возрастанию ID и для каждого чанка одним
+сгруппированным запросом агрегирует его завершенные игры. Прогресс хранится
+в backfill_checkpoints, поэтому прерванный запуск продолжается с места
+остановки. Значения записываются абсолютными, так что повторный запуск
+безопасен.
+
+Запуск: python -m app.core.backfill_user_stats [--batch-size 1000] [--restart]
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.database import AsyncSessionLocal, init_db
+from app.models.backfill import BackfillCheckpoint
+from app.models.game import GameParticipant
+from app.models.user import User
+
+CHECKPOINT_NAME = "user_stats"
+
+
+async def get_checkpoint(
+    session: AsyncSession, name: str, restart: bool = False
+) -> BackfillCheckpoint:
+    """Получение (или создание) контрольной точки задачи"""
+    checkpoint = await session.get(BackfillCheckpoint, name)
+
+    if checkpoint is None:
+        checkpoint = BackfillCheckpoint(name=name, last_id=0, processed=0)
+        session.add(checkpoint)
+    elif restart:
+        checkpoint.last_id = 0
+        checkpoint.processed = 0
+        checkpoint.is_completed = False
+
+    await session.commit()
+    return checkpoint
+
+
+async def backfill_chunk(session: AsyncSession, user_ids: list[int]) -> None:
+    """Пересчет статистики для чанка пользователей (без commit)"""
+    result = await session.execute(
+        select(
+            GameParticipant.user_id,
+            func.count(GameParticipant.id),
+            func.coalesce(func.sum(GameParticipant.steps_count), 0),
+            func.coalesce(func.sum(GameParticipant.time_taken), 0),
+        )
+        .where(
+            GameParticipant.user_id.in_(user_ids),
+            GameParticipant.is_finished.is_(True),
+        )
+        .group_by(GameParticipant.user_id)
+    )
+    aggregates = {row[0]: row[1:] for row in result.all()}
+
+    values = []
+    for user_id in user_ids:
+        finished, steps_sum, time_sum = aggregates.get(user_id, (0, 0, 0))
+        values.append(
+            {
+                "id": user_id,
+                "finished_games": finished,
+                "finished_steps_sum": steps_sum,
+                "finished_time_sum": time_sum,
+            }
+        )
+
+    # Bulk UPDATE по первичному ключу одним executemany
+    await session.execute(update(User), values)
+
+
+async def backfill_user_stats(
+    session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    batch_size: int = 1000,
+    restart: bool = False,
+) -> int:
+    """
+    Пересчет статистики всех пользователей чанками
+    Возвращает общее количество обработанных пользователей
+    """
+    async with session_factory() as session:
+        checkpoint = await get_checkpoint(session, CHECKPOINT_NAME, restart)
+
+        while True:
+            # Блокируем строки чанка, чтобы параллельный финиш игры
+            # не потерялся между агрегацией и записью (PostgreSQL)
+            result = await session.execute(
+                select(User.id)
+                .where(User.id > checkpoint.last_id)
+                .order_by(User.id)
+                .limit(batch_size)
+                .with_for_update()
+            )
+            user_ids = list(result.scalars().all())
+
+            if not user_ids:
+                break
+
+            await backfill_chunk(session, user_ids)
+
+            checkpoint.last_id = user_ids[-1]
+            checkpoint.processed += len(user_ids)
+            await session.commit()
+
+            print(
+                f"[*] Обработано пользователей: {checkpoint.processed} "
+                f"(последний ID {checkpoint.last_id})"
+            )
+
+        checkpoint.is_completed = True
+        await session.commit()
+
+        return checkpoint.processed
+
+
+async def main():
+    """Главная функция: пересчитываем статистику пользователей"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--restart", action="store_true", help="Начать заново, игнорируя прогресс"
+    )
+    args = parser.parse_args()
+
+    await init_db()
+    processed = await backfill_user_stats(
+        batch_size=args.batch_size, restart=args.restart
+    )
+    print(f"[+] Готово! Всего обработано: {processed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
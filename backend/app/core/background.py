@@ -0,0 +1,48 @@
+"""
+Периодические фоновые задачи приложения
+"""
+import asyncio
+from collections.abc import Awaitable, Callable
+
+
+class BackgroundTasks:
+    """Запуск и остановка периодических задач в lifespan приложения"""
+
+    def __init__(self):
+        self._jobs: list[tuple[str, float, Callable[[], Awaitable[None]]]] = []
+        self._tasks: list[asyncio.Task] = []
+
+    def add_periodic(
+        self, name: str, interval: float, func: Callable[[], Awaitable[None]]
+    ) -> None:
+        """Регистрация задачи, выполняемой раз в interval секунд"""
+        self._jobs.append((name, interval, func))
+
+    def start(self) -> None:
+        """Запуск всех зарегистрированных задач"""
+        for name, interval, func in self._jobs:
+            self._tasks.append(
+                asyncio.create_task(self._run(name, interval, func), name=name)
+            )
+
+    async def stop(self) -> None:
+        """Остановка всех задач"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(
+        self, name: str, interval: float, func: Callable[[], Awaitable[None]]
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await func()
+            # Сбой одной задачи не должен останавливать периодический запуск
+            except Exception as e:  # noqa: BLE001
+                print(f"Background task '{name}' failed: {e}")
+
+
+# Singleton instance
+background_tasks = BackgroundTasks()
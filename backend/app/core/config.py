@@ -23,6 +23,12 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Сколько паролей (bcrypt) хешируется одновременно; остальные ждут в очереди
+    PASSWORD_HASH_CONCURRENCY: int = 4
+    # Кеш аутентификации: время жизни данных пользователя (секунды) и
+    # максимум записей в кешах пользователей и проверенных токенов
+    AUTH_PRINCIPAL_CACHE_TTL: int = 60
+    AUTH_CACHE_SIZE: int = 10000
 
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:5173"]
@@ -59,13 +65,71 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
 
+    # Таблица лидеров: дублировать ли рейтинг в sorted set Redis
+    # (нужно при нескольких воркерах, чтобы все читали общий рейтинг)
+    LEADERBOARD_REDIS_MIRROR: bool = False
+    LEADERBOARD_REDIS_KEY: str = "wikirush:leaderboard"
+
+    # Сколько дней хранить бакеты таблиц лидеров по периодам
+    LEADERBOARD_DAY_RETENTION_DAYS: int = 7
+    LEADERBOARD_WEEK_RETENTION_DAYS: int = 56
+    LEADERBOARD_SEASON_RETENTION_DAYS: int = 730
+    # Интервал фоновой очистки старых бакетов (секунды)
+    LEADERBOARD_PRUNE_INTERVAL: int = 3600
+
+    # WebSocket: максимум сообщений в очереди на отправку одному клиенту.
+    # Клиент, не успевающий читать, отключается при переполнении очереди
+    WS_OUTBOUND_QUEUE_SIZE: int = 256
+    # Транспорт событий между воркерами: memory (один воркер) или redis
+    WS_PUBSUB_BACKEND: str = "memory"
+    # Сколько последних событий игры хранить для повтора при переподключении
+    WS_EVENT_BUFFER_SIZE: int = 100
+    # Время жизни истории событий игры в Redis (секунды)
+    WS_EVENT_HISTORY_TTL: int = 86400
+    # Heartbeat: интервал ping (секунды) и сколько пропущенных ответов
+    # допускается до закрытия соединения
+    WS_HEARTBEAT_INTERVAL: int = 30
+    WS_HEARTBEAT_MAX_MISSED: int = 2
+    # Через сколько секунд после завершения игры закрывается ее комната
+    WS_FINISHED_ROOM_TTL: int = 60
+    # Сжатие кадров WebSocket (permessage-deflate) в uvicorn
+    WS_PER_MESSAGE_DEFLATE: bool = True
+
+    # Зрители: интервал рассылки дельт (мс) и размер очереди кадров зрителя
+    SPECTATOR_THROTTLE_MS: int = 500
+    SPECTATOR_QUEUE_SIZE: int = 32
+
     # Wikipedia API
     WIKIPEDIA_API_URL: str = "https://ru.wikipedia.org/w/api.php"
     WIKIPEDIA_RATE_LIMIT: int = 100  # requests per minute
 
+    # Ограничение частоты запросов клиентов (запросов в минуту на пользователя
+    # или IP). Хранилище корзин: memory (один воркер) или redis
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_REDIS_PREFIX: str = "wikirush:ratelimit"
+    RATE_LIMIT_AVAILABLE_LINKS_PER_MINUTE: int = 120
+    RATE_LIMIT_SEARCH_PER_MINUTE: int = 60
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = 10
+    # Интервал очистки восстановившихся корзин в памяти (секунды)
+    RATE_LIMIT_EVICT_INTERVAL: int = 60
+
     # Game settings
     MAX_STEPS: int = 100  # Максимальное количество переходов в игре
     GAME_TIME_LIMIT: int = 300  # Время на игру в секундах (5 минут)
 
+    # Время жизни закешированного общего количества игр в списке (секунды)
+    GAMES_COUNT_CACHE_TTL: int = 30
+
+    # Интервал фонового перестроения таблицы редкости достижений (секунды)
+    ACHIEVEMENT_RARITY_REFRESH_INTERVAL: int = 300
+    # Как часто сверять версию каталога достижений в памяти с БД (секунды)
+    ACHIEVEMENT_CATALOG_CHECK_INTERVAL: int = 30
+    # Карточки шаринга: сколько хранить в памяти, шаг бакета редкости
+    # (процентные пункты) и время кеширования ответа клиентами (секунды)
+    ACHIEVEMENT_SHARE_CACHE_SIZE: int = 10000
+    ACHIEVEMENT_SHARE_RARITY_STEP: float = 1.0
+    ACHIEVEMENT_SHARE_MAX_AGE: int = 300
+
 
 settings = Settings()
@@ -1,8 +1,9 @@
 """
 Настройка базы данных и сессий
 """
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
@@ -42,11 +43,30 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """
+    Dependency для получения фабрики сессий
+
+    Для долгоживущих соединений (WebSocket): сессия открывается
+    на время одной операции, а не на все время соединения.
+    """
+    return AsyncSessionLocal
+
+
+def dialect_insert(db: AsyncSession, table: Any) -> Any:
+    """
+    INSERT с поддержкой ON CONFLICT для текущего диалекта (PostgreSQL/SQLite)
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
 async def init_db() -> None:
     """Инициализация базы данных"""
     async with engine.begin() as conn:
         # Импортируем все модели чтобы Base.metadata был заполнен
-        from app.models import user, game, achievement  # noqa
+        from app.models import user, game, achievement, leaderboard, backfill  # noqa
 
         # Создаем таблицы
         await conn.run_sync(Base.metadata.create_all)
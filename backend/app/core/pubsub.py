@@ -0,0 +1,222 @@
+"""
+Pub/sub транспорт для рассылки событий между воркерами
+
+События игры публикуются один раз в канал игры, а каждый воркер,
+у которого есть локальные сокеты этой игры, получает их через подписку
+и рассылает только своим соединениям.
+
+Транспорт также выдает сквозные номера событий канала и хранит
+последние события в кольцевом буфере для повтора при переподключении.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+MessageHandler = Callable[[str], None]
+
+
+class InProcessPubSub:
+    """Шина внутри процесса (один воркер и тесты)"""
+
+    def __init__(self, history_size: int = settings.WS_EVENT_BUFFER_SIZE):
+        self.history_size = history_size
+        self._handlers: dict[str, list[MessageHandler]] = {}
+        self._seq: dict[str, int] = {}
+        self._history: dict[str, deque[str]] = {}
+        # Время последнего события канала (для очистки истории)
+        self._touched: dict[str, float] = {}
+
+    async def publish_event(self, channel: str, message: dict[str, Any]) -> int:
+        """
+        Публикация события канала: присваивает следующий номер seq,
+        сохраняет событие в кольцевом буфере и рассылает подписчикам
+        Возвращает номер события
+        """
+        seq = self._seq.get(channel, 0) + 1
+        self._seq[channel] = seq
+        self._touched[channel] = time.monotonic()
+        payload = json.dumps({**message, "seq": seq})
+
+        history = self._history.get(channel)
+        if history is None:
+            history = self._history[channel] = deque(maxlen=self.history_size)
+        history.append(payload)
+
+        await self.publish(channel, payload)
+        return seq
+
+    async def current_seq(self, channel: str) -> int:
+        """Номер последнего события канала (0 - событий не было)"""
+        return self._seq.get(channel, 0)
+
+    async def get_history(self, channel: str) -> list[str]:
+        """События из буфера канала, от старых к новым"""
+        return list(self._history.get(channel, ()))
+
+    async def forget(self, channel: str) -> None:
+        """Удаление номера и истории событий канала"""
+        self._seq.pop(channel, None)
+        self._history.pop(channel, None)
+        self._touched.pop(channel, None)
+
+    async def prune(self, max_idle: float) -> int:
+        """
+        Удаление истории каналов без подписчиков и событий дольше max_idle
+        Возвращает количество удаленных каналов
+        """
+        now = time.monotonic()
+        expired = [
+            channel
+            for channel, touched in self._touched.items()
+            if now - touched > max_idle and channel not in self._handlers
+        ]
+        for channel in expired:
+            await self.forget(channel)
+        return len(expired)
+
+    async def publish(self, channel: str, payload: str) -> None:
+        """Публикация сообщения в канал"""
+        for handler in list(self._handlers.get(channel, ())):
+            handler(payload)
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        """Подписка обработчика на канал"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        """Отписка обработчика от канала"""
+        handlers = self._handlers.get(channel)
+        if handlers and handler in handlers:
+            handlers.remove(handler)
+            if not handlers:
+                del self._handlers[channel]
+
+    async def close(self) -> None:
+        self._handlers.clear()
+        self._seq.clear()
+        self._history.clear()
+        self._touched.clear()
+
+
+# Номер, запись в историю и публикация одним атомарным шагом: иначе события
+# воркеров одной игры перемешиваются, и история и порядок доставки расходятся
+# с seq. ARGV[1] - JSON события без значения seq и закрывающей скобки.
+_PUBLISH_EVENT_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local payload = ARGV[1] .. seq .. '}'
+redis.call('RPUSH', KEYS[2], payload)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('PUBLISH', ARGV[4], payload)
+return seq
+"""
+
+
+class RedisPubSub:
+    """
+    Шина через Redis pub/sub
+
+    Одно подключение на процесс: подписка на канал игры оформляется, когда
+    в ней появляется первый локальный сокет, и снимается с уходом последнего.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        history_size: int = settings.WS_EVENT_BUFFER_SIZE,
+        history_ttl: int = settings.WS_EVENT_HISTORY_TTL,
+    ):
+        self.client = client
+        self.history_size = history_size
+        self.history_ttl = history_ttl
+        self._pubsub = client.pubsub()
+        self._handlers: dict[str, list[MessageHandler]] = {}
+        self._reader: asyncio.Task | None = None
+        self._publish_event = client.register_script(_PUBLISH_EVENT_SCRIPT)
+
+    async def publish_event(self, channel: str, message: dict[str, Any]) -> int:
+        # seq - последний ключ, поэтому JSON заканчивается на '0}'
+        prefix = json.dumps({**message, "seq": 0})[:-2]
+        return int(
+            await self._publish_event(
+                keys=[f"{channel}:seq", f"{channel}:history"],
+                args=[prefix, self.history_size, self.history_ttl, channel],
+            )
+        )
+
+    async def current_seq(self, channel: str) -> int:
+        return int(await self.client.get(f"{channel}:seq") or 0)
+
+    async def get_history(self, channel: str) -> list[str]:
+        return await self.client.lrange(f"{channel}:history", 0, -1)
+
+    async def forget(self, channel: str) -> None:
+        await self.client.delete(f"{channel}:seq", f"{channel}:history")
+
+    async def prune(self, max_idle: float) -> int:
+        # История в Redis удаляется по TTL ключей
+        return 0
+
+    async def publish(self, channel: str, payload: str) -> None:
+        await self.client.publish(channel, payload)
+
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self._handlers.setdefault(channel, [])
+        handlers.append(handler)
+
+        if len(handlers) == 1:
+            await self._pubsub.subscribe(channel)
+
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    async def unsubscribe(self, channel: str, handler: MessageHandler) -> None:
+        handlers = self._handlers.get(channel)
+        if not handlers or handler not in handlers:
+            return
+
+        handlers.remove(handler)
+        if not handlers:
+            del self._handlers[channel]
+            await self._pubsub.unsubscribe(channel)
+
+    async def _read_loop(self) -> None:
+        """Чтение сообщений подписок и передача их обработчикам каналов"""
+        while self._handlers:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except Exception as e:  # noqa: BLE001 - переподключаемся при любом сбое
+                print(f"Redis pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+
+            if not message or message.get("type") != "message":
+                continue
+
+            for handler in list(self._handlers.get(message["channel"], ())):
+                try:
+                    handler(message["data"])
+                # Ошибка одного обработчика не мешает остальным
+                except Exception as e:  # noqa: BLE001
+                    print(f"Pub/sub handler failed: {e}")
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+        await self._pubsub.aclose()
+
+
+def create_pubsub() -> InProcessPubSub | RedisPubSub:
+    """Транспорт согласно настройке WS_PUBSUB_BACKEND"""
+    if settings.WS_PUBSUB_BACKEND == "redis":
+        return RedisPubSub(get_redis())
+    return InProcessPubSub()
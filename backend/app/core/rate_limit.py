@@ -0,0 +1,258 @@
+"""
+Ограничение частоты запросов к дорогим эндпоинтам
+
+ASGI middleware сопоставляет запрос с правилами (метод и шаблон пути) и
+списывает токен из корзины клиента: по ID пользователя из access токена
+или по IP. Корзина хранится одним числом - моментом, когда она снова
+станет полной (GCRA): запись не нужна для полных корзин, поэтому
+периодическая очистка удаляет все, что успело восстановиться. При
+нескольких воркерах корзины хранятся в Redis (RATE_LIMIT_BACKEND=redis).
+Превышение лимита - ответ 429 с заголовком Retry-After.
+"""
+import json
+import math
+import re
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitRule:
+    """Лимит limit запросов за period секунд для маршрута"""
+
+    name: str
+    method: str
+    pattern: re.Pattern
+    limit: int
+    period: float
+    # True - ключ по пользователю (если запрос с токеном), иначе всегда по IP
+    by_user: bool = True
+
+    @property
+    def rate(self) -> float:
+        """Скорость пополнения корзины (токенов в секунду)"""
+        return self.limit / self.period
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.pattern.match(path) is not None
+
+
+def default_rules() -> tuple[RateLimitRule, ...]:
+    """Правила из настроек (лимиты в минуту)"""
+    api = re.escape(settings.API_V1_STR)
+    return (
+        RateLimitRule(
+            "available_links",
+            "GET",
+            re.compile(rf"^{api}/games/\d+/available-links$"),
+            settings.RATE_LIMIT_AVAILABLE_LINKS_PER_MINUTE,
+            60,
+        ),
+        RateLimitRule(
+            "wikipedia_search",
+            "GET",
+            re.compile(rf"^{api}/wikipedia/search$"),
+            settings.RATE_LIMIT_SEARCH_PER_MINUTE,
+            60,
+        ),
+        # До входа пользователя нет, поэтому логин ограничивается по IP
+        RateLimitRule(
+            "login",
+            "POST",
+            re.compile(rf"^{api}/auth/login$"),
+            settings.RATE_LIMIT_LOGIN_PER_MINUTE,
+            60,
+            by_user=False,
+        ),
+    )
+
+
+class RateLimitExceeded(Exception):
+    """Лимит исчерпан; повторить через retry_after секунд"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = math.ceil(retry_after)
+        super().__init__(
+            f"Слишком много запросов, повторите через {self.retry_after} с"
+        )
+
+
+class InMemoryRateLimitStore:
+    """Корзины в памяти процесса (один воркер и тесты)"""
+
+    def __init__(self):
+        # ключ корзины -> момент (time.monotonic), когда корзина снова полна
+        self._full_at: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    async def take(self, key: str, limit: int, rate: float) -> float:
+        """
+        Списание токена
+        Возвращает 0, если запрос разрешен, иначе через сколько секунд повторить
+        """
+        now = time.monotonic()
+        full_at = max(self._full_at.get(key, now), now)
+        tokens = limit - (full_at - now) * rate
+
+        if tokens < 1:
+            return (1 - tokens) / rate
+
+        self._full_at[key] = full_at + 1 / rate
+        return 0.0
+
+    async def evict(self) -> int:
+        """
+        Удаление полностью восстановившихся корзин
+        Возвращает количество удаленных
+        """
+        now = time.monotonic()
+        expired = [key for key, full_at in self._full_at.items() if full_at <= now]
+        for key in expired:
+            del self._full_at[key]
+        return len(expired)
+
+    def reset(self) -> None:
+        self._full_at.clear()
+
+
+# Та же логика атомарно в Redis; время берется из Redis, общее для воркеров.
+# Числа возвращаются строками: Lua-числа в ответе Redis усекаются до целых.
+_TAKE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local limit = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local full_at = tonumber(redis.call('GET', KEYS[1]) or now)
+if full_at < now then full_at = now end
+local tokens = limit - (full_at - now) * rate
+if tokens < 1 then return tostring((1 - tokens) / rate) end
+full_at = full_at + 1 / rate
+redis.call('SET', KEYS[1], tostring(full_at), 'PX', math.ceil((full_at - now) * 1000))
+return '0'
+"""
+
+
+class RedisRateLimitStore:
+    """Корзины в Redis (общие для всех воркеров)"""
+
+    def __init__(self, client: Any, prefix: str = settings.RATE_LIMIT_REDIS_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: int, rate: float) -> float:
+        try:
+            result = await self._take(keys=[f"{self.prefix}:{key}"], args=[limit, rate])
+        except Exception as e:  # noqa: BLE001
+            # Недоступный Redis не должен останавливать игру: пропускаем запрос
+            print(f"Rate limit check failed: {e}")
+            return 0.0
+        return float(result)
+
+    async def evict(self) -> int:
+        # Полные корзины удаляются по TTL ключей
+        return 0
+
+    def reset(self) -> None:
+        pass
+
+
+def create_rate_limit_store() -> InMemoryRateLimitStore | RedisRateLimitStore:
+    """Хранилище корзин согласно настройке RATE_LIMIT_BACKEND"""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimitStore(get_redis())
+    return InMemoryRateLimitStore()
+
+
+class RateLimitMiddleware:
+    """ASGI middleware ограничения частоты запросов"""
+
+    def __init__(
+        self,
+        app: Any,
+        store: InMemoryRateLimitStore | RedisRateLimitStore,
+        rules: tuple[RateLimitRule, ...],
+        identify: Callable[[str], int | None] | None = None,
+    ):
+        self.app = app
+        self.store = store
+        self.rules = rules
+        # Токен -> ID пользователя (None - токен невалиден)
+        self.identify = identify
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = next(
+            (r for r in self.rules if r.matches(scope["method"], scope["path"])), None
+        )
+        if rule is not None:
+            key = f"{rule.name}:{self._client_key(scope, rule)}"
+            retry_after = await self.store.take(key, rule.limit, rule.rate)
+            if retry_after > 0:
+                await self._reject(send, retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    def _client_key(self, scope: dict, rule: RateLimitRule) -> str:
+        if rule.by_user and self.identify is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer":
+                        user_id = self.identify(token)
+                        if user_id is not None:
+                            return f"user:{user_id}"
+                    break
+
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    @staticmethod
+    async def _reject(send: Callable, retry_after: float) -> None:
+        body = json.dumps(
+            {"detail": "Слишком много запросов, попробуйте позже"}, ensure_ascii=False
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(math.ceil(retry_after)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+async def check_rate_limit(rule_name: str, client_key: str) -> None:
+    """
+    Списание токена вне HTTP (например, RPC по WebSocket) из той же корзины,
+    что и у middleware; client_key - "user:{id}" или "ip:{адрес}"
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    rule = next(r for r in rate_limit_rules if r.name == rule_name)
+    retry_after = await rate_limit_store.take(
+        f"{rule.name}:{client_key}", rule.limit, rule.rate
+    )
+    if retry_after > 0:
+        raise RateLimitExceeded(retry_after)
+
+
+# Singleton instances
+rate_limit_store = create_rate_limit_store()
+rate_limit_rules = default_rules()
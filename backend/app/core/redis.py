@@ -0,0 +1,25 @@
+"""
+Подключение к Redis
+"""
+from typing import Any
+
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - Redis опционален
+    aioredis = None  # type: ignore[assignment]
+
+_client: Any = None
+
+
+def get_redis() -> Any:
+    """Получение общего клиента Redis (создается лениво по REDIS_URL)"""
+    global _client
+
+    if _client is None:
+        if aioredis is None:
+            raise RuntimeError("Пакет redis не установлен")
+        _client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    return _client
@@ -1,7 +1,10 @@
 """
 Модуль безопасности: хеширование паролей, JWT токены
 """
-from datetime import datetime, timedelta, timezone
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
 from typing import Any
 
 from jose import jwt
@@ -17,9 +20,9 @@ def create_access_token(
 ) -> str:
     """Создание JWT access токена"""
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = datetime.now(UTC) + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
+        expire = datetime.now(UTC) + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
@@ -32,9 +35,7 @@ def create_access_token(
 
 def create_refresh_token(subject: str | int) -> str:
     """Создание JWT refresh токена"""
-    expire = datetime.now(timezone.utc) + timedelta(
-        days=settings.REFRESH_TOKEN_EXPIRE_DAYS
-    )
+    expire = datetime.now(UTC) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
@@ -52,6 +53,66 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей вне event loop
+
+    bcrypt занимает 100-300 мс CPU и отпускает GIL, поэтому вызовы выполняются
+    в пуле потоков. Семафор ограничивает число одновременных вызовов, остальные
+    ждут своей очереди, не занимая потоки; глубина очереди видна в метриках.
+    """
+
+    def __init__(self, max_concurrency: int = settings.PASSWORD_HASH_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="password-hash"
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.queued = 0
+        self.active = 0
+        self.completed_total = 0
+
+    async def hash(self, password: str) -> str:
+        """Хеширование пароля"""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Проверка пароля"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.active += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.active -= 1
+            self.completed_total += 1
+            self._semaphore.release()
+
+    def close(self) -> None:
+        """Остановка пула потоков (при завершении приложения)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict[str, float]:
+        """Метрики хеширования паролей"""
+        return {
+            "wikirush_password_hash_queue_depth": self.queued,
+            "wikirush_password_hash_active": self.active,
+            "wikirush_password_hash_total": self.completed_total,
+        }
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
+
+
 def decode_token(token: str) -> dict[str, Any]:
     """Декодирование JWT токена"""
     return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
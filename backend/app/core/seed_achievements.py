@@ -7,6 +7,7 @@ from sqlalchemy import select
 
 from app.core.database import AsyncSessionLocal, init_db
 from app.models.achievement import Achievement
+from app.services.achievement_catalog import bump_catalog_version
 
 
 async def seed_achievements():
@@ -197,6 +198,8 @@ async def seed_achievements():
             achievement = Achievement(**ach_data)
             session.add(achievement)
 
+        # Воркеры перезагрузят каталог достижений в памяти
+        await bump_catalog_version(session)
         await session.commit()
         print(f"[OK] Создано {len(achievements_data)} достижений")
 
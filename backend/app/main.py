@@ -5,10 +5,63 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api.v1 import api_router
+from app.core.background import background_tasks
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import AsyncSessionLocal, init_db
+from app.core.rate_limit import RateLimitMiddleware, rate_limit_rules, rate_limit_store
+from app.core.security import password_hasher
+from app.services.achievement_service import achievement_service
+from app.services.auth_service import auth_service
+from app.services.leaderboard_service import leaderboard_service
+from app.services.spectator_service import spectator_hub
+from app.services.websocket_service import websocket_manager
+
+
+async def prune_leaderboard_buckets() -> None:
+    """Удаление устаревших бакетов таблиц лидеров по периодам"""
+    async with AsyncSessionLocal() as session:
+        await leaderboard_service.prune_window_buckets(session)
+
+
+async def refresh_achievement_rarity() -> None:
+    """Перестроение таблицы редкости достижений (сверка счетчиков воркеров)"""
+    async with AsyncSessionLocal() as session:
+        await achievement_service.rarity.refresh(session)
+
+
+async def websocket_heartbeat() -> None:
+    """Ping клиентам, закрытие зависших соединений и комнат завершенных игр"""
+    await websocket_manager.heartbeat()
+    spectator_hub.heartbeat()
+
+
+async def evict_rate_limit_buckets() -> None:
+    """Удаление восстановившихся корзин ограничения частоты запросов"""
+    await rate_limit_store.evict()
+
+
+# Периодические фоновые задачи (запускаются в lifespan)
+background_tasks.add_periodic(
+    "prune_leaderboard_buckets",
+    settings.LEADERBOARD_PRUNE_INTERVAL,
+    prune_leaderboard_buckets,
+)
+background_tasks.add_periodic(
+    "refresh_achievement_rarity",
+    settings.ACHIEVEMENT_RARITY_REFRESH_INTERVAL,
+    refresh_achievement_rarity,
+)
+background_tasks.add_periodic(
+    "websocket_heartbeat", settings.WS_HEARTBEAT_INTERVAL, websocket_heartbeat
+)
+background_tasks.add_periodic(
+    "evict_rate_limit_buckets",
+    settings.RATE_LIMIT_EVICT_INTERVAL,
+    evict_rate_limit_buckets,
+)
 
 
 @asynccontextmanager
@@ -19,10 +72,21 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("Database initialized")
 
+    async with AsyncSessionLocal() as session:
+        ranked = await leaderboard_service.rebuild(session)
+        catalog = await achievement_service.catalog.get(session)
+    print(f"Leaderboard rebuilt: {ranked} players")
+    print(f"Achievement catalog loaded: {len(catalog)} (version {catalog.version})")
+
+    background_tasks.start()
+
     yield
 
     # Shutdown
     print("Shutting down...")
+    await background_tasks.stop()
+    await websocket_manager.pubsub.close()
+    password_hasher.close()
 
 
 app = FastAPI(
@@ -32,6 +96,16 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Ограничение частоты запросов к дорогим эндпоинтам (внутри CORS, чтобы
+# ответ 429 тоже получал CORS-заголовки)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=rate_limit_store,
+        rules=rate_limit_rules,
+        identify=auth_service.get_user_id_from_access_token,
+    )
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -61,7 +135,31 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики соединений и хеширования паролей в формате Prometheus"""
+    values = {
+        **websocket_manager.metrics(),
+        **spectator_hub.metrics(),
+        **password_hasher.metrics(),
+    }
+
+    lines = []
+    for name, value in values.items():
+        metric_type = "counter" if name.endswith("_total") else "gauge"
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+    )
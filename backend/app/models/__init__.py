@@ -1,8 +1,10 @@
 """
 Database models
 """
-from .achievement import Achievement, UserAchievement
+from .achievement import Achievement, AchievementCatalogVersion, UserAchievement
+from .backfill import BackfillCheckpoint
 from .game import Game, GameMode, GameParticipant, GameStatus
+from .leaderboard import LeaderboardBucket, LeaderboardWindow
 from .user import User
 
 __all__ = [
@@ -13,4 +15,8 @@ __all__ = [
     "GameParticipant",
     "Achievement",
     "UserAchievement",
+    "AchievementCatalogVersion",
+    "LeaderboardBucket",
+    "LeaderboardWindow",
+    "BackfillCheckpoint",
 ]
@@ -4,7 +4,17 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text, func, JSON
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -57,9 +67,27 @@ class Achievement(Base):
 
 
 class UserAchievement(Base):
-    """Модель связи пользователя и достижения"""
+    """
+    Модель связи пользователя и достижения
+
+    Хранение разреженное: запись создается при получении достижения.
+    Прогресс неполученных достижений вычисляется из статистики пользователя.
+    """
 
     __tablename__ = "user_achievements"
+    __table_args__ = (
+        # Одна запись на пользователя и достижение (выдача через upsert)
+        Index(
+            "uq_user_achievements_user_achievement",
+            "user_id",
+            "achievement_id",
+            unique=True,
+        ),
+        # Подсчет получивших достижение (таблица редкости)
+        Index(
+            "ix_user_achievements_achievement_unlocked", "achievement_id", "is_unlocked"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -70,8 +98,8 @@ class UserAchievement(Base):
         Integer, ForeignKey("achievements.id", ondelete="CASCADE"), nullable=False
     )
 
-    # Текущий прогресс пользователя (для неполученных достижений)
-    # Например: 3 из 10 побед
+    # Прогресс на момент записи (для условий, которые нельзя вычислить
+    # из статистики пользователя). Например: 3 из 10 побед
     progress: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
     # Флаг разблокировки
@@ -89,3 +117,27 @@ class UserAchievement(Base):
 
     def __repr__(self) -> str:
         return f"<UserAchievement(user_id={self.user_id}, achievement_id={self.achievement_id}, unlocked={self.is_unlocked})>"
+
+
+class AchievementCatalogVersion(Base):
+    """
+    Версия каталога достижений (одна строка)
+
+    Увеличивается при каждом изменении каталога; воркеры сверяют ее и
+    перезагружают каталог в памяти, только если версия изменилась.
+    """
+
+    __tablename__ = "achievement_catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+    version: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<AchievementCatalogVersion(version={self.version})>"
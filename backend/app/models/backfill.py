@@ -0,0 +1,33 @@
+"""
+Модель контрольных точек фоновых пересчетов (backfill)
+"""
+from datetime import datetime
+
+from sqlalchemy import Boolean, DateTime, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class BackfillCheckpoint(Base):
+    """Прогресс пересчета: позволяет продолжить с места остановки"""
+
+    __tablename__ = "backfill_checkpoints"
+
+    # Имя задачи, например "user_stats"
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+
+    # Последний обработанный ID (keyset)
+    last_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    processed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    is_completed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<BackfillCheckpoint(name='{self.name}', last_id={self.last_id})>"
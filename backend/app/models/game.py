@@ -1,11 +1,11 @@
 """
 Модели для игр
 """
-from datetime import datetime
+from datetime import UTC, datetime
 from enum import Enum
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, JSON, String, func
+from sqlalchemy import JSON, Boolean, DateTime, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -35,6 +35,15 @@ class Game(Base):
     """Модель игры"""
 
     __tablename__ = "games"
+    __table_args__ = (
+        # Индексы под фильтры и keyset-пагинацию списка игр (created_at, id)
+        Index("ix_games_created_at_id", "created_at", "id"),
+        Index("ix_games_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_games_mode_created_at_id", "mode", "created_at", "id"),
+        Index(
+            "ix_games_status_mode_created_at_id", "status", "mode", "created_at", "id"
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -53,14 +62,27 @@ class Game(Base):
     time_limit: Mapped[int] = mapped_column(Integer, nullable=False)  # В секундах
     max_players: Mapped[int] = mapped_column(Integer, default=10, nullable=False)
 
+    # Интервал пакетной рассылки ходов по WebSocket в мс (None - сразу)
+    batch_tick_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # Денормализованный счетчик участников (чтобы не загружать строки участников)
+    participants_count: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+
     # Создатель
     creator_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
 
     # Временные метки
+    # Значение задается на стороне приложения, чтобы курсор пагинации
+    # сравнивался с тем же форматом, в котором время хранится в БД (SQLite)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        server_default=func.now(),
+        nullable=False,
     )
     started_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
@@ -86,6 +108,12 @@ class GameParticipant(Base):
     """Модель участника игры"""
 
     __tablename__ = "game_participants"
+    __table_args__ = (
+        # Один пользователь может присоединиться к игре только один раз
+        Index("uq_game_participants_game_user", "game_id", "user_id", unique=True),
+        # История игр пользователя (пересчет статистики)
+        Index("ix_game_participants_user_finished", "user_id", "is_finished"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
 
@@ -0,0 +1,71 @@
+"""
+Модели для таблиц лидеров по периодам
+"""
+from datetime import date
+from enum import Enum
+
+from sqlalchemy import Date, ForeignKey, Index, Integer, String, desc
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class LeaderboardWindow(str, Enum):
+    """Периоды таблицы лидеров"""
+
+    ALL = "all"  # За все время
+    DAY = "day"  # За текущий день (UTC)
+    WEEK = "week"  # За текущую ISO-неделю
+    SEASON = "season"  # За текущий сезон (квартал)
+
+
+class LeaderboardBucket(Base):
+    """
+    Агрегат результатов игрока за период
+
+    Строка обновляется инкрементально при каждой победе и завершении игры,
+    поэтому таблица лидеров за период читается по индексу за O(limit).
+    """
+
+    __tablename__ = "leaderboard_buckets"
+    __table_args__ = (
+        # Одна строка на игрока в бакете (обновление через upsert)
+        Index(
+            "uq_leaderboard_buckets_period_bucket_user",
+            "period",
+            "bucket",
+            "user_id",
+            unique=True,
+        ),
+        # Порядок таблицы лидеров внутри бакета
+        Index(
+            "ix_leaderboard_buckets_ranking",
+            "period",
+            "bucket",
+            desc("wins"),
+            "best_time",
+        ),
+        # Удаление старых бакетов
+        Index("ix_leaderboard_buckets_period_start", "period", "period_start"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+
+    # Период (day, week, season) и ключ бакета, например "2024-05-01", "2024-W18"
+    period: Mapped[str] = mapped_column(String(10), nullable=False)
+    bucket: Mapped[str] = mapped_column(String(16), nullable=False)
+    # Начало периода (для удаления старых бакетов)
+    period_start: Mapped[date] = mapped_column(Date, nullable=False)
+
+    user_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+
+    # Результаты за период
+    games: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    wins: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    best_time: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    best_steps: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<LeaderboardBucket(period='{self.period}', bucket='{self.bucket}', user_id={self.user_id})>"
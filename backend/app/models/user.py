@@ -4,7 +4,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, DateTime, Integer, String, func
+from sqlalchemy import Boolean, DateTime, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -18,6 +18,10 @@ class User(Base):
     """Модель пользователя"""
 
     __tablename__ = "users"
+    __table_args__ = (
+        # Порядок таблицы лидеров (для перестройки рейтинга)
+        Index("ix_users_total_wins_best_time", "total_wins", "best_time"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     username: Mapped[str] = mapped_column(
@@ -47,6 +51,18 @@ class User(Base):
     best_time: Mapped[int | None] = mapped_column(Integer, nullable=True)  # В секундах
     best_steps: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
+    # Накопительные суммы по завершенным (дошедшим до цели) играм
+    # для расчета средних значений без сканирования истории
+    finished_games: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    finished_steps_sum: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    finished_time_sum: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+
     # Relationships
     game_participations: Mapped[list["GameParticipant"]] = relationship(
         "GameParticipant", back_populates="user", cascade="all, delete-orphan"
@@ -31,6 +31,7 @@ from .game import (
     GamePublic,
     GameUpdate,
 )
+from .leaderboard import LeaderboardPosition, LeaderboardRank
 from .user import (
     UserCreate,
     UserInDB,
@@ -39,6 +40,7 @@ from .user import (
     UserStats,
     UserUpdate,
 )
+from .ws import WSRequest, WSResponse
 
 __all__ = [
     # Auth
@@ -65,6 +67,12 @@ __all__ = [
     "GameMoveRequest",
     "GameMoveResponse",
     "GameListResponse",
+    # Leaderboard
+    "LeaderboardPosition",
+    "LeaderboardRank",
+    # WebSocket
+    "WSRequest",
+    "WSResponse",
     # Achievement
     "AchievementBase",
     "AchievementPublic",
@@ -22,6 +22,8 @@ class GameCreate(BaseModel):
     max_steps: int = Field(default=100, ge=1, le=1000)
     time_limit: int = Field(default=300, ge=30, le=3600)  # От 30 секунд до 1 часа
     max_players: int = Field(default=10, ge=1, le=50)
+    # Ходы рассылаются одним сообщением moves_batch раз в batch_tick_ms
+    batch_tick_ms: int | None = Field(default=None, ge=50, le=1000)
 
 
 class GameUpdate(BaseModel):
@@ -73,6 +75,7 @@ class GameBase(BaseModel):
     max_steps: int
     time_limit: int
     max_players: int
+    batch_tick_ms: int | None = None
     created_at: datetime
 
 
@@ -120,6 +123,7 @@ class GameListResponse(BaseModel):
     """Список игр"""
 
     games: list[GamePublic]
-    total: int
+    total: int  # Приблизительное общее количество
     page: int
     page_size: int
+    next_cursor: str | None = None  # Курсор следующей страницы
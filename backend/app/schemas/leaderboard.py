@@ -0,0 +1,21 @@
+"""
+Схемы для таблицы лидеров
+"""
+from pydantic import BaseModel
+
+from app.schemas.user import UserPublic
+
+
+class LeaderboardPosition(BaseModel):
+    """Позиция в таблице лидеров"""
+
+    rank: int
+    user: UserPublic
+
+
+class LeaderboardRank(BaseModel):
+    """Место пользователя и соседи по таблице лидеров"""
+
+    rank: int
+    total: int  # Всего игроков в рейтинге
+    around: list[LeaderboardPosition]
@@ -0,0 +1,24 @@
+"""
+Схемы протокола WebSocket
+"""
+from typing import Any, Literal
+
+from pydantic import BaseModel
+
+
+class WSRequest(BaseModel):
+    """Запрос клиента по WebSocket (RPC)"""
+
+    id: int | str | None = None  # Идентификатор запроса, возвращается в ответе
+    type: Literal["move", "available_links", "ping", "pong"]
+    article: str | None = None  # Для move
+
+
+class WSResponse(BaseModel):
+    """Ответ сервера на запрос клиента"""
+
+    type: Literal["response"] = "response"
+    id: int | str | None = None
+    ok: bool
+    result: dict[str, Any] | None = None
+    error: str | None = None
@@ -4,6 +4,7 @@ Business logic services
 from .achievement_service import achievement_service
 from .auth_service import auth_service
 from .game_service import game_service
+from .leaderboard_service import leaderboard_service
 from .websocket_service import websocket_manager
 from .wikipedia_service import wikipedia_service
 
@@ -11,6 +12,7 @@ __all__ = [
     "achievement_service",
     "auth_service",
     "game_service",
+    "leaderboard_service",
     "wikipedia_service",
     "websocket_manager",
 ]
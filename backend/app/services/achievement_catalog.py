@@ -0,0 +1,157 @@
+"""
+Каталог достижений в памяти
+
+Достижения - статичные данные (seed_achievements.py), поэтому каталог
+загружается один раз в неизменяемый снимок: индексы по id и коду, цепочки
+уже разрешены в достижения, правила выдачи скомпилированы. Снимок
+заменяется целиком, когда меняется строка версии каталога в БД; версия
+сверяется не чаще раза в ACHIEVEMENT_CATALOG_CHECK_INTERVAL секунд.
+"""
+import asyncio
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.achievement import Achievement, AchievementCatalogVersion
+from app.services.achievement_rules import RuleIndex
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogAchievement:
+    """Достижение каталога (поля совпадают с моделью Achievement)"""
+
+    id: int
+    code: str
+    name: str
+    description: str
+    icon: str | None
+    category: str
+    rarity: str
+    requirement: dict
+    points: int
+    chain: list | None
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, achievement: Achievement) -> "CatalogAchievement":
+        return cls(
+            id=achievement.id,
+            code=achievement.code,
+            name=achievement.name,
+            description=achievement.description,
+            icon=achievement.icon,
+            category=achievement.category,
+            rarity=achievement.rarity,
+            requirement=achievement.requirement,
+            points=achievement.points,
+            chain=achievement.chain,
+            created_at=achievement.created_at,
+        )
+
+
+class AchievementCatalog:
+    """Неизменяемый снимок каталога одной версии"""
+
+    def __init__(self, achievements: Iterable[CatalogAchievement], version: int):
+        self.version = version
+        self.achievements = tuple(sorted(achievements, key=lambda a: a.id))
+        self.by_id = {a.id: a for a in self.achievements}
+        self.by_code = {a.code: a for a in self.achievements}
+
+        # Цепочки в порядке, заданном в достижении (неизвестные коды пропущены)
+        self.chains = {
+            a.id: tuple(self.by_code[code] for code in a.chain if code in self.by_code)
+            for a in self.achievements
+            if a.chain
+        }
+
+        self.rules = RuleIndex.compile(self.achievements)
+
+    def __len__(self) -> int:
+        return len(self.achievements)
+
+    def get(self, achievement_id: int) -> CatalogAchievement | None:
+        return self.by_id.get(achievement_id)
+
+    def get_by_code(self, code: str) -> CatalogAchievement | None:
+        return self.by_code.get(code)
+
+    def chain(self, achievement_id: int) -> tuple[CatalogAchievement, ...]:
+        """Связанные достижения цепочки"""
+        return self.chains.get(achievement_id, ())
+
+
+async def get_catalog_version(db: AsyncSession) -> int:
+    """Текущая версия каталога (0 - каталог еще не версионировался)"""
+    result = await db.execute(
+        select(AchievementCatalogVersion.version).where(
+            AchievementCatalogVersion.id == 1
+        )
+    )
+    return result.scalar() or 0
+
+
+async def bump_catalog_version(db: AsyncSession) -> None:
+    """
+    Увеличение версии каталога после его изменения
+
+    Не делает commit: вызывается в транзакции, изменяющей каталог.
+    """
+    stmt = dialect_insert(db, AchievementCatalogVersion).values(id=1, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={"version": AchievementCatalogVersion.version + 1},
+    )
+    await db.execute(stmt)
+
+
+class CatalogCache:
+    """Текущий снимок каталога с проверкой версии"""
+
+    def __init__(
+        self, check_interval: float = settings.ACHIEVEMENT_CATALOG_CHECK_INTERVAL
+    ):
+        self.check_interval = check_interval
+        self.catalog: AchievementCatalog | None = None
+        self._checked_at = 0.0
+        self._load_lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self.catalog is not None
+            and time.monotonic() - self._checked_at < self.check_interval
+        )
+
+    async def get(self, db: AsyncSession) -> AchievementCatalog:
+        """Снимок каталога; при изменении версии загружается заново"""
+        if not self._is_fresh():
+            async with self._load_lock:
+                if not self._is_fresh():
+                    await self._refresh(db)
+
+        catalog = self.catalog
+        assert catalog is not None
+        return catalog
+
+    async def _refresh(self, db: AsyncSession) -> None:
+        version = await get_catalog_version(db)
+
+        if self.catalog is None or self.catalog.version != version:
+            result = await db.execute(select(Achievement))
+            self.catalog = AchievementCatalog(
+                (CatalogAchievement.from_model(a) for a in result.scalars().all()),
+                version,
+            )
+
+        self._checked_at = time.monotonic()
+
+    def reset(self) -> None:
+        """Сброс снимка (будет загружен при следующем обращении)"""
+        self.catalog = None
+        self._checked_at = 0.0
@@ -0,0 +1,142 @@
+"""
+Скомпилированные правила достижений
+
+Каталог достижений один раз превращается в индекс правил по типу
+статистики. Для счетчиков (games_played, games_won) цель достигнута, когда
+значение >= target, для рекордов (best_time, best_steps) - когда
+значение <= target. События игры передают, какие показатели изменились,
+и проверяются только правила, зависящие от них. Прогресс неполученных
+достижений не хранится, а вычисляется правилом из статистики.
+"""
+from bisect import bisect_right
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from app.models.user import User
+
+# Тип требования -> атрибут статистики пользователя
+STAT_ATTRIBUTES: dict[str, str] = {
+    "games_played": "total_games",
+    "games_won": "total_wins",
+    "best_time": "best_time",
+    "best_steps": "best_steps",
+}
+
+# Показатели, у которых меньшее значение лучше
+LOWER_IS_BETTER = frozenset({"best_time", "best_steps"})
+
+
+def get_user_stats(user: User) -> dict[str, int | None]:
+    """Статистика пользователя по типам требований (None - результата нет)"""
+    return {
+        stat: getattr(user, attribute) for stat, attribute in STAT_ATTRIBUTES.items()
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class AchievementRule:
+    """Условие одного достижения"""
+
+    achievement_id: int
+    stat: str
+    target: int
+    lower_is_better: bool
+
+    def is_met(self, value: int | None) -> bool:
+        """Достигнута ли цель при значении показателя"""
+        if value is None:
+            return False
+        if self.lower_is_better:
+            return value <= self.target
+        return value >= self.target
+
+    def progress(self, value: int | None) -> int:
+        """Прогресс для отображения (от 0 до target)"""
+        if value is None:
+            return 0
+        if self.lower_is_better:
+            # У рекордов нет промежуточного прогресса: цель либо достигнута
+            return self.target if value <= self.target else 0
+        return min(value, self.target)
+
+
+class RuleIndex:
+    """
+    Правила, сгруппированные по типу статистики
+
+    Счетчики упорядочены по возрастанию target, рекорды - по убыванию,
+    поэтому выполненные при данном значении правила образуют префикс списка
+    и находятся бинарным поиском, без перебора остальных.
+    """
+
+    def __init__(self, rules: Iterable[AchievementRule]):
+        grouped: dict[str, list[AchievementRule]] = {}
+        self.by_id: dict[int, AchievementRule] = {}
+        for rule in rules:
+            grouped.setdefault(rule.stat, []).append(rule)
+            self.by_id[rule.achievement_id] = rule
+
+        self.by_stat: dict[str, tuple[AchievementRule, ...]] = {}
+        # Ключи бинарного поиска: target для счетчиков, -target для рекордов
+        self._keys: dict[str, list[int]] = {}
+
+        for stat, stat_rules in grouped.items():
+            sign = -1 if stat in LOWER_IS_BETTER else 1
+            stat_rules.sort(key=lambda r: sign * r.target)
+            self.by_stat[stat] = tuple(stat_rules)
+            self._keys[stat] = [sign * r.target for r in stat_rules]
+
+    @classmethod
+    def compile(cls, achievements: Iterable[Any]) -> "RuleIndex":
+        """
+        Индекс из каталога достижений (объекты с id и requirement)
+        Достижения с неизвестным типом требования пропускаются
+        """
+        rules = []
+        for achievement in achievements:
+            requirement = achievement.requirement or {}
+            stat = requirement.get("type")
+            if stat not in STAT_ATTRIBUTES:
+                continue
+            rules.append(
+                AchievementRule(
+                    achievement_id=achievement.id,
+                    stat=stat,
+                    target=requirement.get("target", 0),
+                    lower_is_better=stat in LOWER_IS_BETTER,
+                )
+            )
+        return cls(rules)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, achievement_id: int) -> AchievementRule | None:
+        """Правило достижения (None - условие не вычисляется из статистики)"""
+        return self.by_id.get(achievement_id)
+
+    def met(
+        self,
+        stats: dict[str, int | None],
+        changed: Iterable[str] | None = None,
+    ) -> list[AchievementRule]:
+        """
+        Правила, выполненные при текущей статистике
+        changed - изменившиеся показатели (None - все)
+        """
+        stat_names = self.by_stat.keys() if changed is None else changed
+        met: list[AchievementRule] = []
+
+        for stat in stat_names:
+            rules = self.by_stat.get(stat)
+            value = stats.get(stat)
+            if not rules or value is None:
+                continue
+
+            # Выполненные правила - префикс: ключ <= value для счетчиков
+            # и <= -value для рекордов
+            key = -value if stat in LOWER_IS_BETTER else value
+            met.extend(rules[: bisect_right(self._keys[stat], key)])
+
+        return met
@@ -1,107 +1,286 @@
 """
 Сервис для работы с достижениями
+
+Редкость достижений (процент получивших) хранится в памяти в RarityTable:
+таблица строится одним сгруппированным запросом, обновляется при выдаче
+достижений и периодически перестраивается в фоне.
+
+Условия выдачи проверяются по скомпилированному индексу правил (RuleIndex):
+события игры передают изменившиеся показатели, и проверяются только
+зависящие от них достижения.
+
+Хранение разреженное: UserAchievement создается только при получении
+достижения, прогресс остальных вычисляется из статистики пользователя.
+Сам каталог (и правила) берется из снимка в памяти (CatalogCache), так что
+к БД обращаются только за данными пользователя.
+
+Карточки шаринга собираются при выдаче достижения и хранятся в ShareCache
+готовым JSON с ETag; карточка пересобирается, только когда редкость
+достижения переходит в другой бакет.
 """
-from datetime import datetime, timezone
+import asyncio
+import hashlib
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any
 
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from app.models.achievement import Achievement, UserAchievement
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.achievement import UserAchievement
 from app.models.user import User
+from app.schemas.achievement import ShareAchievementResponse
+from app.services.achievement_catalog import (
+    AchievementCatalog,
+    CatalogAchievement,
+    CatalogCache,
+)
+from app.services.achievement_rules import AchievementRule, get_user_stats
+from app.services.websocket_service import websocket_manager
+
+
+def unlock_upsert(
+    db: AsyncSession,
+    unlocks: Iterable[tuple[int, AchievementRule]],
+    unlocked_at: datetime,
+) -> Any:
+    """
+    Выдача достижений одним upsert по (user_id, achievement_id)
+
+    Уже полученные достижения не меняются; RETURNING возвращает
+    (user_id, achievement_id, unlocked_at) выданных именно этим запросом.
+    """
+    stmt = dialect_insert(db, UserAchievement).values(
+        [
+            {
+                "user_id": user_id,
+                "achievement_id": rule.achievement_id,
+                "progress": rule.target,
+                "is_unlocked": True,
+                "unlocked_at": unlocked_at,
+            }
+            for user_id, rule in unlocks
+        ]
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "achievement_id"],
+        set_={
+            "progress": stmt.excluded.progress,
+            "is_unlocked": True,
+            "unlocked_at": stmt.excluded.unlocked_at,
+        },
+        where=UserAchievement.is_unlocked == False,
+    ).returning(
+        UserAchievement.user_id,
+        UserAchievement.achievement_id,
+        UserAchievement.unlocked_at,
+    )
+
+
+class RarityTable:
+    """Количество получивших каждое достижение и общее число игроков"""
+
+    def __init__(self):
+        self.unlocked_counts: dict[int, int] = {}
+        self.total_users = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def refresh(self, db: AsyncSession) -> None:
+        """Перестроение таблицы: один GROUP BY и один COUNT"""
+        result = await db.execute(
+            select(UserAchievement.achievement_id, func.count())
+            .where(UserAchievement.is_unlocked == True)
+            .group_by(UserAchievement.achievement_id)
+        )
+        unlocked_counts = dict(result.all())
 
+        total_users_result = await db.execute(select(func.count(User.id)))
 
-class AchievementService:
-    """Сервис для управления достижениями"""
+        self.unlocked_counts = unlocked_counts
+        self.total_users = total_users_result.scalar() or 0
+        self._loaded = True
 
-    async def initialize_user_achievements(
-        self, db: AsyncSession, user_id: int
-    ) -> None:
-        """
-        Инициализация записей достижений для пользователя
-        Создает UserAchievement для всех существующих достижений
-        """
-        # Получаем все достижения
-        result = await db.execute(select(Achievement))
-        achievements = result.scalars().all()
-
-        # Проверяем, какие достижения уже есть у пользователя
-        existing_result = await db.execute(
-            select(UserAchievement.achievement_id).where(
-                UserAchievement.user_id == user_id
-            )
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Ленивая загрузка таблицы при первом обращении"""
+        if self._loaded:
+            return
+
+        async with self._load_lock:
+            if not self._loaded:
+                await self.refresh(db)
+
+    def record_unlock(self, achievement_id: int) -> None:
+        """Инкрементальное обновление после выдачи достижения"""
+        if not self._loaded:
+            # Выдача уже учтется при загрузке таблицы
+            return
+
+        self.unlocked_counts[achievement_id] = (
+            self.unlocked_counts.get(achievement_id, 0) + 1
         )
-        existing_ids = set(existing_result.scalars().all())
-
-        # Создаем записи для недостающих достижений
-        for achievement in achievements:
-            if achievement.id not in existing_ids:
-                user_achievement = UserAchievement(
-                    user_id=user_id,
-                    achievement_id=achievement.id,
-                    progress=0,
-                    is_unlocked=False,
-                )
-                db.add(user_achievement)
 
-        await db.commit()
+    def percentage(self, achievement_id: int) -> float:
+        """Процент игроков, получивших достижение"""
+        total_users = max(self.total_users, 1)
+        unlocked_count = self.unlocked_counts.get(achievement_id, 0)
+        return round(min(unlocked_count / total_users * 100, 100.0), 2)
+
+    def reset(self) -> None:
+        """Сброс таблицы (будет перестроена при следующем обращении)"""
+        self.unlocked_counts = {}
+        self.total_users = 0
+        self._loaded = False
+
+
+def _format_percentage(percentage: float) -> str:
+    """Процент для текста: меньше 1% - с сотыми, чтобы редкость была видна"""
+    return f"{percentage:.2f}" if percentage < 1 else f"{percentage:.1f}"
+
+
+@dataclass(frozen=True, slots=True)
+class SharePayload:
+    """Готовая карточка шаринга"""
+
+    body: bytes  # JSON ShareAchievementResponse
+    etag: str
+    rarity_bucket: int
+
+
+class ShareCache:
+    """Карточки шаринга по (user_id, код достижения), вытеснение LRU"""
+
+    def __init__(
+        self,
+        max_size: int = settings.ACHIEVEMENT_SHARE_CACHE_SIZE,
+        rarity_step: float = settings.ACHIEVEMENT_SHARE_RARITY_STEP,
+    ):
+        self.max_size = max_size
+        self.rarity_step = rarity_step
+        self._entries: OrderedDict[tuple[int, str], SharePayload] = OrderedDict()
+
+    def rarity_bucket(self, rarity_percentage: float) -> int:
+        """Бакет редкости: карточка устаревает при переходе в другой бакет"""
+        return int(rarity_percentage // self.rarity_step)
+
+    def get(
+        self, user_id: int, code: str, rarity_percentage: float
+    ) -> SharePayload | None:
+        """Карточка из кеша или None, если ее нет или она устарела"""
+        key = (user_id, code)
+        payload = self._entries.get(key)
+        if payload is None:
+            return None
+
+        if payload.rarity_bucket != self.rarity_bucket(rarity_percentage):
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return payload
+
+    def put(self, user_id: int, code: str, share_data: dict) -> SharePayload:
+        """Сборка карточки из данных get_share_data и сохранение в кеше"""
+        response = ShareAchievementResponse(**share_data)
+        rarity_bucket = self.rarity_bucket(share_data["rarity_percentage"])
+        # ETag зависит от бакета, а не от точного процента: все воркеры
+        # выдают один ETag, пока редкость не перешла в другой бакет
+        version = response.model_dump_json(exclude={"rarity_percentage", "share_text"})
+        digest = hashlib.sha1(f"{version}:{rarity_bucket}".encode()).hexdigest()
+        payload = SharePayload(
+            body=response.model_dump_json().encode(),
+            etag=f'"{digest}"',
+            rarity_bucket=rarity_bucket,
+        )
+
+        key = (user_id, code)
+        self._entries[key] = payload
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        return payload
+
+    def reset(self) -> None:
+        self._entries.clear()
+
+
+class AchievementService:
+    """Сервис для управления достижениями"""
+
+    def __init__(self):
+        self.rarity = RarityTable()
+        self.catalog = CatalogCache()
+        self.shares = ShareCache()
 
     async def check_and_grant_achievements(
-        self, db: AsyncSession, user_id: int
-    ) -> list[Achievement]:
+        self,
+        db: AsyncSession,
+        user_id: int,
+        changed_stats: Iterable[str] | None = None,
+    ) -> list[CatalogAchievement]:
         """
         Проверяет условия и выдает достижения пользователю
+        changed_stats - изменившиеся показатели (None - проверить все правила)
+        Новые достижения отправляются в личный канал пользователя (WebSocket)
         Возвращает список новых полученных достижений
         """
-        # Получаем пользователя с полной статистикой
-        user_result = await db.execute(select(User).where(User.id == user_id))
-        user = user_result.scalar_one_or_none()
+        user = await db.get(User, user_id)
 
         if not user:
             return []
 
-        # Получаем все достижения с прогрессом пользователя
-        result = await db.execute(
-            select(UserAchievement)
-            .options(selectinload(UserAchievement.achievement))
-            .where(
-                UserAchievement.user_id == user_id, UserAchievement.is_unlocked == False
-            )
-        )
-        user_achievements = result.scalars().all()
+        catalog = await self.catalog.get(db)
+        met = catalog.rules.met(get_user_stats(user), changed_stats)
 
-        newly_granted = []
+        if not met:
+            return []
+
+        # Выдача одним upsert; повторная выдача уже полученных невозможна
+        now = datetime.now(UTC)
+        stmt = unlock_upsert(db, [(user_id, rule) for rule in met], now)
+        result = await db.execute(stmt)
+        # achievement_id -> сохраненное unlocked_at
+        granted = {row.achievement_id: row.unlocked_at for row in result.all()}
+        await db.commit()
 
-        for ua in user_achievements:
-            achievement = ua.achievement
-            requirement = achievement.requirement
-            req_type = requirement.get("type")
-            target = requirement.get("target", 0)
+        newly_granted = [catalog.by_id[a_id] for a_id in sorted(granted)]
 
-            # Проверяем текущее значение статистики
-            current_value = self._get_stat_value(user, req_type)
+        for achievement in newly_granted:
+            self.rarity.record_unlock(achievement.id)
 
-            # Обновляем прогресс
-            ua.progress = min(current_value, target)
+        # Карточки шаринга готовы к первому запросу
+        if newly_granted:
+            await self.rarity.ensure_loaded(db)
+        for achievement in newly_granted:
+            self.shares.put(
+                user_id,
+                achievement.code,
+                self._share_data(achievement, user.username, granted[achievement.id]),
+            )
 
-            # Проверяем, достигнута ли цель
-            if current_value >= target:
-                ua.is_unlocked = True
-                ua.unlocked_at = datetime.now(timezone.utc)
-                newly_granted.append(achievement)
+        # Сообщаем о новых достижениях через WebSocket, чтобы клиенту
+        # не нужно было опрашивать POST /achievements/check
+        if newly_granted:
+            await websocket_manager.notify_achievements_unlocked(user_id, newly_granted)
 
-        await db.commit()
         return newly_granted
 
-    def _get_stat_value(self, user: User, stat_type: str) -> int:
-        """Получить значение статистики пользователя по типу"""
-        stat_mapping = {
-            "games_played": user.total_games,
-            "games_won": user.total_wins,
-            "best_time": user.best_time or 999999,
-            "best_steps": user.best_steps or 999999,
-        }
-        return stat_mapping.get(stat_type, 0)
+    def _progress(
+        self,
+        catalog: AchievementCatalog,
+        stats: dict[str, int | None],
+        achievement_id: int,
+    ) -> int:
+        """Прогресс неполученного достижения из статистики пользователя"""
+        rule = catalog.rules.get(achievement_id)
+        if rule is None:
+            return 0
+        return rule.progress(stats.get(rule.stat))
 
     async def get_user_achievements(
         self, db: AsyncSession, user_id: int
@@ -110,48 +289,46 @@ class AchievementService:
         Получить все достижения пользователя с группировкой
         Возвращает словарь с unlocked и locked достижениями
         """
-        # Инициализируем достижения для пользователя, если их нет
-        await self.initialize_user_achievements(db, user_id)
-
-        # Получаем все достижения пользователя
-        result = await db.execute(
-            select(UserAchievement)
-            .options(selectinload(UserAchievement.achievement))
-            .where(UserAchievement.user_id == user_id)
+        catalog = await self.catalog.get(db)
+        user = await db.get(User, user_id)
+        stats = get_user_stats(user) if user else {}
+
+        # Записи есть только у полученных достижений
+        unlocked_result = await db.execute(
+            select(
+                UserAchievement.achievement_id,
+                UserAchievement.progress,
+                UserAchievement.unlocked_at,
+            ).where(
+                UserAchievement.user_id == user_id,
+                UserAchievement.is_unlocked == True,
+            )
         )
-        user_achievements = result.scalars().all()
+        unlocked_rows = {row.achievement_id: row for row in unlocked_result.all()}
 
-        # Считаем общее количество пользователей для расчета редкости
-        total_users_result = await db.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar() or 1
+        await self.rarity.ensure_loaded(db)
 
         unlocked = []
         locked = []
         total_points = 0
 
-        for ua in user_achievements:
-            achievement = ua.achievement
-
-            # Считаем процент получивших это достижение
-            unlocked_count_result = await db.execute(
-                select(func.count(UserAchievement.id)).where(
-                    UserAchievement.achievement_id == achievement.id,
-                    UserAchievement.is_unlocked == True,
-                )
-            )
-            unlocked_count = unlocked_count_result.scalar() or 0
-            rarity_percentage = (unlocked_count / total_users * 100) if total_users > 0 else 0
+        for achievement in catalog.achievements:
+            row = unlocked_rows.get(achievement.id)
+            if row:
+                progress = row.progress
+            else:
+                progress = self._progress(catalog, stats, achievement.id)
 
             achievement_data = {
                 "achievement": achievement,
-                "progress": ua.progress,
-                "is_unlocked": ua.is_unlocked,
-                "unlocked_at": ua.unlocked_at,
-                "rarity_percentage": round(rarity_percentage, 2),
+                "progress": progress,
+                "is_unlocked": row is not None,
+                "unlocked_at": row.unlocked_at if row else None,
+                "rarity_percentage": self.rarity.percentage(achievement.id),
                 "target": achievement.requirement.get("target", 0),
             }
 
-            if ua.is_unlocked:
+            if row:
                 unlocked.append(achievement_data)
                 total_points += achievement.points
             else:
@@ -167,70 +344,53 @@ class AchievementService:
         self, db: AsyncSession, achievement_id: int, user_id: int
     ) -> dict | None:
         """Получить детальную информацию о достижении"""
-        # Получаем достижение
-        ach_result = await db.execute(
-            select(Achievement).where(Achievement.id == achievement_id)
-        )
-        achievement = ach_result.scalar_one_or_none()
+        catalog = await self.catalog.get(db)
+        achievement = catalog.get(achievement_id)
 
         if not achievement:
             return None
 
-        # Получаем прогресс пользователя
+        # Запись есть, только если достижение получено
         ua_result = await db.execute(
             select(UserAchievement).where(
                 UserAchievement.user_id == user_id,
                 UserAchievement.achievement_id == achievement_id,
+                UserAchievement.is_unlocked == True,
             )
         )
         user_achievement = ua_result.scalar_one_or_none()
 
-        # Считаем редкость
-        total_users_result = await db.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar() or 1
+        if user_achievement:
+            progress = user_achievement.progress
+        else:
+            user = await db.get(User, user_id)
+            stats = get_user_stats(user) if user else {}
+            progress = self._progress(catalog, stats, achievement_id)
 
-        unlocked_count_result = await db.execute(
-            select(func.count(UserAchievement.id)).where(
-                UserAchievement.achievement_id == achievement_id,
-                UserAchievement.is_unlocked == True,
-            )
-        )
-        unlocked_count = unlocked_count_result.scalar() or 0
-        rarity_percentage = (unlocked_count / total_users * 100) if total_users > 0 else 0
-
-        # Получаем связанные достижения из цепочки
-        related_achievements = []
-        if achievement.chain:
-            related_result = await db.execute(
-                select(Achievement).where(Achievement.code.in_(achievement.chain))
-            )
-            related_achievements = related_result.scalars().all()
+        await self.rarity.ensure_loaded(db)
 
         return {
             "achievement": achievement,
-            "progress": user_achievement.progress if user_achievement else 0,
-            "is_unlocked": user_achievement.is_unlocked if user_achievement else False,
+            "progress": progress,
+            "is_unlocked": user_achievement is not None,
             "unlocked_at": user_achievement.unlocked_at if user_achievement else None,
-            "rarity_percentage": round(rarity_percentage, 2),
-            "related_achievements": related_achievements,
+            "rarity_percentage": self.rarity.percentage(achievement_id),
+            # Цепочка разрешена при загрузке каталога
+            "related_achievements": list(catalog.chain(achievement_id)),
         }
 
     async def get_share_data(
         self, db: AsyncSession, achievement_code: str, user_id: int
     ) -> dict | None:
         """Получить данные для шаринга достижения"""
-        # Получаем достижение по коду
-        ach_result = await db.execute(
-            select(Achievement).where(Achievement.code == achievement_code)
-        )
-        achievement = ach_result.scalar_one_or_none()
+        catalog = await self.catalog.get(db)
+        achievement = catalog.get_by_code(achievement_code)
 
         if not achievement:
             return None
 
         # Получаем пользователя
-        user_result = await db.execute(select(User).where(User.id == user_id))
-        user = user_result.scalar_one_or_none()
+        user = await db.get(User, user_id)
 
         if not user:
             return None
@@ -248,40 +408,80 @@ class AchievementService:
         if not user_achievement:
             return None  # Нельзя поделиться неполученным достижением
 
-        # Считаем редкость
-        total_users_result = await db.execute(select(func.count(User.id)))
-        total_users = total_users_result.scalar() or 1
+        await self.rarity.ensure_loaded(db)
 
-        unlocked_count_result = await db.execute(
-            select(func.count(UserAchievement.id)).where(
-                UserAchievement.achievement_id == achievement.id,
-                UserAchievement.is_unlocked == True,
-            )
+        return self._share_data(
+            achievement, user.username, user_achievement.unlocked_at
         )
-        unlocked_count = unlocked_count_result.scalar() or 0
-        rarity_percentage = (unlocked_count / total_users * 100) if total_users > 0 else 0
+
+    def _share_data(
+        self,
+        achievement: CatalogAchievement,
+        user_name: str,
+        unlocked_at: datetime | None,
+    ) -> dict:
+        """
+        Данные карточки шаринга (таблица редкости должна быть загружена)
+
+        Время получения берется сохраненное, поэтому ETag карточки
+        одинаков на всех воркерах.
+        """
+        rarity_percentage = self.rarity.percentage(achievement.id)
+        # SQLite возвращает время без часового пояса, PostgreSQL - с ним
+        if unlocked_at is not None:
+            if unlocked_at.tzinfo is None:
+                unlocked_at = unlocked_at.replace(tzinfo=UTC)
+            else:
+                unlocked_at = unlocked_at.astimezone(UTC)
 
         # Формируем текст для шаринга
         share_text = (
             f"🏆 Я получил достижение '{achievement.name}' в WikiRush!\n"
-            f"📊 Это достижение получили только {rarity_percentage:.1f}% игроков!\n"
+            f"📊 Это достижение получили только "
+            f"{_format_percentage(rarity_percentage)}% игроков!\n"
             f"🎮 Присоединяйся к игре!"
         )
 
         return {
             "achievement": achievement,
-            "unlocked_at": user_achievement.unlocked_at,
-            "user_name": user.username,
-            "rarity_percentage": round(rarity_percentage, 2),
+            "unlocked_at": unlocked_at,
+            "user_name": user_name,
+            "rarity_percentage": rarity_percentage,
             "share_text": share_text,
         }
 
+    async def get_share_payload(
+        self, db: AsyncSession, achievement_code: str, user_id: int
+    ) -> SharePayload | None:
+        """
+        Карточка шаринга из кеша (собирается, если ее нет или она устарела)
+        Возвращает None, если достижение не найдено или не получено
+        """
+        catalog = await self.catalog.get(db)
+        achievement = catalog.get_by_code(achievement_code)
+
+        if not achievement:
+            return None
+
+        await self.rarity.ensure_loaded(db)
+        payload = self.shares.get(
+            user_id, achievement_code, self.rarity.percentage(achievement.id)
+        )
+        if payload is not None:
+            return payload
+
+        share_data = await self.get_share_data(db, achievement_code, user_id)
+        if share_data is None:
+            return None
+
+        return self.shares.put(user_id, achievement_code, share_data)
+
     async def get_achievement_by_code(
         self, db: AsyncSession, code: str
-    ) -> Achievement | None:
+    ) -> CatalogAchievement | None:
         """Получить достижение по коду"""
-        result = await db.execute(select(Achievement).where(Achievement.code == code))
-        return result.scalar_one_or_none()
+        catalog = await self.catalog.get(db)
+        return catalog.get_by_code(code)
 
 
 # Singleton instance
@@ -1,25 +1,57 @@
 """
 Сервис аутентификации
+
+Проверка запроса не обращается к БД в установившемся режиме: проверенные
+access токены запоминаются (по sha256) до истечения срока, а краткие данные
+пользователя (AuthPrincipal) кешируются на AUTH_PRINCIPAL_CACHE_TTL секунд.
+Запись кеша удаляется при изменении is_active/is_superuser через ORM; в
+других воркерах изменение вступает в силу по истечении TTL.
 """
+import hashlib
+import time
+from dataclasses import dataclass
 
 from jose import JWTError
-from sqlalchemy import select
+from sqlalchemy import event, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.security import (
     create_access_token,
     create_refresh_token,
     decode_token,
-    get_password_hash,
-    verify_password,
+    password_hasher,
 )
 from app.models.user import User
 from app.schemas.auth import Token
 
 
+@dataclass(frozen=True, slots=True)
+class AuthPrincipal:
+    """Аутентифицированный пользователь (поля, нужные для проверки доступа)"""
+
+    id: int
+    username: str
+    is_active: bool
+    is_superuser: bool
+
+
 class AuthService:
     """Сервис для работы с аутентификацией"""
 
+    def __init__(
+        self,
+        principal_ttl: float = settings.AUTH_PRINCIPAL_CACHE_TTL,
+        cache_size: int = settings.AUTH_CACHE_SIZE,
+    ):
+        self.principal_ttl = principal_ttl
+        self.cache_size = cache_size
+        # user_id -> (AuthPrincipal, момент устаревания по time.monotonic)
+        self._principals: dict[int, tuple[AuthPrincipal, float]] = {}
+        # sha256 токена -> (user_id, exp токена по time.time)
+        self._verified_tokens: dict[str, tuple[int, float]] = {}
+
     async def authenticate_user(
         self, db: AsyncSession, username: str, password: str
     ) -> User | None:
@@ -30,7 +62,7 @@ class AuthService:
         if not user:
             return None
 
-        if not verify_password(password, user.hashed_password):
+        if not await password_hasher.verify(password, user.hashed_password):
             return None
 
         if not user.is_active:
@@ -41,18 +73,27 @@ class AuthService:
     async def create_user(
         self, db: AsyncSession, username: str, email: str, password: str
     ) -> User:
-        """Создание нового пользователя"""
-        hashed_password = get_password_hash(password)
+        """
+        Создание нового пользователя
 
-        user = User(
-            username=username,
-            email=email,
-            hashed_password=hashed_password,
-        )
+        Один INSERT ... RETURNING без предварительных проверок: уникальность
+        username и email проверяет БД, нарушение превращается в ValueError.
+        """
+        hashed_password = await password_hasher.hash(password)
 
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        try:
+            result = await db.execute(
+                insert(User)
+                .values(username=username, email=email, hashed_password=hashed_password)
+                .returning(User)
+            )
+            user = result.scalar_one()
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            if _is_unique_violation(e, "email"):
+                raise ValueError("Email уже используется") from e
+            raise ValueError("Пользователь с таким именем уже существует") from e
 
         return user
 
@@ -73,6 +114,79 @@ class AuthService:
         result = await db.execute(select(User).where(User.id == user_id))
         return result.scalar_one_or_none()
 
+    def get_user_id_from_access_token(self, token: str) -> int | None:
+        """ID пользователя из access токена или None, если токен невалиден"""
+        # Ключ - хеш всего токена: заголовок и payload тоже должны совпасть
+        token_key = hashlib.sha256(token.encode()).hexdigest()
+        verified = self._verified_tokens.get(token_key)
+        if verified is not None:
+            user_id, expires_at = verified
+            if expires_at > time.time():
+                return user_id
+            del self._verified_tokens[token_key]
+            return None
+
+        try:
+            payload = decode_token(token)
+
+            if payload.get("type") != "access":
+                return None
+
+            sub = payload.get("sub")
+            if sub is None:
+                return None
+
+            user_id = int(sub)
+
+        except (JWTError, ValueError):
+            return None
+
+        if "exp" in payload:
+            _put_bounded(
+                self._verified_tokens,
+                token_key,
+                (user_id, float(payload["exp"])),
+                self.cache_size,
+            )
+
+        return user_id
+
+    async def get_principal(
+        self, db: AsyncSession, user_id: int
+    ) -> AuthPrincipal | None:
+        """Краткие данные пользователя из кеша (или из БД при промахе)"""
+        cached = self._principals.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        result = await db.execute(
+            select(User.id, User.username, User.is_active, User.is_superuser).where(
+                User.id == user_id
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            self._principals.pop(user_id, None)
+            return None
+
+        principal = AuthPrincipal(*row)
+        _put_bounded(
+            self._principals,
+            user_id,
+            (principal, time.monotonic() + self.principal_ttl),
+            self.cache_size,
+        )
+        return principal
+
+    def invalidate_principal(self, user_id: int) -> None:
+        """Удаление пользователя из кеша (деактивация, смена прав)"""
+        self._principals.pop(user_id, None)
+
+    def reset_caches(self) -> None:
+        """Сброс кешей аутентификации"""
+        self._principals.clear()
+        self._verified_tokens.clear()
+
     def create_tokens(self, user_id: int) -> Token:
         """Создание access и refresh токенов"""
         access_token = create_access_token(subject=user_id)
@@ -108,5 +222,27 @@ class AuthService:
             return None
 
 
+def _is_unique_violation(error: IntegrityError, column: str) -> bool:
+    """Нарушена ли уникальность колонки users (текст ошибки SQLite/PostgreSQL)"""
+    message = str(error.orig)
+    return f"users.{column}" in message or f"users_{column}" in message
+
+
+def _put_bounded(cache: dict, key, value, max_size: int) -> None:
+    """Запись в кеш; при переполнении вытесняются самые старые записи"""
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > max_size:
+        del cache[next(iter(cache))]
+
+
 # Singleton instance
 auth_service = AuthService()
+
+
+@event.listens_for(User.is_active, "set")
+@event.listens_for(User.is_superuser, "set")
+def _invalidate_principal_on_change(target: User, value, oldvalue, initiator) -> None:
+    """Изменение прав пользователя сбрасывает его запись в кеше"""
+    if target.id is not None and value != oldvalue:
+        auth_service.invalidate_principal(target.id)
@@ -0,0 +1,176 @@
+"""
+Обработка RPC-запросов игроков по WebSocket
+
+Токен проверяется один раз при подключении, а пользователь и его текущая
+статья хранятся в контексте соединения, поэтому ход - это один кадр
+без повторной аутентификации и HTTP-запроса.
+"""
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.rate_limit import RateLimitExceeded, check_rate_limit
+from app.models.game import GameParticipant
+from app.schemas.ws import WSRequest, WSResponse
+from app.services.auth_service import auth_service
+from app.services.game_service import game_service
+from app.services.websocket_service import websocket_manager
+from app.services.wikipedia_service import wikipedia_service
+
+
+@dataclass
+class PlayerContext:
+    """Контекст аутентифицированного соединения"""
+
+    user_id: int
+    username: str
+    # Текущая статья игрока (None - игрок еще не присоединился к игре)
+    current_article: str | None = None
+
+
+class GameRPCService:
+    """Сервис RPC-запросов игры по WebSocket"""
+
+    async def authenticate(
+        self, db: AsyncSession, game_id: int, token: str
+    ) -> PlayerContext | None:
+        """Проверка токена при подключении и загрузка контекста игрока"""
+        user_id = auth_service.get_user_id_from_access_token(token)
+        if user_id is None:
+            return None
+
+        user = await auth_service.get_principal(db, user_id)
+        if user is None or not user.is_active:
+            return None
+
+        context = PlayerContext(user_id=user.id, username=user.username)
+        await self._load_participant(db, game_id, context)
+
+        return context
+
+    async def _load_participant(
+        self, db: AsyncSession, game_id: int, context: PlayerContext
+    ) -> None:
+        result = await db.execute(
+            select(GameParticipant.current_article).where(
+                GameParticipant.game_id == game_id,
+                GameParticipant.user_id == context.user_id,
+            )
+        )
+        context.current_article = result.scalar_one_or_none()
+
+    async def handle(
+        self,
+        db: AsyncSession,
+        game_id: int,
+        context: PlayerContext | None,
+        raw: str,
+    ) -> dict[str, Any] | None:
+        """
+        Обработка одного кадра клиента, возвращает ответ
+        (None - кадр не требует ответа, например pong на heartbeat)
+        """
+        try:
+            request = WSRequest.model_validate_json(raw)
+        except ValidationError:
+            return WSResponse(ok=False, error="Некорректный запрос").model_dump()
+
+        if request.type == "pong":
+            return None
+
+        if request.type == "ping":
+            return WSResponse(
+                id=request.id, ok=True, result={"pong": True}
+            ).model_dump()
+
+        if context is None:
+            return WSResponse(
+                id=request.id, ok=False, error="Требуется авторизация"
+            ).model_dump()
+
+        try:
+            if request.type == "move":
+                result = await self._move(db, game_id, context, request.article)
+            else:
+                result = await self._available_links(db, game_id, context)
+        except RateLimitExceeded as e:
+            return WSResponse(
+                id=request.id,
+                ok=False,
+                error=str(e),
+                result={"retry_after": e.retry_after},
+            ).model_dump()
+        except ValueError as e:
+            return WSResponse(id=request.id, ok=False, error=str(e)).model_dump()
+
+        return WSResponse(id=request.id, ok=True, result=result).model_dump()
+
+    async def _move(
+        self,
+        db: AsyncSession,
+        game_id: int,
+        context: PlayerContext,
+        article: str | None,
+    ) -> dict[str, Any]:
+        """Ход игрока (аналог POST /games/{id}/move)"""
+        if not article:
+            raise ValueError("Не указана статья")
+
+        participant, is_winner = await game_service.make_move(
+            db=db, game_id=game_id, user_id=context.user_id, article=article
+        )
+        context.current_article = participant.current_article
+
+        await websocket_manager.notify_player_move(
+            game_id=game_id,
+            username=context.username,
+            article=article,
+            steps=participant.steps_count,
+            batch_tick_ms=await game_service.get_batch_tick_ms(db, game_id),
+        )
+
+        if is_winner:
+            await websocket_manager.notify_player_won(
+                game_id=game_id,
+                username=context.username,
+                time=participant.time_taken or 0,
+                steps=participant.steps_count,
+            )
+            if await game_service.all_participants_finished(db, game_id):
+                await game_service.finish_game(db, game_id)
+
+        return {
+            "current_article": participant.current_article or "",
+            "steps_count": participant.steps_count,
+            "is_target_reached": is_winner,
+        }
+
+    async def _available_links(
+        self, db: AsyncSession, game_id: int, context: PlayerContext
+    ) -> dict[str, Any]:
+        """Доступные ссылки из текущей статьи игрока"""
+        # Статья перечитывается из БД: игрок мог присоединиться к игре после
+        # подключения сокета или сходить через HTTP или из другой вкладки
+        await self._load_participant(db, game_id, context)
+        if context.current_article is None:
+            raise ValueError("Вы не участвуете в этой игре")
+
+        # Та же квота, что у GET /games/{id}/available-links
+        await check_rate_limit("available_links", f"user:{context.user_id}")
+
+        links = await wikipedia_service.get_article_links(
+            context.current_article, limit=100
+        )
+
+        return {
+            "current_article": context.current_article,
+            "available_links": links,
+            "total_links": len(links),
+        }
+
+
+# Singleton instance
+game_rpc_service = GameRPCService()
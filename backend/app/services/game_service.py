@@ -1,20 +1,46 @@
 """
 Сервис для работы с играми
 """
+import base64
+import time
 from datetime import datetime
 
-from sqlalchemy import func, select
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.core.config import settings
 from app.models.game import Game, GameMode, GameParticipant, GameStatus
 from app.models.user import User
+from app.services.leaderboard_service import leaderboard_service
+from app.services.websocket_service import websocket_manager
 from app.services.wikipedia_service import wikipedia_service
 
 
+def _encode_cursor(created_at: datetime, game_id: int) -> str:
+    """Кодирование курсора пагинации (created_at, id) в непрозрачную строку"""
+    raw = f"{created_at.isoformat()}|{game_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Декодирование курсора пагинации"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, game_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(game_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Некорректный курсор пагинации")
+
+
 class GameService:
     """Сервис для работы с играми"""
 
+    def __init__(self):
+        # (status, mode) -> (время расчета, количество)
+        self._count_cache: dict[tuple[str | None, str | None], tuple[float, int]] = {}
+
     async def create_game(
         self,
         db: AsyncSession,
@@ -25,6 +51,7 @@ class GameService:
         max_steps: int,
         time_limit: int,
         max_players: int,
+        batch_tick_ms: int | None = None,
     ) -> Game:
         """Создание новой игры"""
         # Генерируем случайные статьи если не указаны
@@ -71,17 +98,20 @@ class GameService:
             max_steps=max_steps,
             time_limit=time_limit,
             max_players=max_players,
+            batch_tick_ms=batch_tick_ms,
             creator_id=creator_id,
         )
 
         db.add(game)
         await db.commit()
         await db.refresh(game)
+        self.invalidate_count_cache()
 
         # Автоматически присоединяем создателя
         await self.join_game(db, game.id, creator_id)
 
-        return game
+        # Перечитываем игру вместе с создателем и участниками для ответа
+        return await self.get_game(db, game.id) or game
 
     async def get_game(self, db: AsyncSession, game_id: int) -> Game | None:
         """Получение игры по ID"""
@@ -92,9 +122,56 @@ class GameService:
                 selectinload(Game.participants).selectinload(GameParticipant.user),
             )
             .where(Game.id == game_id)
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
 
+    async def get_batch_tick_ms(self, db: AsyncSession, game_id: int) -> int | None:
+        """
+        Интервал пакетной рассылки ходов игры
+
+        После make_move игра уже в identity map сессии, поэтому запроса нет.
+        """
+        game = await db.get(Game, game_id)
+        return game.batch_tick_ms if game else None
+
+    async def get_snapshot(self, db: AsyncSession, game_id: int) -> dict | None:
+        """
+        Компактный снимок состояния игры для переподключившегося клиента
+
+        Только статус и прогресс участников, без загрузки связей get_game.
+        """
+        status_result = await db.execute(select(Game.status).where(Game.id == game_id))
+        game_status = status_result.scalar_one_or_none()
+        if game_status is None:
+            return None
+
+        result = await db.execute(
+            select(
+                User.username,
+                GameParticipant.current_article,
+                GameParticipant.steps_count,
+                GameParticipant.is_finished,
+            )
+            .join(User, User.id == GameParticipant.user_id)
+            .where(GameParticipant.game_id == game_id)
+            .order_by(GameParticipant.id)
+        )
+
+        return {
+            "id": game_id,
+            "status": game_status,
+            "participants": [
+                {
+                    "username": row.username,
+                    "current_article": row.current_article,
+                    "steps_count": row.steps_count,
+                    "is_finished": row.is_finished,
+                }
+                for row in result.all()
+            ],
+        }
+
     async def list_games(
         self,
         db: AsyncSession,
@@ -102,11 +179,16 @@ class GameService:
         mode: GameMode | None = None,
         skip: int = 0,
         limit: int = 20,
-    ) -> tuple[list[Game], int]:
-        """Получение списка игр"""
-        query = select(Game).options(
-            selectinload(Game.creator), selectinload(Game.participants)
-        )
+        cursor: str | None = None,
+    ) -> tuple[list[Game], int, str | None]:
+        """
+        Получение списка игр
+        Возвращает (games, total, next_cursor)
+
+        При переданном cursor используется keyset-пагинация по (created_at, id),
+        skip в этом случае игнорируется. total приблизительный (кешируется).
+        """
+        query = select(Game).options(selectinload(Game.creator))
 
         if status:
             query = query.where(Game.status == status.value)
@@ -114,9 +196,44 @@ class GameService:
         if mode:
             query = query.where(Game.mode == mode.value)
 
-        query = query.order_by(Game.created_at.desc())
+        if cursor:
+            created_at, game_id = _decode_cursor(cursor)
+            query = query.where(
+                or_(
+                    Game.created_at < created_at,
+                    and_(Game.created_at == created_at, Game.id < game_id),
+                )
+            )
+        elif skip:
+            query = query.offset(skip)
+
+        query = query.order_by(Game.created_at.desc(), Game.id.desc())
+
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+        result = await db.execute(query.limit(limit + 1))
+        games = list(result.scalars().all())
+
+        next_cursor = None
+        if len(games) > limit:
+            games = games[:limit]
+            last = games[-1]
+            next_cursor = _encode_cursor(last.created_at, last.id)
+
+        total = await self._count_games(db, status, mode)
+
+        return games, total, next_cursor
+
+    async def _count_games(
+        self, db: AsyncSession, status: GameStatus | None, mode: GameMode | None
+    ) -> int:
+        """Общее количество игр по фильтрам (кешируется на GAMES_COUNT_CACHE_TTL)"""
+        key = (status.value if status else None, mode.value if mode else None)
+        now = time.monotonic()
+
+        cached = self._count_cache.get(key)
+        if cached and now - cached[0] < settings.GAMES_COUNT_CACHE_TTL:
+            return cached[1]
 
-        # Получаем общее количество
         count_query = select(func.count()).select_from(Game)
         if status:
             count_query = count_query.where(Game.status == status.value)
@@ -124,54 +241,86 @@ class GameService:
             count_query = count_query.where(Game.mode == mode.value)
 
         total_result = await db.execute(count_query)
-        total = total_result.scalar()
+        total = total_result.scalar() or 0
 
-        # Получаем игры с пагинацией
-        result = await db.execute(query.offset(skip).limit(limit))
-        games = list(result.scalars().all())
+        self._count_cache[key] = (now, total)
+        return total
 
-        return games, total or 0
+    def invalidate_count_cache(self) -> None:
+        """
+        Сброс кеша количества игр
+
+        Вызывается при записях, меняющих количество по (status, mode):
+        создании, запуске и завершении игры. Присоединение игрока эти
+        количества не меняет.
+        """
+        self._count_cache.clear()
 
     async def join_game(
         self, db: AsyncSession, game_id: int, user_id: int
     ) -> GameParticipant:
-        """Присоединение к игре"""
-        game = await self.get_game(db, game_id)
-
-        if not game:
-            raise ValueError("Игра не найдена")
-
-        if game.status != GameStatus.WAITING.value:
-            raise ValueError("Нельзя присоединиться к начатой или завершенной игре")
+        """
+        Присоединение к игре
 
-        # Проверяем, не присоединился ли уже
-        existing = await db.execute(
-            select(GameParticipant).where(
-                GameParticipant.game_id == game_id, GameParticipant.user_id == user_id
+        Место резервируется условным UPDATE счетчика участников, а участник
+        вставляется в той же транзакции, поэтому игру нельзя переполнить
+        при одновременных присоединениях. Повторное присоединение отсекает
+        уникальный индекс (game_id, user_id).
+        """
+        result = await db.execute(
+            update(Game)
+            .where(
+                Game.id == game_id,
+                Game.status == GameStatus.WAITING.value,
+                Game.participants_count < Game.max_players,
             )
+            .values(participants_count=Game.participants_count + 1)
+            .returning(Game.start_article)
         )
+        start_article = result.scalar_one_or_none()
 
-        if existing.scalar_one_or_none():
-            raise ValueError("Вы уже присоединились к этой игре")
-
-        # Проверяем лимит игроков
-        participants_count = len(game.participants)
-        if participants_count >= game.max_players:
-            raise ValueError("Игра заполнена")
+        if start_article is None:
+            await db.rollback()
+            raise ValueError(await self._get_join_error(db, game_id, user_id))
 
         participant = GameParticipant(
             game_id=game_id,
             user_id=user_id,
-            path=[game.start_article],
-            current_article=game.start_article,
+            path=[start_article],
+            current_article=start_article,
         )
 
         db.add(participant)
-        await db.commit()
-        await db.refresh(participant)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise ValueError("Вы уже присоединились к этой игре")
 
         return participant
 
+    async def _get_join_error(
+        self, db: AsyncSession, game_id: int, user_id: int
+    ) -> str:
+        """Причина, по которой не удалось зарезервировать место в игре"""
+        game = await db.get(Game, game_id)
+
+        if not game:
+            return "Игра не найдена"
+
+        if game.status != GameStatus.WAITING.value:
+            return "Нельзя присоединиться к начатой или завершенной игре"
+
+        existing = await db.execute(
+            select(GameParticipant.id).where(
+                GameParticipant.game_id == game_id, GameParticipant.user_id == user_id
+            )
+        )
+        if existing.scalar_one_or_none():
+            return "Вы уже присоединились к этой игре"
+
+        return "Игра заполнена"
+
     async def start_game(self, db: AsyncSession, game_id: int) -> Game:
         """Запуск игры"""
         game = await self.get_game(db, game_id)
@@ -182,17 +331,30 @@ class GameService:
         if game.status != GameStatus.WAITING.value:
             raise ValueError("Игра уже начата или завершена")
 
-        if len(game.participants) < 1:
+        if game.participants_count < 1:
             raise ValueError("В игре должен быть хотя бы один участник")
 
         game.status = GameStatus.IN_PROGRESS.value
         game.started_at = datetime.utcnow()
 
         await db.commit()
+        self.invalidate_count_cache()
         await db.refresh(game)
 
         return game
 
+    async def all_participants_finished(self, db: AsyncSession, game_id: int) -> bool:
+        """Все ли участники дошли до цели (игра закончена для всех)"""
+        result = await db.execute(
+            select(func.count())
+            .select_from(GameParticipant)
+            .where(
+                GameParticipant.game_id == game_id,
+                GameParticipant.is_finished.is_(False),
+            )
+        )
+        return result.scalar_one() == 0
+
     async def make_move(
         self, db: AsyncSession, game_id: int, user_id: int, article: str
     ) -> tuple[GameParticipant, bool]:
@@ -248,6 +410,7 @@ class GameService:
 
         # Проверяем достижение цели
         is_winner = False
+        user = None
         if article == game.target_article:
             participant.is_finished = True
             participant.is_winner = True
@@ -263,15 +426,31 @@ class GameService:
                     user.best_time = participant.time_taken
                 if not user.best_steps or participant.steps_count < user.best_steps:
                     user.best_steps = participant.steps_count
+                user.finished_games += 1
+                user.finished_steps_sum += participant.steps_count
+                user.finished_time_sum += participant.time_taken
+
+            await leaderboard_service.record_window_results(
+                db,
+                [user_id],
+                wins=1,
+                time_taken=participant.time_taken,
+                steps=participant.steps_count,
+            )
 
         await db.commit()
         await db.refresh(participant)
 
-        # Проверяем и выдаем достижения после победы
+        # Обновляем таблицу лидеров, проверяем и выдаем достижения после победы
         if is_winner:
+            if user:
+                await leaderboard_service.record(user)
+
             from app.services.achievement_service import achievement_service
 
-            await achievement_service.check_and_grant_achievements(db, user_id)
+            await achievement_service.check_and_grant_achievements(
+                db, user_id, changed_stats=("games_won", "best_time", "best_steps")
+            )
 
         return participant, is_winner
 
@@ -288,32 +467,34 @@ class GameService:
         # Обновляем статистику всех участников и проверяем достижения
         from app.services.achievement_service import achievement_service
 
+        users = []
         for participant in game.participants:
             user = await db.get(User, participant.user_id)
             if user:
                 user.total_games += 1
+                users.append(user)
+
+        await leaderboard_service.record_window_results(
+            db, [participant.user_id for participant in game.participants], games=1
+        )
 
         await db.commit()
+        self.invalidate_count_cache()
+
+        for user in users:
+            await leaderboard_service.record(user)
 
         # Проверяем достижения для всех участников
         for participant in game.participants:
             await achievement_service.check_and_grant_achievements(
-                db, participant.user_id
+                db, participant.user_id, changed_stats=("games_played",)
             )
 
         await db.refresh(game)
 
-        return game
+        await websocket_manager.notify_game_finished(game_id)
 
-    async def get_leaderboard(self, db: AsyncSession, limit: int = 100) -> list[User]:
-        """Получение таблицы лидеров"""
-        result = await db.execute(
-            select(User)
-            .where(User.total_games > 0)
-            .order_by(User.total_wins.desc(), User.best_time.asc())
-            .limit(limit)
-        )
-        return list(result.scalars().all())
+        return game
 
 
 # Singleton instance
@@ -0,0 +1,407 @@
+"""
+Сервис таблицы лидеров
+
+Рейтинг хранится в памяти в упорядоченной структуре (SortedKeyList) и
+обновляется инкрементально при каждой победе/завершении игры, поэтому
+top-N, место пользователя и окно «вокруг меня» считаются за O(log n),
+без сортировки таблицы users на каждый запрос. При нескольких воркерах
+рейтинг дублируется в sorted set Redis, и чтение идет из него.
+
+Таблицы за день, неделю и сезон строятся из агрегатов LeaderboardBucket,
+которые обновляются в той же транзакции, что и результат игры.
+"""
+import asyncio
+import json
+import math
+from dataclasses import asdict, dataclass
+from datetime import UTC, date, datetime, timedelta
+from typing import Any, cast
+
+from sortedcontainers import SortedKeyList  # type: ignore[import-untyped]
+from sqlalchemy import CursorResult, case, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.core.redis import get_redis
+from app.models.leaderboard import LeaderboardBucket, LeaderboardWindow
+from app.models.user import User
+
+# Множитель для упаковки (побед, лучшего времени) в один score Redis.
+# Время игры не превышает часа, поэтому на время отводится 6 разрядов.
+_SCORE_TIME_SCALE = 10**6
+
+# Член sorted set - дополненный нулями «обратный» ID. При равном score
+# ZREVRANGE упорядочивает члены по убыванию строки, то есть по возрастанию
+# ID, как sort_key рейтинга в памяти.
+_MEMBER_ID_LIMIT = 10**15
+_MEMBER_WIDTH = 16
+
+
+def _member(user_id: int) -> str:
+    return f"{_MEMBER_ID_LIMIT - user_id:0{_MEMBER_WIDTH}d}"
+
+
+def _member_id(member: str) -> int:
+    return _MEMBER_ID_LIMIT - int(member)
+
+
+@dataclass(frozen=True, slots=True)
+class LeaderboardEntry:
+    """Запись таблицы лидеров (поля совпадают с UserPublic)"""
+
+    id: int
+    username: str
+    total_games: int
+    total_wins: int
+    best_time: int | None
+    best_steps: int | None
+
+    @classmethod
+    def from_user(cls, user: User) -> "LeaderboardEntry":
+        return cls(
+            id=user.id,
+            username=user.username,
+            total_games=user.total_games,
+            total_wins=user.total_wins,
+            best_time=user.best_time,
+            best_steps=user.best_steps,
+        )
+
+    @property
+    def sort_key(self) -> tuple[int, float, int]:
+        """Больше побед выше, при равенстве - меньшее лучшее время"""
+        best_time = self.best_time if self.best_time is not None else math.inf
+        return (-self.total_wins, best_time, self.id)
+
+    @property
+    def score(self) -> float:
+        """Score для sorted set Redis (по убыванию соответствует sort_key)"""
+        best_time = min(
+            self.best_time if self.best_time is not None else _SCORE_TIME_SCALE - 1,
+            _SCORE_TIME_SCALE - 1,
+        )
+        return float(
+            self.total_wins * _SCORE_TIME_SCALE + (_SCORE_TIME_SCALE - 1 - best_time)
+        )
+
+
+def get_window_buckets(at: datetime) -> list[tuple[str, str, date]]:
+    """
+    Бакеты всех периодов, в которые попадает момент времени
+    Возвращает [(period, bucket, period_start), ...]
+    """
+    day = at.astimezone(UTC).date()
+    iso_year, iso_week, _ = day.isocalendar()
+    quarter = (day.month - 1) // 3
+
+    return [
+        (LeaderboardWindow.DAY.value, day.isoformat(), day),
+        (
+            LeaderboardWindow.WEEK.value,
+            f"{iso_year}-W{iso_week:02d}",
+            day - timedelta(days=day.weekday()),
+        ),
+        (
+            LeaderboardWindow.SEASON.value,
+            f"{day.year}-S{quarter + 1}",
+            date(day.year, quarter * 3 + 1, 1),
+        ),
+    ]
+
+
+class RedisLeaderboardMirror:
+    """Копия рейтинга в sorted set Redis (общая для всех воркеров)"""
+
+    def __init__(self, client: Any, key: str = settings.LEADERBOARD_REDIS_KEY):
+        self.client = client
+        # Рейтинг (члены - _member(id)) и записи игроков по ID
+        self.key = f"{key}:ranking"
+        self.entries_key = f"{key}:entries"
+
+    async def upsert(self, *entries: LeaderboardEntry) -> None:
+        """Добавление или обновление записей"""
+        if not entries:
+            return
+
+        await self.client.zadd(self.key, {_member(e.id): e.score for e in entries})
+        await self.client.hset(
+            self.entries_key,
+            mapping={str(e.id): json.dumps(asdict(e)) for e in entries},
+        )
+
+    async def remove(self, user_id: int) -> None:
+        """Удаление записи"""
+        await self.client.zrem(self.key, _member(user_id))
+        await self.client.hdel(self.entries_key, str(user_id))
+
+    async def range(self, start: int, end: int) -> list[LeaderboardEntry]:
+        """Записи с позициями start..end включительно (0 - лидер)"""
+        members = await self.client.zrevrange(self.key, start, end)
+        if not members:
+            return []
+
+        payloads = await self.client.hmget(
+            self.entries_key, [str(_member_id(member)) for member in members]
+        )
+        return [
+            LeaderboardEntry(**json.loads(payload)) for payload in payloads if payload
+        ]
+
+    async def rank(self, user_id: int) -> int | None:
+        """Позиция пользователя (0 - лидер) или None"""
+        return await self.client.zrevrank(self.key, _member(user_id))
+
+    async def size(self) -> int:
+        return await self.client.zcard(self.key)
+
+
+class LeaderboardService:
+    """Сервис таблицы лидеров"""
+
+    def __init__(self, mirror: RedisLeaderboardMirror | None = None):
+        self.mirror = mirror
+        self._index: SortedKeyList = SortedKeyList(key=lambda e: e.sort_key)
+        self._entries: dict[int, LeaderboardEntry] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def rebuild(self, db: AsyncSession, batch_size: int = 1000) -> int:
+        """
+        Полная перестройка рейтинга из БД (при старте приложения)
+        Возвращает количество записей
+        """
+        index: SortedKeyList = SortedKeyList(key=lambda e: e.sort_key)
+        entries: dict[int, LeaderboardEntry] = {}
+
+        result = await db.stream(
+            select(
+                User.id,
+                User.username,
+                User.total_games,
+                User.total_wins,
+                User.best_time,
+                User.best_steps,
+            )
+            .where(User.total_games > 0)
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            batch = [LeaderboardEntry(*row) for row in partition]
+            for entry in batch:
+                entries[entry.id] = entry
+            index.update(batch)
+
+            if self.mirror:
+                await self.mirror.upsert(*batch)
+
+        self._index = index
+        self._entries = entries
+        self._loaded = True
+
+        return len(entries)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Ленивая загрузка рейтинга, если он еще не построен"""
+        if self._loaded:
+            return
+
+        async with self._load_lock:
+            if not self._loaded:
+                await self.rebuild(db)
+
+    def reset(self) -> None:
+        """Сброс рейтинга (будет перестроен при следующем обращении)"""
+        self._index.clear()
+        self._entries.clear()
+        self._loaded = False
+
+    async def record(self, user: User) -> None:
+        """Инкрементальное обновление записи пользователя после изменения статистики"""
+        if user.total_games <= 0:
+            await self._remove(user.id)
+            return
+
+        entry = LeaderboardEntry.from_user(user)
+
+        old_entry = self._entries.get(entry.id)
+        if old_entry is not None:
+            self._index.remove(old_entry)
+        self._entries[entry.id] = entry
+        self._index.add(entry)
+
+        if self.mirror:
+            await self.mirror.upsert(entry)
+
+    async def _remove(self, user_id: int) -> None:
+        old_entry = self._entries.pop(user_id, None)
+        if old_entry is not None:
+            self._index.remove(old_entry)
+
+        if self.mirror:
+            await self.mirror.remove(user_id)
+
+    async def get_top(
+        self, db: AsyncSession, limit: int = 100
+    ) -> list[LeaderboardEntry]:
+        """Первые limit записей рейтинга"""
+        return await self.get_range(db, 0, limit - 1)
+
+    async def get_rank(self, db: AsyncSession, user_id: int) -> int | None:
+        """Место пользователя в рейтинге (с 1) или None, если его нет в рейтинге"""
+        if self.mirror:
+            position = await self.mirror.rank(user_id)
+            return position + 1 if position is not None else None
+
+        await self.ensure_loaded(db)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return self._index.index(entry) + 1
+
+    async def get_range(
+        self, db: AsyncSession, start: int, end: int
+    ) -> list[LeaderboardEntry]:
+        """Записи с позициями start..end включительно (0 - лидер)"""
+        if self.mirror:
+            return await self.mirror.range(start, end)
+
+        await self.ensure_loaded(db)
+        return list(self._index.islice(start, end + 1))
+
+    async def get_size(self, db: AsyncSession) -> int:
+        """Количество игроков в рейтинге"""
+        if self.mirror:
+            return await self.mirror.size()
+
+        await self.ensure_loaded(db)
+        return len(self._index)
+
+    # Таблицы лидеров по периодам
+
+    async def record_window_results(
+        self,
+        db: AsyncSession,
+        user_ids: list[int],
+        games: int = 0,
+        wins: int = 0,
+        time_taken: int | None = None,
+        steps: int | None = None,
+        at: datetime | None = None,
+    ) -> None:
+        """
+        Инкрементальное обновление бакетов периодов одним upsert-запросом
+
+        Не делает commit: вызывается в транзакции, фиксирующей результат игры.
+        """
+        if not user_ids:
+            return
+
+        rows = [
+            {
+                "period": period,
+                "bucket": bucket,
+                "period_start": period_start,
+                "user_id": user_id,
+                "games": games,
+                "wins": wins,
+                "best_time": time_taken,
+                "best_steps": steps,
+            }
+            for period, bucket, period_start in get_window_buckets(
+                at or datetime.now(UTC)
+            )
+            for user_id in user_ids
+        ]
+
+        stmt = dialect_insert(db, LeaderboardBucket).values(rows)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["period", "bucket", "user_id"],
+            set_={
+                "games": LeaderboardBucket.games + excluded.games,
+                "wins": LeaderboardBucket.wins + excluded.wins,
+                "best_time": _min_nullable(
+                    LeaderboardBucket.best_time, excluded.best_time
+                ),
+                "best_steps": _min_nullable(
+                    LeaderboardBucket.best_steps, excluded.best_steps
+                ),
+            },
+        )
+        await db.execute(stmt)
+
+    async def get_window_top(
+        self,
+        db: AsyncSession,
+        window: LeaderboardWindow,
+        limit: int = 100,
+        at: datetime | None = None,
+    ) -> list[LeaderboardEntry]:
+        """Таблица лидеров за текущий период (чтение по индексу бакета)"""
+        if window == LeaderboardWindow.ALL:
+            return await self.get_top(db, limit)
+
+        buckets = get_window_buckets(at or datetime.now(UTC))
+        bucket = next(bucket for period, bucket, _ in buckets if period == window.value)
+
+        result = await db.execute(
+            select(
+                LeaderboardBucket.user_id,
+                User.username,
+                LeaderboardBucket.games,
+                LeaderboardBucket.wins,
+                LeaderboardBucket.best_time,
+                LeaderboardBucket.best_steps,
+            )
+            .join(User, User.id == LeaderboardBucket.user_id)
+            .where(
+                LeaderboardBucket.period == window.value,
+                LeaderboardBucket.bucket == bucket,
+            )
+            .order_by(
+                LeaderboardBucket.wins.desc(),
+                LeaderboardBucket.best_time.asc().nulls_last(),
+            )
+            .limit(limit)
+        )
+        return [LeaderboardEntry(*row) for row in result.all()]
+
+    async def prune_window_buckets(
+        self, db: AsyncSession, now: datetime | None = None
+    ) -> int:
+        """Удаление бакетов, вышедших за срок хранения. Возвращает число строк"""
+        today = (now or datetime.now(UTC)).date()
+        retention = {
+            LeaderboardWindow.DAY: settings.LEADERBOARD_DAY_RETENTION_DAYS,
+            LeaderboardWindow.WEEK: settings.LEADERBOARD_WEEK_RETENTION_DAYS,
+            LeaderboardWindow.SEASON: settings.LEADERBOARD_SEASON_RETENTION_DAYS,
+        }
+
+        expired = [
+            (LeaderboardBucket.period == window.value)
+            & (LeaderboardBucket.period_start < today - timedelta(days=days))
+            for window, days in retention.items()
+        ]
+
+        # DELETE возвращает CursorResult (с rowcount)
+        stmt = delete(LeaderboardBucket).where(or_(*expired))
+        result = cast(CursorResult, await db.execute(stmt))
+        await db.commit()
+
+        return result.rowcount or 0
+
+
+def _min_nullable(current: Any, new: Any) -> Any:
+    """Минимум из двух значений, где NULL означает «нет результата»"""
+    return case((new < current, new), else_=func.coalesce(current, new))
+
+
+def _create_mirror() -> RedisLeaderboardMirror | None:
+    if settings.LEADERBOARD_REDIS_MIRROR:
+        return RedisLeaderboardMirror(get_redis())
+    return None
+
+
+# Singleton instance
+leaderboard_service = LeaderboardService(mirror=_create_mirror())
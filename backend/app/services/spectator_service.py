@@ -0,0 +1,333 @@
+"""
+Сервис зрителей игр
+
+Зрители не входят в комнаты ConnectionManager: у каждой игры со зрителями
+своя комната SpectatorRoom, подписанная на канал игры отдельным
+обработчиком. Комната хранит компактное состояние игры (участники и статьи
+заменены числовыми id) и раз в SPECTATOR_THROTTLE_MS рассылает зрителям
+одну дельту с изменившимися участниками. Новый зритель получает снимок из
+памяти комнаты, без запроса к БД.
+
+Рассылка зрителям идет из отдельной задачи комнаты через очереди
+зрителей, поэтому число зрителей не влияет на доставку событий игрокам.
+"""
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from functools import partial
+from typing import Any
+
+from app.core.config import settings
+from app.core.pubsub import InProcessPubSub, RedisPubSub
+from app.models.game import GameStatus
+from app.services.websocket_service import game_channel, websocket_manager
+
+
+class Spectator:
+    """Зритель с ограниченной очередью кадров (WebSocket или SSE)"""
+
+    def __init__(self, max_queue_size: int):
+        # None в очереди - сигнал закрытия
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=max_queue_size)
+        self.closed = False
+
+    def push(self, frame: str) -> bool:
+        """Постановка кадра в очередь. False, если очередь переполнена"""
+        if self.closed:
+            return False
+
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    def close(self) -> None:
+        """Закрытие: непрочитанные кадры отбрасываются"""
+        if self.closed:
+            return
+
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class SpectatorRoom:
+    """Компактное состояние игры для зрителей"""
+
+    def __init__(self):
+        self.viewers: set[Spectator] = set()
+        self.ready = asyncio.Event()
+        self.exists = False
+        self.status: str | None = None
+        # Время завершения игры (комната закрывается после TTL)
+        self.finished_at: float | None = None
+
+        # username -> id участника, название статьи -> id статьи
+        self.participants: dict[str, int] = {}
+        self.articles: dict[str, int] = {}
+        # id участника -> [id статьи, шаги, завершил ли игру]
+        self.state: dict[int, list[Any]] = {}
+
+        # Изменения с последней дельты
+        self._new_participants: dict[int, str] = {}
+        self._new_articles: dict[int, str] = {}
+        self._changed: set[int] = set()
+        self._events: list[dict[str, Any]] = []
+
+        self.flusher: asyncio.Task | None = None
+
+    def _participant_id(self, username: str) -> int:
+        participant_id = self.participants.get(username)
+        if participant_id is None:
+            participant_id = self.participants[username] = len(self.participants)
+            self._new_participants[participant_id] = username
+            self.state[participant_id] = [None, 0, False]
+        return participant_id
+
+    def _article_id(self, title: str | None) -> int | None:
+        if title is None:
+            return None
+
+        article_id = self.articles.get(title)
+        if article_id is None:
+            article_id = self.articles[title] = len(self.articles)
+            self._new_articles[article_id] = title
+        return article_id
+
+    def _update(
+        self, username: str, article: str | None, steps: int, is_finished: bool
+    ) -> None:
+        participant_id = self._participant_id(username)
+        state = self.state[participant_id]
+
+        # Шаги растут монотонно: более старое состояние не перезаписывает новое
+        if steps < state[1]:
+            return
+
+        state[:] = [self._article_id(article), steps, state[2] or is_finished]
+        self._changed.add(participant_id)
+
+    def load(self, snapshot: dict[str, Any]) -> None:
+        """Начальное состояние из снимка игры (GameService.get_snapshot)"""
+        self.exists = True
+        self.status = self.status or snapshot["status"]
+
+        for participant in snapshot["participants"]:
+            self._update(
+                participant["username"],
+                participant["current_article"],
+                participant["steps_count"],
+                participant["is_finished"],
+            )
+
+    def apply(self, message: dict[str, Any]) -> None:
+        """Применение события игры из канала"""
+        event_type = message.get("type")
+
+        if event_type == "player_move":
+            self._update(
+                message["username"], message["article"], message["steps"], False
+            )
+        elif event_type == "moves_batch":
+            for move in message["moves"]:
+                self._update(move["username"], move["article"], move["steps"], False)
+        elif event_type == "player_joined":
+            self._changed.add(self._participant_id(message["username"]))
+        elif event_type == "player_won":
+            participant_id = self._participant_id(message["username"])
+            self.state[participant_id][2] = True
+            self._changed.add(participant_id)
+            self._events.append(
+                {
+                    "type": "player_won",
+                    "participant": participant_id,
+                    "time": message["time"],
+                    "steps": message["steps"],
+                }
+            )
+        elif event_type == "game_started":
+            self.status = GameStatus.IN_PROGRESS.value
+            self._events.append({"type": event_type})
+        elif event_type == "game_finished":
+            self.status = GameStatus.FINISHED.value
+            self.finished_at = time.monotonic()
+            self._events.append({"type": event_type})
+
+    def snapshot_frame(self) -> dict[str, Any]:
+        """Снимок для нового зрителя"""
+        return {
+            "type": "snapshot",
+            "status": self.status,
+            "participants": {pid: name for name, pid in self.participants.items()},
+            "articles": {aid: title for title, aid in self.articles.items()},
+            "state": [[pid, *state] for pid, state in self.state.items()],
+        }
+
+    def take_delta(self) -> dict[str, Any] | None:
+        """Дельта с последнего вызова или None, если ничего не изменилось"""
+        if not self._changed and not self._events:
+            return None
+
+        delta: dict[str, Any] = {"type": "delta"}
+        if self._new_participants:
+            delta["participants"] = self._new_participants
+        if self._new_articles:
+            delta["articles"] = self._new_articles
+        if self._changed:
+            delta["state"] = [[pid, *self.state[pid]] for pid in sorted(self._changed)]
+        if self._events:
+            delta["events"] = self._events
+
+        self._new_participants = {}
+        self._new_articles = {}
+        self._changed = set()
+        self._events = []
+
+        return delta
+
+
+class SpectatorHub:
+    """Комнаты зрителей, отдельные от соединений игроков"""
+
+    def __init__(
+        self,
+        pubsub: InProcessPubSub | RedisPubSub,
+        throttle_ms: int = settings.SPECTATOR_THROTTLE_MS,
+        max_queue_size: int = settings.SPECTATOR_QUEUE_SIZE,
+    ):
+        self.pubsub = pubsub
+        self.throttle_ms = throttle_ms
+        self.max_queue_size = max_queue_size
+        self.rooms: dict[int, SpectatorRoom] = {}
+        self._handlers: dict[int, Callable[[str], None]] = {}
+
+    async def join(
+        self,
+        game_id: int,
+        load_snapshot: Callable[[], Awaitable[dict[str, Any] | None]],
+    ) -> Spectator | None:
+        """
+        Подключение зрителя; первым кадром в очереди будет снимок игры
+        Возвращает None, если игра не найдена
+        """
+        room = self.rooms.get(game_id)
+
+        if room is None:
+            room = self.rooms[game_id] = SpectatorRoom()
+            handler = partial(self._on_event, game_id)
+            self._handlers[game_id] = handler
+
+            # Сначала подписка, затем снимок: события, пришедшие во время
+            # загрузки, не теряются (старый снимок их не перезапишет)
+            await self.pubsub.subscribe(game_channel(game_id), handler)
+            try:
+                snapshot = await load_snapshot()
+                if snapshot is not None:
+                    room.load(snapshot)
+                    room.take_delta()
+                    room.flusher = asyncio.create_task(self._flush_loop(room))
+            finally:
+                room.ready.set()
+                if not room.exists:
+                    await self._close_room(game_id)
+        else:
+            await room.ready.wait()
+
+        if not room.exists:
+            return None
+
+        spectator = Spectator(self.max_queue_size)
+        spectator.push(json.dumps(room.snapshot_frame()))
+        room.viewers.add(spectator)
+
+        return spectator
+
+    async def leave(self, game_id: int, spectator: Spectator) -> None:
+        """Отключение зрителя; комната без зрителей удаляется"""
+        spectator.close()
+
+        room = self.rooms.get(game_id)
+        if room is None:
+            return
+
+        room.viewers.discard(spectator)
+        if not room.viewers:
+            await self._close_room(game_id)
+
+    async def stream(self, game_id: int, spectator: Spectator) -> AsyncIterator[str]:
+        """Кадры зрителя в формате Server-Sent Events"""
+        try:
+            while True:
+                frame = await spectator.queue.get()
+                if frame is None:
+                    return
+                yield f"data: {frame}\n\n"
+        finally:
+            await self.leave(game_id, spectator)
+
+    def heartbeat(
+        self, finished_room_ttl: float = settings.WS_FINISHED_ROOM_TTL
+    ) -> None:
+        """
+        Периодическая проверка зрителей (фоновая задача)
+
+        Ping выявляет оборванные соединения (особенно SSE), зрители
+        завершенных игр отключаются через finished_room_ttl.
+        """
+        now = time.monotonic()
+        ping = json.dumps({"type": "ping"})
+
+        for room in list(self.rooms.values()):
+            expired = (
+                room.finished_at is not None
+                and now - room.finished_at > finished_room_ttl
+            )
+            for spectator in list(room.viewers):
+                if expired or not spectator.push(ping):
+                    spectator.close()
+                    room.viewers.discard(spectator)
+
+    def metrics(self) -> dict[str, float]:
+        """Метрики зрителей"""
+        return {
+            "wikirush_spectator_rooms": len(self.rooms),
+            "wikirush_spectators": sum(len(r.viewers) for r in self.rooms.values()),
+        }
+
+    async def _close_room(self, game_id: int) -> None:
+        room = self.rooms.pop(game_id, None)
+        if room is not None and room.flusher is not None:
+            room.flusher.cancel()
+
+        handler = self._handlers.pop(game_id, None)
+        if handler is not None:
+            await self.pubsub.unsubscribe(game_channel(game_id), handler)
+
+    def _on_event(self, game_id: int, payload: str) -> None:
+        room = self.rooms.get(game_id)
+        if room is not None:
+            room.apply(json.loads(payload))
+
+    async def _flush_loop(self, room: SpectatorRoom) -> None:
+        """Рассылка дельты комнаты раз в throttle_ms"""
+        while True:
+            await asyncio.sleep(self.throttle_ms / 1000)
+
+            delta = room.take_delta()
+            if delta is None:
+                continue
+
+            frame = json.dumps(delta)
+            for spectator in list(room.viewers):
+                # Не успевающий читать зритель отключается
+                if not spectator.push(frame):
+                    spectator.close()
+                    room.viewers.discard(spectator)
+
+
+# Singleton instance (тот же транспорт событий, что у игроков)
+spectator_hub = SpectatorHub(pubsub=websocket_manager.pubsub)
@@ -1,57 +1,520 @@
 """
 WebSocket сервис для real-time обновлений игры
+
+События игры публикуются один раз в pub/sub канал игры; каждый воркер
+подписан на каналы игр, в которых у него есть локальные сокеты, и
+рассылает полученные события только своим соединениям.
+
+Каждое событие получает сквозной номер seq. Переподключившийся клиент
+передает номер последнего полученного события и получает только
+пропущенные события из буфера или компактный снимок состояния игры,
+если пропущено больше, чем хранит буфер.
+
+Сервер раз в WS_HEARTBEAT_INTERVAL отправляет клиентам ping; соединения,
+от которых нет кадров дольше WS_HEARTBEAT_MAX_MISSED интервалов, закрываются.
+Комнаты завершенных игр закрываются через WS_FINISHED_ROOM_TTL.
+
+Соединения авторизованных игроков дополнительно подписаны на личный канал
+пользователя, через который приходят события вроде achievement_unlocked.
 """
+import asyncio
+import contextlib
 import json
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from functools import partial
 from typing import Any
 
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.pubsub import InProcessPubSub, RedisPubSub, create_pubsub
+from app.services.ws_protocol import MSGPACK_SUBPROTOCOL, OutboundFrame
+
+# Код закрытия для клиента, не успевающего читать сообщения (Try Again Later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+# Код закрытия для клиента, не отвечающего на ping (Going Away)
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 1001
+# Быстрая проверка перед разбором события из канала
+_GAME_FINISHED_MARKER = '"game_finished"'
+
+
+@dataclass
+class ConnectionStats:
+    """Счетчики отправки сообщений для метрик"""
+
+    queued_messages: int = 0
+    queued_bytes: int = 0
+    sent_total: int = 0
+    # Время от постановки в очередь до отправки
+    send_latency_sum: float = 0.0
+    send_latency_max: float = 0.0
+    slow_consumers_total: int = 0
+    reaped_total: int = 0
+
+
+class ClientConnection:
+    """
+    Соединение клиента с ограниченной очередью исходящих сообщений
+
+    Сообщения отправляет отдельная задача-писатель, поэтому медленный
+    клиент не задерживает рассылку остальным.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int,
+        stats: ConnectionStats | None = None,
+        binary: bool = False,
+    ):
+        self.websocket = websocket
+        # (кадр, размер в байтах, время постановки в очередь)
+        self.queue: asyncio.Queue[tuple[str | bytes, int, float]] = asyncio.Queue(
+            maxsize=max_queue_size
+        )
+        self.stats = stats or ConnectionStats()
+        # Клиент выбрал компактный бинарный формат (msgpack)
+        self.binary = binary
+        self.closed = False
+        # Пользователь соединения (None - анонимный зритель)
+        self.user_id: int | None = None
+        # Время последнего кадра от клиента (для heartbeat)
+        self.last_seen = time.monotonic()
+        self._writer: asyncio.Task | None = None
+        # Сообщения, придержанные на время повтора пропущенных событий
+        self._held: list[OutboundFrame] | None = None
+
+    def start(self, on_error: Callable[["ClientConnection"], None]) -> None:
+        """Запуск задачи-писателя; on_error вызывается при ошибке отправки"""
+        self._writer = asyncio.create_task(self._write_loop(on_error))
+
+    def enqueue(self, payload: str | OutboundFrame) -> bool:
+        """
+        Постановка сообщения (JSON) в очередь. False, если очередь переполнена
+        OutboundFrame кеширует кодировку при рассылке нескольким соединениям
+        """
+        if self.closed:
+            return False
+
+        if isinstance(payload, OutboundFrame):
+            frame = payload
+        else:
+            frame = OutboundFrame(payload)
+
+        if self._held is not None:
+            if len(self._held) >= self.queue.maxsize:
+                return False
+            self._held.append(frame)
+            return True
+
+        if self.binary:
+            data: str | bytes = frame.binary
+            size = len(data)
+        else:
+            data, size = frame.text, frame.size
+
+        try:
+            self.queue.put_nowait((data, size, time.monotonic()))
+        except asyncio.QueueFull:
+            return False
+
+        self.stats.queued_messages += 1
+        self.stats.queued_bytes += size
+        return True
+
+    def hold(self) -> None:
+        """Придержать новые сообщения до release (на время повтора событий)"""
+        if self._held is None:
+            self._held = []
+
+    def release(self, after_seq: int, first: list[str]) -> bool:
+        """
+        Отправка сообщений first, затем придержанных, кроме событий
+        с seq <= after_seq (они уже есть в first или учтены в снимке)
+        """
+        held, self._held = self._held or [], None
+
+        for payload in first:
+            if not self.enqueue(payload):
+                return False
+
+        for frame in held:
+            seq = json.loads(frame.text).get("seq")
+            if seq is not None and seq <= after_seq:
+                continue
+            if not self.enqueue(frame):
+                return False
+
+        return True
+
+    async def _write_loop(self, on_error: Callable[["ClientConnection"], None]) -> None:
+        while True:
+            data, size, enqueued_at = await self.queue.get()
+            try:
+                if isinstance(data, bytes):
+                    await self.websocket.send_bytes(data)
+                else:
+                    await self.websocket.send_text(data)
+            except Exception:
+                on_error(self)
+                return
+            finally:
+                self._account_sent(size, enqueued_at)
+                self.queue.task_done()
+
+    def _account_sent(self, size: int, enqueued_at: float) -> None:
+        latency = time.monotonic() - enqueued_at
+        self.stats.queued_messages -= 1
+        self.stats.queued_bytes -= size
+        self.stats.sent_total += 1
+        self.stats.send_latency_sum += latency
+        self.stats.send_latency_max = max(self.stats.send_latency_max, latency)
+
+    def touch(self) -> None:
+        """Отметка о кадре от клиента"""
+        self.last_seen = time.monotonic()
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        """Остановка писателя и закрытие сокета"""
+        if self.closed:
+            return
+
+        self.closed = True
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+        # Неотправленные сообщения больше не учитываются в очереди
+        while not self.queue.empty():
+            _, size, _ = self.queue.get_nowait()
+            self.stats.queued_messages -= 1
+            self.stats.queued_bytes -= size
+            self.queue.task_done()
+
+        # Сокет мог быть уже закрыт клиентом или сервером
+        with contextlib.suppress(RuntimeError, OSError, WebSocketDisconnect):
+            await self.websocket.close(code=code, reason=reason)
+
+
+def game_channel(game_id: int) -> str:
+    """Имя pub/sub канала игры"""
+    return f"wikirush:game:{game_id}"
+
+
+def user_channel(user_id: int) -> str:
+    """Имя личного pub/sub канала пользователя"""
+    return f"wikirush:user:{user_id}"
 
 
 class ConnectionManager:
     """Менеджер WebSocket соединений"""
 
-    def __init__(self):
-        # game_id -> list of websockets
-        self.active_connections: dict[int, list[WebSocket]] = {}
+    def __init__(
+        self,
+        pubsub: InProcessPubSub | RedisPubSub | None = None,
+        max_queue_size: int = settings.WS_OUTBOUND_QUEUE_SIZE,
+        heartbeat_interval: float = settings.WS_HEARTBEAT_INTERVAL,
+        max_missed_pongs: int = settings.WS_HEARTBEAT_MAX_MISSED,
+        finished_room_ttl: float = settings.WS_FINISHED_ROOM_TTL,
+    ):
+        self.pubsub = pubsub or InProcessPubSub()
+        self.max_queue_size = max_queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.max_missed_pongs = max_missed_pongs
+        self.finished_room_ttl = finished_room_ttl
+        self.stats = ConnectionStats()
+        # game_id -> set of connections
+        self.active_connections: dict[int, set[ClientConnection]] = {}
+        # websocket -> (game_id, connection)
+        self._by_socket: dict[WebSocket, tuple[int, ClientConnection]] = {}
+        # game_id -> обработчик подписки на канал игры
+        self._subscriptions: dict[int, Callable[[str], None]] = {}
+        # user_id -> соединения пользователя и обработчик его личного канала
+        self.user_connections: dict[int, set[ClientConnection]] = {}
+        self._user_subscriptions: dict[int, Callable[[str], None]] = {}
+        self._background: set[asyncio.Task] = set()
+        # game_id -> накопленные ходы и задача их отправки (пакетный режим)
+        self._pending_moves: dict[int, list[dict[str, Any]]] = {}
+        self._move_flushers: dict[int, asyncio.Task] = {}
+        # game_id -> время завершения игры (комната закрывается после TTL)
+        self._finished_at: dict[int, float] = {}
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        game_id: int,
+        resuming: bool = False,
+        subprotocol: str | None = None,
+        user_id: int | None = None,
+    ) -> ClientConnection:
+        """
+        Подключение к игре
+
+        resuming - клиент переподключается: события придерживаются
+        до вызова resume, чтобы не обогнать повтор пропущенных.
+        subprotocol - согласованный формат сообщений (см. ws_protocol).
+        user_id - авторизованный игрок: соединение получает и его личные события.
+        """
+        await websocket.accept(subprotocol=subprotocol)
+
+        connection = ClientConnection(
+            websocket,
+            self.max_queue_size,
+            self.stats,
+            binary=subprotocol == MSGPACK_SUBPROTOCOL,
+        )
+        if resuming:
+            connection.hold()
+        connection.start(lambda conn: self._remove(game_id, conn))
+
+        self.active_connections.setdefault(game_id, set()).add(connection)
+        self._by_socket[websocket] = (game_id, connection)
+
+        # Подписываемся на канал игры при появлении первого локального сокета
+        if game_id not in self._subscriptions:
+            handler = partial(self._fan_out, game_id)
+            self._subscriptions[game_id] = handler
+            await self.pubsub.subscribe(game_channel(game_id), handler)
+
+        if user_id is not None:
+            connection.user_id = user_id
+            self.user_connections.setdefault(user_id, set()).add(connection)
+
+            if user_id not in self._user_subscriptions:
+                handler = partial(self._fan_out_user, user_id)
+                self._user_subscriptions[user_id] = handler
+                await self.pubsub.subscribe(user_channel(user_id), handler)
+
+        return connection
 
-    async def connect(self, websocket: WebSocket, game_id: int):
-        """Подключение к игре"""
-        await websocket.accept()
+    async def resume(
+        self,
+        websocket: WebSocket,
+        game_id: int,
+        since: int,
+        load_snapshot: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> None:
+        """
+        Досылка событий, пропущенных клиентом после события since
 
-        if game_id not in self.active_connections:
-            self.active_connections[game_id] = []
+        Если пропущенные события уже вытеснены из буфера, клиент получает
+        снимок состояния игры (load_snapshot) с номером последнего события.
+        """
+        entry = self._by_socket.get(websocket)
+        if entry is None:
+            return
 
-        self.active_connections[game_id].append(websocket)
+        connection = entry[1]
+        channel = game_channel(game_id)
+
+        # Новые события копятся, пока не отправлены пропущенные
+        connection.hold()
+        first: list[str] = []
+
+        history = [
+            (json.loads(payload)["seq"], payload)
+            for payload in await self.pubsub.get_history(channel)
+        ]
+        if history:
+            last_seq = history[-1][0]
+        else:
+            last_seq = await self.pubsub.current_seq(channel)
+
+        if since == last_seq:
+            pass
+        elif history and since < last_seq and history[0][0] <= since + 1:
+            first = [payload for seq, payload in history if seq > since]
+        else:
+            snapshot = await load_snapshot()
+            first = [
+                json.dumps({"type": "snapshot", "seq": last_seq, "game": snapshot})
+            ]
+
+        if not connection.release(last_seq, first):
+            self._remove(game_id, connection, SLOW_CONSUMER_CLOSE_CODE)
+
+    def touch(self, websocket: WebSocket) -> None:
+        """Отметка о кадре от клиента (любой кадр, в том числе pong)"""
+        entry = self._by_socket.get(websocket)
+        if entry is not None:
+            entry[1].touch()
+
+    async def heartbeat(self) -> None:
+        """
+        Периодическая проверка соединений (фоновая задача)
+
+        Отправляет ping, закрывает соединения, пропустившие max_missed_pongs
+        ответов, и комнаты игр, завершенных дольше finished_room_ttl назад.
+        """
+        now = time.monotonic()
+        deadline = self.heartbeat_interval * self.max_missed_pongs
+        ping = OutboundFrame(json.dumps({"type": "ping"}))
+
+        for game_id, connections in list(self.active_connections.items()):
+            finished_at = self._finished_at.get(game_id)
+            room_expired = (
+                finished_at is not None and now - finished_at > self.finished_room_ttl
+            )
+
+            for connection in list(connections):
+                if room_expired:
+                    self._remove(game_id, connection)
+                elif now - connection.last_seen > deadline:
+                    self._remove(game_id, connection, HEARTBEAT_TIMEOUT_CLOSE_CODE)
+                elif not connection.enqueue(ping):
+                    self._remove(game_id, connection, SLOW_CONSUMER_CLOSE_CODE)
+
+        await self.pubsub.prune(settings.WS_EVENT_HISTORY_TTL)
+
+    def metrics(self) -> dict[str, float]:
+        """Метрики соединений"""
+        return {
+            "wikirush_ws_connections": len(self._by_socket),
+            "wikirush_ws_rooms": len(self.active_connections),
+            "wikirush_ws_outbound_queued_messages": self.stats.queued_messages,
+            "wikirush_ws_outbound_queued_bytes": self.stats.queued_bytes,
+            "wikirush_ws_messages_sent_total": self.stats.sent_total,
+            "wikirush_ws_send_latency_seconds_sum": self.stats.send_latency_sum,
+            "wikirush_ws_send_latency_seconds_max": self.stats.send_latency_max,
+            "wikirush_ws_slow_consumers_total": self.stats.slow_consumers_total,
+            "wikirush_ws_reaped_total": self.stats.reaped_total,
+        }
 
     def disconnect(self, websocket: WebSocket, game_id: int):
         """Отключение от игры"""
-        if game_id in self.active_connections:
-            self.active_connections[game_id].remove(websocket)
+        entry = self._by_socket.get(websocket)
+        if entry is None:
+            return
 
-            # Удаляем пустой список
-            if not self.active_connections[game_id]:
+        self._remove(entry[0], entry[1])
+
+    def _remove(
+        self, game_id: int, connection: ClientConnection, close_code: int = 1000
+    ) -> None:
+        """Удаление соединения из комнаты и закрытие его писателя"""
+        self._by_socket.pop(connection.websocket, None)
+
+        if close_code == SLOW_CONSUMER_CLOSE_CODE:
+            self.stats.slow_consumers_total += 1
+        elif close_code == HEARTBEAT_TIMEOUT_CLOSE_CODE:
+            self.stats.reaped_total += 1
+
+        connections = self.active_connections.get(game_id)
+        if connections is not None:
+            connections.discard(connection)
+
+            # Удаляем пустую комнату и отписываемся от канала игры
+            if not connections:
                 del self.active_connections[game_id]
+                self._finished_at.pop(game_id, None)
+                self._run_in_background(self._release_subscription(game_id))
+
+        user_id = connection.user_id
+        user_connections = (
+            self.user_connections.get(user_id) if user_id is not None else None
+        )
+        if user_id is not None and user_connections is not None:
+            user_connections.discard(connection)
+            if not user_connections:
+                del self.user_connections[user_id]
+                self._run_in_background(self._release_user_subscription(user_id))
+
+        if not connection.closed:
+            self._run_in_background(connection.close(code=close_code))
+
+    def _run_in_background(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _release_subscription(self, game_id: int) -> None:
+        """Отписка от канала игры, если локальных сокетов так и не появилось"""
+        if game_id in self.active_connections:
+            return
+
+        handler = self._subscriptions.pop(game_id, None)
+        if handler is not None:
+            await self.pubsub.unsubscribe(game_channel(game_id), handler)
+
+    async def _release_user_subscription(self, user_id: int) -> None:
+        """Отписка от личного канала, если у пользователя не осталось сокетов"""
+        if user_id in self.user_connections:
+            return
+
+        handler = self._user_subscriptions.pop(user_id, None)
+        if handler is not None:
+            await self.pubsub.unsubscribe(user_channel(user_id), handler)
 
     async def send_personal_message(
         self, message: dict[str, Any], websocket: WebSocket
     ):
         """Отправка личного сообщения"""
-        await websocket.send_text(json.dumps(message))
+        payload = json.dumps(message)
+
+        entry = self._by_socket.get(websocket)
+        if entry is None:
+            await websocket.send_text(payload)
+            return
+
+        game_id, connection = entry
+        if not connection.enqueue(payload):
+            self._remove(game_id, connection, SLOW_CONSUMER_CLOSE_CODE)
 
     async def broadcast_to_game(self, message: dict[str, Any], game_id: int):
-        """Отправка сообщения всем участникам игры"""
-        if game_id in self.active_connections:
-            disconnected = []
+        """
+        Отправка сообщения всем участникам игры
+
+        Сообщение получает номер seq, сериализуется один раз, сохраняется
+        в буфере событий и публикуется в канал игры одним шагом транспорта;
+        каждый воркер рассылает его своим соединениям.
+        """
+        await self.pubsub.publish_event(game_channel(game_id), message)
+
+    def _fan_out(self, game_id: int, payload: str) -> None:
+        """
+        Рассылка полученного из канала сообщения локальным соединениям игры
 
-            for connection in self.active_connections[game_id]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception:
-                    disconnected.append(connection)
+        Сообщение ставится в очереди соединений; клиенты с переполненной
+        очередью отключаются.
+        """
+        connections = self.active_connections.get(game_id)
+        if not connections:
+            return
 
-            # Удаляем отключенные соединения
-            for conn in disconnected:
-                self.active_connections[game_id].remove(conn)
+        # Завершение игры отмечает комнату на каждом воркере (включая
+        # опубликовавший): она закроется после WS_FINISHED_ROOM_TTL
+        if (
+            _GAME_FINISHED_MARKER in payload
+            and game_id not in self._finished_at
+            and json.loads(payload).get("type") == "game_finished"
+        ):
+            self._finished_at[game_id] = time.monotonic()
+
+        frame = OutboundFrame(payload)
+        for connection in list(connections):
+            if not connection.enqueue(frame):
+                self._remove(game_id, connection, SLOW_CONSUMER_CLOSE_CODE)
+
+    def _fan_out_user(self, user_id: int, payload: str) -> None:
+        """Рассылка события личного канала соединениям пользователя"""
+        connections = self.user_connections.get(user_id)
+        if not connections:
+            return
+
+        frame = OutboundFrame(payload)
+        for connection in list(connections):
+            if not connection.enqueue(frame):
+                entry = self._by_socket.get(connection.websocket)
+                if entry is not None:
+                    self._remove(entry[0], connection, SLOW_CONSUMER_CLOSE_CODE)
+
+    async def send_to_user(self, message: dict[str, Any], user_id: int) -> None:
+        """
+        Отправка события во все соединения пользователя (на любом воркере)
+        Личные события не нумеруются и не попадают в историю игры
+        """
+        await self.pubsub.publish(user_channel(user_id), json.dumps(message))
 
     async def notify_player_joined(self, game_id: int, username: str):
         """Уведомление о присоединении игрока"""
@@ -71,23 +534,53 @@ class ConnectionManager:
         )
 
     async def notify_player_move(
-        self, game_id: int, username: str, article: str, steps: int
+        self,
+        game_id: int,
+        username: str,
+        article: str,
+        steps: int,
+        batch_tick_ms: int | None = None,
     ):
-        """Уведомление о ходе игрока"""
-        await self.broadcast_to_game(
-            {
-                "type": "player_move",
-                "username": username,
-                "article": article,
-                "steps": steps,
-            },
-            game_id,
-        )
+        """
+        Уведомление о ходе игрока
+
+        Если у игры задан batch_tick_ms, ходы накапливаются и отправляются
+        одним сообщением moves_batch раз в тик вместо сообщения на каждый ход.
+        """
+        move = {"username": username, "article": article, "steps": steps}
+
+        if not batch_tick_ms:
+            await self.broadcast_to_game({"type": "player_move", **move}, game_id)
+            return
+
+        self._pending_moves.setdefault(game_id, []).append(move)
+        if game_id not in self._move_flushers:
+            self._move_flushers[game_id] = asyncio.create_task(
+                self._flush_moves_after(game_id, batch_tick_ms / 1000)
+            )
+
+    async def _flush_moves_after(self, game_id: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._move_flushers.pop(game_id, None)
+        await self.flush_moves(game_id)
+
+    async def flush_moves(self, game_id: int) -> None:
+        """Немедленная отправка накопленных ходов игры"""
+        flusher = self._move_flushers.pop(game_id, None)
+        if flusher is not None and flusher is not asyncio.current_task():
+            flusher.cancel()
+
+        moves = self._pending_moves.pop(game_id, None)
+        if moves:
+            await self.broadcast_to_game(
+                {"type": "moves_batch", "moves": moves}, game_id
+            )
 
     async def notify_player_won(
         self, game_id: int, username: str, time: int, steps: int
     ):
-        """Уведомление о победе игрока"""
+        """Уведомление о победе игрока (сразу, после накопленных ходов)"""
+        await self.flush_moves(game_id)
         await self.broadcast_to_game(
             {
                 "type": "player_won",
@@ -99,12 +592,33 @@ class ConnectionManager:
             game_id,
         )
 
+    async def notify_achievements_unlocked(
+        self, user_id: int, achievements: list[Any]
+    ) -> None:
+        """Уведомление пользователя о полученных достижениях"""
+        for achievement in achievements:
+            await self.send_to_user(
+                {
+                    "type": "achievement_unlocked",
+                    "code": achievement.code,
+                    "name": achievement.name,
+                    "description": achievement.description,
+                    "icon": achievement.icon,
+                    "points": achievement.points,
+                    "rarity": achievement.rarity,
+                },
+                user_id,
+            )
+
     async def notify_game_finished(self, game_id: int):
-        """Уведомление о завершении игры"""
+        """Уведомление о завершении игры (сразу, после накопленных ходов)"""
+        await self.flush_moves(game_id)
         await self.broadcast_to_game(
             {"type": "game_finished", "message": "Игра завершена"}, game_id
         )
+        # История больше не нужна: переподключившийся клиент получит снимок
+        await self.pubsub.forget(game_channel(game_id))
 
 
 # Singleton instance
-websocket_manager = ConnectionManager()
+websocket_manager = ConnectionManager(pubsub=create_pubsub())
@@ -0,0 +1,117 @@
+"""
+Кодирование сообщений WebSocket
+
+Формат выбирается при подключении через подпротокол (Sec-WebSocket-Protocol):
+- wikirush.json.v1 (или без подпротокола) - JSON-объекты, как раньше;
+- wikirush.msgpack.v1 - бинарные кадры msgpack: массив
+  [код события, seq, поля события по порядку] без текстовых полей message
+  (текст уведомлений формирует клиент по коду события).
+"""
+import json
+from typing import Any
+
+try:
+    import msgpack  # type: ignore[import-untyped]
+except ImportError:  # pragma: no cover - msgpack опционален
+    msgpack = None
+
+JSON_SUBPROTOCOL = "wikirush.json.v1"
+MSGPACK_SUBPROTOCOL = "wikirush.msgpack.v1"
+
+# Коды событий компактного формата (0 - событие без кода, поля передаются словарем)
+EVENT_CODES: dict[str, int] = {
+    "player_joined": 1,
+    "game_started": 2,
+    "player_move": 3,
+    "moves_batch": 4,
+    "player_won": 5,
+    "game_finished": 6,
+    "snapshot": 7,
+    "response": 8,
+    "ping": 9,
+    "achievement_unlocked": 10,
+}
+
+# Поля событий в порядке следования в кадре
+EVENT_FIELDS: dict[str, tuple[str, ...]] = {
+    "player_joined": ("username",),
+    "game_started": (),
+    "player_move": ("username", "article", "steps"),
+    "moves_batch": ("moves",),
+    "player_won": ("username", "time", "steps"),
+    "game_finished": (),
+    "snapshot": ("game",),
+    "response": ("id", "ok", "result", "error"),
+    "ping": (),
+    "achievement_unlocked": (
+        "code",
+        "name",
+        "description",
+        "icon",
+        "points",
+        "rarity",
+    ),
+}
+
+_MOVE_FIELDS = EVENT_FIELDS["player_move"]
+
+
+def negotiate(offered: list[str]) -> str | None:
+    """Выбор подпротокола из предложенных клиентом (None - JSON по умолчанию)"""
+    for subprotocol in offered:
+        if subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None:
+            return subprotocol
+        if subprotocol == JSON_SUBPROTOCOL:
+            return subprotocol
+    return None
+
+
+def to_compact(message: dict[str, Any]) -> list[Any]:
+    """Сообщение в виде массива компактного формата"""
+    event_type: str = message.get("type", "")
+    fields = EVENT_FIELDS.get(event_type)
+
+    if fields is None:
+        extra = {k: v for k, v in message.items() if k not in ("type", "seq")}
+        return [0, message.get("seq"), event_type, extra]
+
+    values: list[Any] = [message.get(field) for field in fields]
+    if event_type == "moves_batch":
+        values = [[[move[field] for field in _MOVE_FIELDS] for move in values[0]]]
+
+    return [EVENT_CODES[event_type], message.get("seq"), *values]
+
+
+def encode_msgpack(payload: str) -> bytes:
+    """JSON-сообщение в кадр msgpack"""
+    return msgpack.packb(to_compact(json.loads(payload)))
+
+
+class OutboundFrame:
+    """
+    Исходящее сообщение с кешем кодировок
+
+    При рассылке комнате сообщение кодируется в msgpack один раз,
+    а не для каждого соединения.
+    """
+
+    __slots__ = ("_binary", "_size", "text")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._size: int | None = None
+        self._binary: bytes | None = None
+
+    @property
+    def size(self) -> int:
+        """Размер JSON-кадра в байтах"""
+        if self._size is None:
+            self._size = len(self.text.encode())
+        return self._size
+
+    @property
+    def binary(self) -> bytes:
+        """Кадр msgpack"""
+        if self._binary is None:
+            self._binary = encode_msgpack(self.text)
+        return self._binary
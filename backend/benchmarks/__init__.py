@@ -0,0 +1,3 @@
+"""
+Бенчмарки производительности (запуск из директории backend: python -m benchmarks.<name>)
+"""
@@ -0,0 +1,176 @@
+"""
+Бенчмарк проверки достижений после победы
+
+Каталог из сотен достижений (счетчики и рекорды), тысячи пользователей в
+SQLite в памяти. Сравнивается прежняя проверка (плотные записи прогресса на
+каждую пару пользователь-достижение, все незакрытые загружаются с Achievement
+и сравниваются через >=) с индексом правил и разреженным хранением:
+проверяются только правила изменившихся показателей, выдача - один upsert.
+Запуск: python -m benchmarks.bench_achievement_rules [--achievements 300]
+       [--users 2000] [--wins 300]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import UTC, datetime
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from app.core.database import Base
+from app.models.achievement import Achievement, UserAchievement
+from app.models.user import User
+from app.services.achievement_service import AchievementService
+
+STAT_TYPES = ["games_played", "games_won", "best_time", "best_steps"]
+WIN_STATS = ("games_won", "best_time", "best_steps")
+
+
+async def legacy_check(db: AsyncSession, user_id: int) -> None:
+    """Прежняя проверка: все незакрытые достижения, сравнение >="""
+    user = await db.get(User, user_id)
+    result = await db.execute(
+        select(UserAchievement)
+        .options(selectinload(UserAchievement.achievement))
+        .where(UserAchievement.user_id == user_id, UserAchievement.is_unlocked == False)
+    )
+    stats = {
+        "games_played": user.total_games,
+        "games_won": user.total_wins,
+        "best_time": user.best_time or 999999,
+        "best_steps": user.best_steps or 999999,
+    }
+
+    now = datetime.now(UTC)
+    for ua in result.scalars().all():
+        requirement = ua.achievement.requirement
+        value = stats.get(requirement["type"], 0)
+        ua.progress = min(value, requirement["target"])
+        if value >= requirement["target"]:
+            ua.is_unlocked = True
+            ua.unlocked_at = now
+
+    await db.commit()
+
+
+async def populate(
+    session_factory, achievements: int, users: int, dense: bool
+) -> list[int]:
+    """Каталог, пользователи и (для прежнего режима) плотные записи прогресса"""
+    rng = random.Random(42)
+
+    async with session_factory() as db:
+        await db.execute(
+            insert(Achievement),
+            [
+                {
+                    "code": f"bench_{i}",
+                    "name": f"Достижение {i}",
+                    "description": "",
+                    "icon": "🏆",
+                    "category": "bench",
+                    "rarity": "common",
+                    "requirement": {
+                        "type": STAT_TYPES[i % len(STAT_TYPES)],
+                        "target": rng.randint(1, 500),
+                    },
+                    "points": 10,
+                }
+                for i in range(achievements)
+            ],
+        )
+        await db.execute(
+            insert(User),
+            [
+                {
+                    "username": f"user{i}",
+                    "email": f"user{i}@example.com",
+                    "hashed_password": "x",
+                    "total_games": rng.randint(0, 100),
+                    "total_wins": rng.randint(0, 50),
+                    "best_time": rng.randint(30, 600),
+                    "best_steps": rng.randint(2, 30),
+                }
+                for i in range(users)
+            ],
+        )
+        achievement_ids = (await db.execute(select(Achievement.id))).scalars().all()
+        user_ids = (await db.execute(select(User.id))).scalars().all()
+
+        if dense:
+            await db.execute(
+                insert(UserAchievement),
+                [
+                    {"user_id": user_id, "achievement_id": achievement_id}
+                    for user_id in user_ids
+                    for achievement_id in achievement_ids
+                ],
+            )
+        await db.commit()
+
+    return list(user_ids)
+
+
+async def bench_mode(args: argparse.Namespace, mode: str) -> tuple[float, int]:
+    """
+    Победа первых args.wins пользователей на свежей базе
+    Возвращает (время, запросов к БД)
+    """
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    user_ids = await populate(
+        session_factory, args.achievements, args.users, dense=mode == "прежний"
+    )
+
+    service = AchievementService()
+    statements = 0
+
+    def count_statements(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statements)
+
+    start = time.perf_counter()
+    for user_id in user_ids[: args.wins]:
+        async with session_factory() as db:
+            if mode == "прежний":
+                await legacy_check(db, user_id)
+            else:
+                await service.check_and_grant_achievements(db, user_id, WIN_STATS)
+    elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    return elapsed, statements
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--achievements", type=int, default=300)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument(
+        "--wins", type=int, default=300, help="сколько пользователей побеждают"
+    )
+    args = parser.parse_args()
+
+    print(f"{args.achievements} достижений, {args.users} пользователей")
+    print(
+        f"{'режим':>10} {'побед':>6} {'время, с':>9} "
+        f"{'мс/победу':>10} {'запросов':>9}"
+    )
+
+    for mode in ("прежний", "правила"):
+        elapsed, statements = await bench_mode(args, mode)
+        print(
+            f"{mode:>10} {args.wins:>6} {elapsed:>9.2f} "
+            f"{elapsed / args.wins * 1000:>10.2f} {statements:>9}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Бенчмарк задержки ходов во время всплеска логинов
+
+Пока выполняются N одновременных проверок пароля (bcrypt), отдельная задача
+имитирует ходы игроков: раз в --move-interval мс просыпается и измеряет,
+насколько event loop опоздал. Сравнивается проверка пароля прямо в event
+loop (как было) с PasswordHasher (пул потоков с ограничением параллелизма).
+Запуск: python -m benchmarks.bench_login_load [--logins 100] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.core.security import PasswordHasher, get_password_hash, verify_password
+
+
+async def measure_moves(interval: float, stop: asyncio.Event) -> list[float]:
+    """Опоздания «ходов» (мс), пока не установлен stop"""
+    delays = []
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        delays.append((time.perf_counter() - expected) * 1000)
+    return delays
+
+
+async def bench_mode(
+    mode: str, logins: int, concurrency: int, hashed: str, interval: float
+) -> tuple[list[float], float]:
+    """
+    Один режим
+    Возвращает (опоздания ходов в мс, время всех логинов)
+    """
+    hasher = PasswordHasher(max_concurrency=concurrency)
+
+    async def login() -> bool:
+        if mode == "в цикле":
+            return verify_password("password123", hashed)
+        return await hasher.verify("password123", hashed)
+
+    stop = asyncio.Event()
+    moves = asyncio.create_task(measure_moves(interval, stop))
+    await asyncio.sleep(interval * 5)
+
+    start = time.perf_counter()
+    if mode != "без логинов":
+        results = await asyncio.gather(*(login() for _ in range(logins)))
+        assert all(results)
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(interval * 5)
+    stop.set()
+    delays = await moves
+    hasher.close()
+
+    return delays, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--move-interval", type=float, default=20, help="интервал ходов, мс"
+    )
+    args = parser.parse_args()
+
+    hashed = get_password_hash("password123")
+    interval = args.move_interval / 1000
+
+    print(f"{args.logins} одновременных логинов, пул на {args.concurrency} потока")
+    print(
+        f"{'режим':>12} {'логины, с':>10} {'p50, мс':>8} "
+        f"{'p99, мс':>8} {'макс, мс':>9}"
+    )
+
+    for mode in ("без логинов", "в цикле", "пул"):
+        delays, elapsed = await bench_mode(
+            mode, args.logins, args.concurrency, hashed, interval
+        )
+        delays.sort()
+        p99 = delays[min(int(len(delays) * 0.99), len(delays) - 1)]
+        print(
+            f"{mode:>12} {elapsed:>10.2f} {statistics.median(delays):>8.1f} "
+            f"{p99:>8.1f} {delays[-1]:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Бенчмарк пакетной рассылки ходов (moves_batch) при разном размере игры
+
+Каждый игрок игры подключен сокетом и делает ход раз в раунд; ходы внутри
+раунда равномерно распределены по времени. Сравнивается рассылка каждого хода
+сразу (player_move) с накоплением ходов и отправкой раз в тик.
+Запуск: python -m benchmarks.bench_ws_batching [--players 10 50 100] [--rounds 5]
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.websocket_service import ConnectionManager
+
+
+class BenchWebSocket:
+    """Сокет-заглушка, считающий полученные сообщения"""
+
+    def __init__(self):
+        self.received = 0
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        # Отдаем управление, как при реальной записи в сокет
+        await asyncio.sleep(0)
+        self.received += 1
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+async def bench_game(
+    players: int, rounds: int, round_time: float, batch_tick_ms: int | None
+) -> tuple[int, float, float]:
+    """
+    Одна игра
+    Возвращает (доставлено сообщений, время, процессорное время)
+    """
+    manager = ConnectionManager(max_queue_size=100_000)
+    sockets = [BenchWebSocket() for _ in range(players)]
+    connections = [await manager.connect(ws, 1) for ws in sockets]
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    for _ in range(rounds):
+        for player in range(players):
+            await manager.notify_player_move(
+                1, f"player{player}", "Статья", 1, batch_tick_ms=batch_tick_ms
+            )
+            await asyncio.sleep(round_time / players)
+
+    await manager.flush_moves(1)
+    for connection in connections:
+        await connection.queue.join()
+
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    for ws in sockets:
+        manager.disconnect(ws, 1)
+    await asyncio.sleep(0)
+
+    return sum(ws.received for ws in sockets), elapsed, cpu
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--round-time", type=float, default=1.0, help="длительность раунда, с"
+    )
+    parser.add_argument("--ticks", type=int, nargs="+", default=[100, 250])
+    args = parser.parse_args()
+
+    print(f"{args.rounds} раундов по {args.round_time:.1f} с, ход каждого игрока")
+    print(
+        f"{'игроков':>8} {'режим':>10} {'сообщений':>10} "
+        f"{'сообщ./с':>10} {'CPU, с':>8}"
+    )
+
+    for players in args.players:
+        for tick in [None, *args.ticks]:
+            messages, elapsed, cpu = await bench_game(
+                players, args.rounds, args.round_time, tick
+            )
+            mode = "сразу" if tick is None else f"тик {tick} мс"
+            print(
+                f"{players:>8} {mode:>10} {messages:>10} "
+                f"{messages / elapsed:>10.0f} {cpu:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
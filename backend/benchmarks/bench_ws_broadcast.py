@@ -0,0 +1,125 @@
+"""
+Бенчмарк рассылки WebSocket: 1000 сокетов в одной игре, часть клиентов медленные
+
+Сравнивает последовательную рассылку (json.dumps и await send_text на каждое
+соединение) с ConnectionManager (сериализация один раз, очереди и писатели).
+Запуск: python -m benchmarks.bench_ws_broadcast [--sockets 1000] [--slow 10]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.websocket_service import ConnectionManager
+
+
+class BenchWebSocket:
+    """Сокет-заглушка: быстрый или медленный читатель"""
+
+    def __init__(self, delay: float, expected: int):
+        self.delay = delay
+        self.expected = expected
+        self.received = 0
+        self.done = asyncio.Event()
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            # Отдаем управление, как при реальной записи в сокет
+            await asyncio.sleep(0)
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.done.set()
+
+
+def make_sockets(count: int, slow: int, delay: float, expected: int):
+    return [BenchWebSocket(delay if i < slow else 0.0, expected) for i in range(count)]
+
+
+async def bench_sequential(count: int, slow: int, delay: float, messages: int) -> float:
+    """Старый вариант: сериализация и await send_text на каждое соединение"""
+    sockets = make_sockets(count, slow, delay, messages)
+    fast = sockets[slow:]
+    message = {"type": "player_move", "username": "player", "article": "A", "steps": 1}
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        for ws in sockets:
+            await ws.send_text(json.dumps(message))
+    await asyncio.gather(*(ws.done.wait() for ws in fast))
+    return time.perf_counter() - start
+
+
+async def bench_manager(
+    count: int, slow: int, delay: float, messages: int, queue_size: int
+) -> tuple[float, float, int]:
+    """
+    ConnectionManager
+    Возвращает (время доставки быстрым, среднее время вызова, отключено)
+    """
+    manager = ConnectionManager(max_queue_size=queue_size)
+    sockets = make_sockets(count, slow, delay, messages)
+    fast = sockets[slow:]
+    for ws in sockets:
+        await manager.connect(ws, 1)
+
+    message = {"type": "player_move", "username": "player", "article": "A", "steps": 1}
+
+    start = time.perf_counter()
+    broadcast_time = 0.0
+    for _ in range(messages):
+        t0 = time.perf_counter()
+        await manager.broadcast_to_game(message, 1)
+        broadcast_time += time.perf_counter() - t0
+        await asyncio.sleep(0)
+    await asyncio.gather(*(ws.done.wait() for ws in fast))
+    elapsed = time.perf_counter() - start
+
+    dropped = count - len(manager.active_connections.get(1, ()))
+    for ws in sockets:
+        manager.disconnect(ws, 1)
+    await asyncio.sleep(0)
+
+    return elapsed, broadcast_time / messages, dropped
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument(
+        "--delay", type=float, default=0.02, help="задержка медленного клиента, с"
+    )
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--queue-size", type=int, default=8)
+    args = parser.parse_args()
+
+    print(
+        f"{args.sockets} сокетов, {args.slow} медленных ({args.delay * 1000:.0f} мс), "
+        f"{args.messages} сообщений"
+    )
+
+    sequential = await bench_sequential(
+        args.sockets, args.slow, args.delay, args.messages
+    )
+    print(f"Последовательная рассылка: доставка быстрым за {sequential:.3f} с")
+
+    elapsed, per_broadcast, dropped = await bench_manager(
+        args.sockets, args.slow, args.delay, args.messages, args.queue_size
+    )
+    print(
+        f"ConnectionManager:         доставка быстрым за {elapsed:.3f} с, "
+        f"broadcast_to_game {per_broadcast * 1000:.2f} мс, "
+        f"отключено медленных: {dropped}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,11 +9,16 @@ import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_session_factory
 from app.main import app
 from app.models.achievement import Achievement
 from app.models.user import User
+from app.core.rate_limit import rate_limit_store
 from app.core.security import get_password_hash
+from app.services.achievement_service import achievement_service
+from app.services.auth_service import auth_service
+from app.services.game_service import game_service
+from app.services.leaderboard_service import leaderboard_service
 
 # Test database URL
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -40,6 +45,19 @@ def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def reset_service_caches() -> Generator[None, None, None]:
+    """Сброс in-process кешей сервисов между тестами"""
+    game_service.invalidate_count_cache()
+    leaderboard_service.reset()
+    achievement_service.rarity.reset()
+    achievement_service.catalog.reset()
+    achievement_service.shares.reset()
+    auth_service.reset_caches()
+    rate_limit_store.reset()
+    yield
+
+
 @pytest_asyncio.fixture
 async def db_session() -> AsyncGenerator[AsyncSession, None]:
     """Create test database session"""
@@ -61,6 +79,7 @@ async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestSessionLocal
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
@@ -0,0 +1,128 @@
+"""
+In-process замена Redis для тестов
+"""
+from typing import Any
+
+from sortedcontainers import SortedList
+
+
+class LocalRedis:
+    """
+    Минимальная in-process замена Redis в стиле fakeredis
+
+    Реализует только используемое приложением подмножество команд
+    с той же семантикой (строковые члены и ключи, async-интерфейс).
+    """
+
+    def __init__(self):
+        # key -> SortedList[(score, member)] и member -> score
+        self._zsets: dict[str, SortedList] = {}
+        self._zscores: dict[str, dict[str, float]] = {}
+        self._hashes: dict[str, dict[str, str]] = {}
+
+    # Sorted sets
+
+    async def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        """ZADD key score member [score member ...]"""
+        zset = self._zsets.setdefault(key, SortedList())
+        scores = self._zscores.setdefault(key, {})
+        added = 0
+
+        for member, score in mapping.items():
+            member = str(member)
+            old_score = scores.get(member)
+            if old_score is not None:
+                zset.remove((old_score, member))
+            else:
+                added += 1
+            scores[member] = float(score)
+            zset.add((float(score), member))
+
+        return added
+
+    async def zrem(self, key: str, *members: str) -> int:
+        """ZREM key member [member ...]"""
+        zset = self._zsets.get(key)
+        scores = self._zscores.get(key)
+        if zset is None or scores is None:
+            return 0
+
+        removed = 0
+        for member in members:
+            member = str(member)
+            score = scores.pop(member, None)
+            if score is not None:
+                zset.remove((score, member))
+                removed += 1
+
+        return removed
+
+    async def zcard(self, key: str) -> int:
+        """ZCARD key"""
+        return len(self._zsets.get(key, ()))
+
+    async def zrevrank(self, key: str, member: str) -> int | None:
+        """ZREVRANK key member"""
+        scores = self._zscores.get(key, {})
+        score = scores.get(str(member))
+        if score is None:
+            return None
+
+        zset = self._zsets[key]
+        return len(zset) - 1 - zset.index((score, str(member)))
+
+    async def zrevrange(
+        self, key: str, start: int, end: int, withscores: bool = False
+    ) -> list[Any]:
+        """ZREVRANGE key start stop [WITHSCORES]"""
+        zset = self._zsets.get(key)
+        if not zset:
+            return []
+
+        size = len(zset)
+        if start < 0:
+            start = max(size + start, 0)
+        if end < 0:
+            end = size + end
+        end = min(end, size - 1)
+        if start > end:
+            return []
+
+        # Индексы в обратном порядке соответствуют сортировке по убыванию
+        items = reversed(list(zset.islice(size - 1 - end, size - start)))
+
+        if withscores:
+            return [(member, score) for score, member in items]
+        return [member for _, member in items]
+
+    # Hashes
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> int:
+        """HSET key field value [field value ...]"""
+        hash_ = self._hashes.setdefault(key, {})
+        added = sum(1 for field in mapping if str(field) not in hash_)
+        hash_.update({str(field): str(value) for field, value in mapping.items()})
+        return added
+
+    async def hmget(self, key: str, fields: list[str]) -> list[str | None]:
+        """HMGET key field [field ...]"""
+        hash_ = self._hashes.get(key, {})
+        return [hash_.get(str(field)) for field in fields]
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        """HDEL key field [field ...]"""
+        hash_ = self._hashes.get(key, {})
+        return sum(1 for field in fields if hash_.pop(str(field), None) is not None)
+
+    # Keys
+
+    async def delete(self, *keys: str) -> int:
+        """DEL key [key ...]"""
+        deleted = 0
+        for key in keys:
+            if key in self._zsets or key in self._hashes:
+                deleted += 1
+            self._zsets.pop(key, None)
+            self._zscores.pop(key, None)
+            self._hashes.pop(key, None)
+        return deleted
@@ -125,3 +125,329 @@ async def test_share_achievement_unlocked(client: AsyncClient, auth_headers, tes
         assert "rarity_percentage" in data
         assert "share_text" in data
         assert "WikiRush" in data["share_text"]
+
+
+@pytest.mark.asyncio
+async def test_rarity_table_is_grouped_and_incremental(
+    client: AsyncClient, auth_headers, test_user, db_session
+):
+    """Test rarity comes from one grouped query and is updated on unlock"""
+    from sqlalchemy import event
+
+    from app.models.user import User
+    from app.services.achievement_service import achievement_service
+    from tests.conftest import test_engine
+
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    db_session.add(other)
+    test_user.total_games = 1
+    await db_session.commit()
+    user_id, other_id = test_user.id, other.id
+
+    await achievement_service.check_and_grant_achievements(db_session, user_id)
+    # Выдача загрузила таблицу для карточки шаринга; проверяем загрузку заново
+    achievement_service.rarity.reset()
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+    try:
+        response = await client.get("/api/v1/achievements/", headers=auth_headers)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+    assert response.status_code == 200
+    unlocked = {a["achievement"]["code"]: a for a in response.json()["unlocked"]}
+    assert unlocked["first_game"]["rarity_percentage"] == 50.0
+    # Одна таблица редкости вместо COUNT на каждое достижение
+    assert sum("count(" in s.lower() for s in statements) == 2
+
+    # Выдача достижения второму пользователю обновляет таблицу без пересчета
+    other.total_games = 1
+    await db_session.commit()
+    await achievement_service.check_and_grant_achievements(db_session, other_id)
+
+    first_game_id = unlocked["first_game"]["achievement"]["id"]
+    assert achievement_service.rarity.percentage(first_game_id) == 100.0
+
+
+def test_rule_index_compares_records_with_lower_is_better():
+    """Test records (best_time, best_steps) are met when value <= target"""
+    from types import SimpleNamespace
+
+    from app.services.achievement_rules import RuleIndex
+
+    catalog = [
+        SimpleNamespace(id=1, requirement={"type": "games_won", "target": 1}),
+        SimpleNamespace(id=2, requirement={"type": "games_won", "target": 10}),
+        SimpleNamespace(id=3, requirement={"type": "best_time", "target": 60}),
+        SimpleNamespace(id=4, requirement={"type": "best_time", "target": 30}),
+        SimpleNamespace(id=5, requirement={"type": "unknown", "target": 1}),
+    ]
+    rules = RuleIndex.compile(catalog)
+    assert len(rules) == 4
+
+    stats = {"games_won": 3, "best_time": 45, "best_steps": None}
+
+    # Проверяются только правила изменившихся показателей
+    assert [rule.achievement_id for rule in rules.met(stats, ["best_time"])] == [3]
+    assert [rule.achievement_id for rule in rules.met(stats, ["games_won"])] == [1]
+    assert {rule.achievement_id for rule in rules.met(stats)} == {1, 3}
+
+    # Прогресс неполученных достижений вычисляется из статистики
+    assert rules.get(2).progress(3) == 3
+    assert rules.get(4).progress(45) == 0
+    assert rules.get(3).progress(45) == 60
+
+    # Без результата рекорд не выполнен
+    assert rules.met({"best_time": None}, ["best_time"]) == []
+
+
+@pytest.mark.asyncio
+async def test_check_achievements_evaluates_changed_stats_in_bulk(
+    test_user, test_achievements, db_session
+):
+    """Test only rules of changed stats are granted, with one upsert"""
+    from sqlalchemy import event, select
+
+    from app.models.achievement import Achievement, UserAchievement
+    from app.services.achievement_service import achievement_service
+    from tests.conftest import test_engine
+
+    test_user.total_games = 12
+    test_user.total_wins = 1
+    await db_session.commit()
+    user_id = test_user.id
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+    try:
+        granted = await achievement_service.check_and_grant_achievements(
+            db_session, user_id, changed_stats=("games_played",)
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+    assert {a.code for a in granted} == {"first_game", "games_10"}
+    assert sum(s.lstrip().upper().startswith("INSERT") for s in statements) == 1
+
+    # Победы не изменялись: first_win не проверялся. Записи есть только
+    # у полученных достижений
+    result = await db_session.execute(
+        select(Achievement.code)
+        .join(UserAchievement.achievement)
+        .where(UserAchievement.user_id == user_id)
+    )
+    assert set(result.scalars().all()) == {"first_game", "games_10"}
+
+    # Полная проверка выдает только недостающие, повторная - ничего
+    granted = await achievement_service.check_and_grant_achievements(
+        db_session, user_id
+    )
+    assert {a.code for a in granted} == {"first_win"}
+    assert (
+        await achievement_service.check_and_grant_achievements(db_session, user_id)
+        == []
+    )
+
+
+@pytest.mark.asyncio
+async def test_locked_progress_is_derived_from_user_stats(
+    client: AsyncClient, auth_headers, test_user, db_session
+):
+    """Test listing creates no rows and computes locked progress from stats"""
+    from sqlalchemy import func, select
+
+    from app.models.achievement import UserAchievement
+
+    test_user.total_games = 4
+    await db_session.commit()
+
+    response = await client.get("/api/v1/achievements/", headers=auth_headers)
+    assert response.status_code == 200
+
+    locked = {a["achievement"]["code"]: a for a in response.json()["locked"]}
+    assert locked["games_10"]["progress"] == 4
+    assert locked["games_10"]["target"] == 10
+    assert locked["first_win"]["progress"] == 0
+
+    result = await db_session.execute(select(func.count(UserAchievement.id)))
+    assert result.scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_achievement_catalog_is_cached_until_version_changes(
+    client: AsyncClient, auth_headers, db_session, monkeypatch
+):
+    """Test achievement endpoints read the catalog from memory"""
+    from sqlalchemy import event
+
+    from app.models.achievement import Achievement
+    from app.services.achievement_catalog import bump_catalog_version
+    from app.services.achievement_service import achievement_service
+    from tests.conftest import test_engine
+
+    response = await client.get("/api/v1/achievements/", headers=auth_headers)
+    assert response.status_code == 200
+    first_game_id = response.json()["locked"][0]["achievement"]["id"]
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+    try:
+        response = await client.get(
+            f"/api/v1/achievements/{first_game_id}", headers=auth_headers
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+    assert response.status_code == 200
+    # Цепочка разрешена заранее, в порядке из достижения
+    assert [a["code"] for a in response.json()["related_achievements"]] == [
+        "first_game",
+        "games_10",
+    ]
+    assert not any("FROM achievements" in s for s in statements)
+
+    # Новое достижение появляется после смены версии каталога
+    db_session.add(
+        Achievement(
+            code="games_50",
+            name="Опытный игрок",
+            description="Сыграйте 50 игр",
+            category="games",
+            rarity="rare",
+            requirement={"type": "games_played", "target": 50},
+            points=50,
+        )
+    )
+    await bump_catalog_version(db_session)
+    await db_session.commit()
+    monkeypatch.setattr(achievement_service.catalog, "check_interval", 0)
+    response = await client.get("/api/v1/achievements/", headers=auth_headers)
+
+    codes = {a["achievement"]["code"] for a in response.json()["locked"]}
+    assert "games_50" in codes
+    assert achievement_service.catalog.catalog.version == 1
+
+
+@pytest.mark.asyncio
+async def test_backfill_achievements(test_user, test_achievements, db_session):
+    """Test chunked backfill grants selected achievements to existing users"""
+    from sqlalchemy import func, select
+
+    from app.core.backfill_achievements import backfill_achievements, split_id_range
+    from app.models.achievement import UserAchievement
+    from app.models.user import User
+    from tests.conftest import TestSessionLocal
+
+    assert split_id_range(1, 10, 3) == [(1, 4), (5, 8), (9, 10)]
+    assert split_id_range(5, 5, 4) == [(5, 5)]
+
+    db_session.add_all(
+        User(
+            username=f"player{i}",
+            email=f"player{i}@example.com",
+            hashed_password="x",
+            total_games=i * 5,
+        )
+        for i in range(3)
+    )
+    await db_session.commit()
+
+    processed, granted = await backfill_achievements(
+        TestSessionLocal, codes=["first_game", "games_10"], batch_size=2
+    )
+    assert (processed, granted) == (4, 3)
+
+    result = await db_session.execute(
+        select(User.username, func.count(UserAchievement.id))
+        .join(UserAchievement, UserAchievement.user_id == User.id)
+        .group_by(User.username)
+    )
+    assert dict(result.all()) == {"player1": 1, "player2": 2}
+
+    # Повторный запуск продолжает с контрольной точки и ничего не выдает
+    assert await backfill_achievements(TestSessionLocal, batch_size=2) == (4, 0)
+
+    with pytest.raises(ValueError):
+        await backfill_achievements(TestSessionLocal, codes=["unknown"])
+
+
+@pytest.mark.asyncio
+async def test_share_payload_is_cached_with_etag(
+    client: AsyncClient, auth_headers, test_user, db_session
+):
+    """Test share card is built at unlock and served with ETag/304"""
+    from sqlalchemy import event
+
+    from app.services.achievement_service import achievement_service
+    from tests.conftest import test_engine
+
+    test_user.total_wins = 1
+    await db_session.commit()
+    user_id = test_user.id
+
+    response = await client.post("/api/v1/achievements/check", headers=auth_headers)
+    assert response.json()["count"] == 1
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    url = f"/api/v1/achievements/share/{user_id}/first_win"
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+    try:
+        response = await client.get(url)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+    # Карточка собрана при выдаче: запросов к БД нет
+    assert response.status_code == 200
+    assert statements == []
+    assert response.json()["user_name"] == test_user.username
+    assert response.json()["rarity_percentage"] == 100.0
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public")
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Другой воркер собирает карточку из БД с тем же телом и ETag
+    achievement_service.shares.reset()
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Переход редкости в другой бакет пересобирает карточку
+    achievement_service.rarity.total_users = 4
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["rarity_percentage"] == 25.0
+    assert response.headers["etag"] != etag
+
+    # Редкость меньше 1% видна в тексте, хотя бакет тот же
+    achievement_service.rarity.total_users = 1000
+    response = await client.get(url)
+    assert response.json()["rarity_percentage"] == 0.1
+    assert "только 0.10% игроков" in response.json()["share_text"]
+    etag = response.headers["etag"]
+
+    achievement_service.shares.reset()
+    achievement_service.rarity.total_users = 2000
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = await client.get(f"/api/v1/achievements/share/{user_id}/first_game")
+    assert response.status_code == 404
@@ -40,6 +40,37 @@ async def test_register_duplicate_username(client: AsyncClient, test_user):
     assert "уже существует" in response.json()["detail"]
 
 
+@pytest.mark.asyncio
+async def test_register_duplicate_email_single_insert(client: AsyncClient, test_user):
+    """Test registration is one INSERT and a duplicate email is reported"""
+    from sqlalchemy import event
+
+    from tests.conftest import test_engine
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        response = await client.post(
+            "/api/v1/auth/register",
+            json={
+                "username": "anotheruser",
+                "email": test_user.email,
+                "password": "password123",
+            },
+        )
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email уже используется"
+    assert len(statements) == 1
+    assert statements[0].startswith("INSERT INTO users")
+
+
 @pytest.mark.asyncio
 async def test_login_success(client: AsyncClient, test_user):
     """Test successful login"""
@@ -75,3 +106,89 @@ async def test_get_current_user(client: AsyncClient, auth_headers):
     data = response.json()
     assert data["username"] == "testuser"
     assert data["email"] == "test@example.com"
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_off_loop_with_concurrency_cap():
+    """Test bcrypt runs in the thread pool and excess calls wait in a queue"""
+    import asyncio
+
+    from app.core.security import PasswordHasher
+
+    hasher = PasswordHasher(max_concurrency=1)
+    hashed = await hasher.hash("password123")
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    checks = [
+        asyncio.create_task(hasher.verify(password, hashed))
+        for password in ("password123", "wrong", "password123")
+    ]
+    await asyncio.sleep(0)
+    # Один вызов выполняется, остальные ждут семафора
+    assert hasher.metrics()["wikirush_password_hash_queue_depth"] == 2
+
+    assert await asyncio.gather(*checks) == [True, False, True]
+    ticker_task.cancel()
+    hasher.close()
+
+    # Event loop не блокировался, пока bcrypt считал хеши
+    assert ticks > 0
+    assert hasher.metrics()["wikirush_password_hash_total"] == 4
+    assert hasher.metrics()["wikirush_password_hash_queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_current_user_cached_without_db_queries(
+    client: AsyncClient, db_session, test_user, auth_headers
+):
+    """Test repeated auth costs no queries and deactivation drops the cache"""
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+    from sqlalchemy import event
+
+    from app.api.deps import get_current_user
+    from tests.conftest import test_engine
+
+    user_id = test_user.id
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=auth_headers["Authorization"].split()[1]
+    )
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    principal = await get_current_user(credentials, db_session)
+    assert principal.id == user_id
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        for _ in range(3):
+            assert (await get_current_user(credentials, db_session)).id == user_id
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+    assert statements == []
+
+    # Запомненная подпись с чужим заголовком/payload не принимается
+    from app.services.auth_service import auth_service
+
+    signature = credentials.credentials.rpartition(".")[2]
+    assert auth_service.get_user_id_from_access_token(signature) is None
+    forged = f"garbage.garbage.{signature}"
+    assert auth_service.get_user_id_from_access_token(forged) is None
+
+    # Деактивация через ORM сбрасывает запись кеша
+    test_user.is_active = False
+    await db_session.commit()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(credentials, db_session)
+    assert exc_info.value.status_code == 403
@@ -38,6 +38,42 @@ async def test_list_games(client: AsyncClient):
     assert isinstance(data["games"], list)
 
 
+@pytest.mark.asyncio
+async def test_game_writes_invalidate_cached_counts(
+    client: AsyncClient, auth_headers, test_user, db_session, monkeypatch
+):
+    """Test creating and starting a game refreshes the cached list totals"""
+    from app.services.game_service import game_service
+    from app.services.wikipedia_service import wikipedia_service
+
+    async def validate_article_exists(title: str) -> bool:
+        return True
+
+    monkeypatch.setattr(
+        wikipedia_service, "validate_article_exists", validate_article_exists
+    )
+
+    response = await client.get("/api/v1/games", params={"status": "in_progress"})
+    assert response.json()["total"] == 0
+    response = await client.get("/api/v1/games")
+    assert response.json()["total"] == 0
+
+    response = await client.post(
+        "/api/v1/games",
+        headers=auth_headers,
+        json={"mode": "single", "start_article": "Start", "target_article": "Target"},
+    )
+    assert response.status_code == 201
+    game_id = response.json()["id"]
+
+    response = await client.get("/api/v1/games")
+    assert response.json()["total"] == 1
+
+    await game_service.start_game(db_session, game_id)
+    response = await client.get("/api/v1/games", params={"status": "in_progress"})
+    assert response.json()["total"] == 1
+
+
 @pytest.mark.asyncio
 async def test_get_leaderboard(client: AsyncClient):
     """Test getting leaderboard"""
@@ -46,3 +82,173 @@ async def test_get_leaderboard(client: AsyncClient):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
+
+
+@pytest.mark.asyncio
+async def test_list_games_cursor_pagination(client: AsyncClient, test_user, db_session):
+    """Test keyset pagination of the games list"""
+    from app.models.game import Game, GameStatus
+
+    for i in range(5):
+        db_session.add(
+            Game(
+                mode="single",
+                status=GameStatus.WAITING.value,
+                start_article=f"Start {i}",
+                target_article=f"Target {i}",
+                max_steps=10,
+                time_limit=60,
+                max_players=2,
+                creator_id=test_user.id,
+                participants_count=1,
+            )
+        )
+    await db_session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"page_size": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/v1/games", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(game["id"] for game in data["games"])
+        assert all(game["participants_count"] == 1 for game in data["games"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 5
+    assert seen == sorted(seen, reverse=True)
+    assert data["total"] == 5
+
+
+@pytest.mark.asyncio
+async def test_list_games_invalid_cursor(client: AsyncClient):
+    """Test listing games with a malformed cursor"""
+    response = await client.get("/api/v1/games", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_join_game_limits(
+    client: AsyncClient, auth_headers, test_user, db_session
+):
+    """Test joining respects the player limit and rejects duplicate joins"""
+    from app.models.game import Game, GameStatus
+    from app.models.user import User
+    from app.services.game_service import game_service
+
+    game = Game(
+        mode="multiplayer",
+        status=GameStatus.WAITING.value,
+        start_article="Start",
+        target_article="Target",
+        max_steps=10,
+        time_limit=60,
+        max_players=1,
+        creator_id=test_user.id,
+    )
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    db_session.add_all([game, other])
+    await db_session.commit()
+    game_id, other_id = game.id, other.id
+
+    response = await client.post(f"/api/v1/games/{game_id}/join", headers=auth_headers)
+    assert response.status_code == 200
+
+    response = await client.post(f"/api/v1/games/{game_id}/join", headers=auth_headers)
+    assert response.status_code == 400
+    assert "уже присоединились" in response.json()["detail"]
+
+    with pytest.raises(ValueError, match="заполнена"):
+        await game_service.join_game(db_session, game_id, other_id)
+
+    await db_session.refresh(game)
+    assert game.participants_count == 1
+
+
+async def _create_started_game(db_session, user_id: int):
+    from datetime import UTC, datetime
+
+    from app.models.game import Game, GameParticipant, GameStatus
+
+    game = Game(
+        mode="single",
+        status=GameStatus.IN_PROGRESS.value,
+        start_article="Start",
+        target_article="Target",
+        max_steps=10,
+        time_limit=600,
+        max_players=1,
+        creator_id=user_id,
+        participants_count=1,
+        # Наивное UTC-время, как в game_service
+        started_at=datetime.now(UTC).replace(tzinfo=None),
+    )
+    db_session.add(game)
+    await db_session.flush()
+    participant = GameParticipant(
+        game_id=game.id, user_id=user_id, path=["Start"], current_article="Start"
+    )
+    db_session.add(participant)
+    await db_session.commit()
+    return game, participant
+
+
+@pytest.mark.asyncio
+async def test_make_move_updates_user_stats(
+    client: AsyncClient, test_user, db_session, monkeypatch
+):
+    """Test that a winning move updates running aggregates for user stats"""
+    from app.services.game_service import game_service
+    from app.services.wikipedia_service import wikipedia_service
+
+    async def is_link_valid(from_article: str, to_article: str) -> bool:
+        return True
+
+    monkeypatch.setattr(wikipedia_service, "is_link_valid", is_link_valid)
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    await game_service.make_move(db_session, game.id, test_user.id, "Middle")
+    participant, is_winner = await game_service.make_move(
+        db_session, game.id, test_user.id, "Target"
+    )
+    assert is_winner
+
+    response = await client.get(f"/api/v1/users/{test_user.id}/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_wins"] == 1
+    assert data["average_steps"] == 2
+    assert data["average_time"] == participant.time_taken
+
+
+@pytest.mark.asyncio
+async def test_backfill_user_stats(client: AsyncClient, test_user, db_session):
+    """Test chunked backfill of user aggregates from game history"""
+    from app.core.backfill_user_stats import backfill_user_stats
+    from tests.conftest import TestSessionLocal
+
+    user_id = test_user.id
+    for steps, time_taken in [(3, 30), (5, 50)]:
+        _, participant = await _create_started_game(db_session, user_id)
+        participant.is_finished = True
+        participant.steps_count = steps
+        participant.time_taken = time_taken
+    await db_session.commit()
+
+    processed = await backfill_user_stats(TestSessionLocal, batch_size=1)
+    assert processed == 1
+    db_session.expire_all()
+
+    response = await client.get(f"/api/v1/users/{user_id}/stats")
+    data = response.json()
+    assert data["average_steps"] == 4
+    assert data["average_time"] == 40
+
+    # Повторный запуск продолжает с контрольной точки
+    assert await backfill_user_stats(TestSessionLocal, batch_size=1) == 1
@@ -0,0 +1,136 @@
+"""
+Tests for leaderboard
+"""
+import pytest
+from httpx import AsyncClient
+
+from app.models.user import User
+from app.services.leaderboard_service import LeaderboardService, RedisLeaderboardMirror
+from tests.local_redis import LocalRedis
+
+
+def make_user(user_id: int, wins: int, best_time: int | None) -> User:
+    return User(
+        id=user_id,
+        username=f"player{user_id}",
+        email=f"player{user_id}@example.com",
+        hashed_password="x",
+        total_games=wins + 1,
+        total_wins=wins,
+        best_time=best_time,
+        best_steps=None,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_mirror", [False, True])
+async def test_leaderboard_incremental_updates(db_session, with_mirror):
+    """Test top-N, rank and window lookups after incremental updates"""
+    mirror = RedisLeaderboardMirror(LocalRedis(), key="test") if with_mirror else None
+    service = LeaderboardService(mirror=mirror)
+    await service.rebuild(db_session)
+
+    users = [make_user(i, wins=i, best_time=100 - i) for i in range(1, 11)]
+    for user in users:
+        await service.record(user)
+
+    top = await service.get_top(db_session, 3)
+    assert [entry.id for entry in top] == [10, 9, 8]
+    assert await service.get_rank(db_session, 1) == 10
+
+    # Игрок 1 набирает побед больше всех
+    users[0].total_wins = 20
+    await service.record(users[0])
+
+    assert await service.get_rank(db_session, 1) == 1
+    assert await service.get_rank(db_session, 10) == 2
+    window = await service.get_range(db_session, 1, 3)
+    assert [entry.id for entry in window] == [10, 9, 8]
+    assert await service.get_size(db_session) == 10
+
+    # При равенстве побед выше тот, у кого лучше время
+    await service.record(make_user(11, wins=20, best_time=5))
+    assert await service.get_rank(db_session, 11) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_mirror", [False, True])
+async def test_leaderboard_ties_ordered_by_id(db_session, with_mirror):
+    """Test equal scores rank by id the same way in memory and in Redis"""
+    mirror = RedisLeaderboardMirror(LocalRedis(), key="test") if with_mirror else None
+    service = LeaderboardService(mirror=mirror)
+    await service.rebuild(db_session)
+
+    for user_id in (10, 9, 100, 2):
+        await service.record(make_user(user_id, wins=3, best_time=60))
+
+    top = await service.get_top(db_session, 4)
+    assert [entry.id for entry in top] == [2, 9, 10, 100]
+    assert await service.get_rank(db_session, 9) == 2
+    assert await service.get_rank(db_session, 10) == 3
+
+
+@pytest.mark.asyncio
+async def test_get_user_rank(client: AsyncClient, test_user, db_session):
+    """Test rank endpoint rebuilds from the database"""
+    test_user.total_games = 3
+    test_user.total_wins = 2
+    db_session.add(make_user(100, wins=5, best_time=30))
+    await db_session.commit()
+
+    response = await client.get(f"/api/v1/leaderboard/users/{test_user.id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rank"] == 2
+    assert data["total"] == 2
+    assert [p["user"]["id"] for p in data["around"]] == [100, test_user.id]
+
+    response = await client.get("/api/v1/leaderboard", params={"limit": 1})
+    assert [user["id"] for user in response.json()] == [100]
+
+    response = await client.get("/api/v1/leaderboard/users/9999")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_window_leaderboard(client: AsyncClient, test_user, db_session):
+    """Test day/week/season boards are served from incremental buckets"""
+    from datetime import UTC, datetime, timedelta
+
+    from app.services.leaderboard_service import leaderboard_service
+
+    other = make_user(100, wins=0, best_time=None)
+    db_session.add(other)
+    await db_session.commit()
+
+    await leaderboard_service.record_window_results(
+        db_session, [test_user.id], wins=1, time_taken=50, steps=4
+    )
+    await leaderboard_service.record_window_results(
+        db_session, [test_user.id], wins=1, time_taken=40, steps=6
+    )
+    await leaderboard_service.record_window_results(
+        db_session, [test_user.id, 100], games=1
+    )
+    # Давний результат не попадает в текущие день и неделю
+    old = datetime.now(UTC) - timedelta(days=70)
+    await leaderboard_service.record_window_results(
+        db_session, [100], wins=5, time_taken=10, steps=2, at=old
+    )
+    await db_session.commit()
+
+    for window in ("day", "week"):
+        response = await client.get("/api/v1/leaderboard", params={"window": window})
+        assert response.status_code == 200
+        data = response.json()
+        assert [user["id"] for user in data] == [test_user.id, 100]
+        assert data[0]["total_wins"] == 2
+        assert data[0]["total_games"] == 1
+        assert data[0]["best_time"] == 40
+        assert data[0]["best_steps"] == 4
+
+    removed = await leaderboard_service.prune_window_buckets(db_session)
+    assert removed == 2  # Давние дневной и недельный бакеты
+
+    response = await client.get("/api/v1/leaderboard", params={"window": "week"})
+    assert len(response.json()) == 2
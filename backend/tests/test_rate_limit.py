@@ -0,0 +1,86 @@
+"""
+Tests for request rate limiting
+"""
+import pytest
+from httpx import AsyncClient
+
+from app.core import rate_limit
+from app.core.rate_limit import InMemoryRateLimitStore
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_refills_and_evicts(monkeypatch):
+    """Test bucket allows a burst, refills over time and is evicted when full"""
+    now = 1000.0
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now)
+    store = InMemoryRateLimitStore()
+
+    # Корзина на 2 запроса, пополнение 1 токен в секунду
+    assert await store.take("login:ip:1", 2, 1.0) == 0
+    assert await store.take("login:ip:1", 2, 1.0) == 0
+    assert await store.take("login:ip:1", 2, 1.0) == pytest.approx(1.0)
+    # Корзины разных клиентов независимы
+    assert await store.take("login:ip:2", 2, 1.0) == 0
+
+    now += 1
+    assert await store.take("login:ip:1", 2, 1.0) == 0
+    # Корзина второго клиента уже восстановилась
+    assert await store.evict() == 1
+
+    now += 2
+    assert await store.evict() == 1
+    assert len(store) == 0
+
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_by_ip(client: AsyncClient):
+    """Test login returns 429 with Retry-After once the IP limit is spent"""
+    from app.core.config import settings
+
+    credentials = {"username": "nobody", "password": "wrongpassword"}
+    for _ in range(settings.RATE_LIMIT_LOGIN_PER_MINUTE):
+        response = await client.post("/api/v1/auth/login", json=credentials)
+        assert response.status_code == 401
+
+    response = await client.post("/api/v1/auth/login", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    # Остальные маршруты не ограничиваются
+    response = await client.get("/health")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_websocket_available_links_shares_rate_limit(
+    test_user, db_session, monkeypatch
+):
+    """Test the websocket RPC is limited by the same per-user bucket"""
+    import dataclasses
+    import json
+
+    from app.services.game_rpc_service import PlayerContext, game_rpc_service
+    from app.services.wikipedia_service import wikipedia_service
+    from tests.test_game import _create_started_game
+
+    async def get_article_links(title: str, limit: int = 500) -> list[str]:
+        return [f"{title} link"]
+
+    monkeypatch.setattr(wikipedia_service, "get_article_links", get_article_links)
+    monkeypatch.setattr(
+        rate_limit,
+        "rate_limit_rules",
+        tuple(dataclasses.replace(r, limit=1) for r in rate_limit.rate_limit_rules),
+    )
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    context = PlayerContext(user_id=test_user.id, username=test_user.username)
+    frame = json.dumps({"id": 1, "type": "available_links"})
+
+    response = await game_rpc_service.handle(db_session, game.id, context, frame)
+    assert response["ok"]
+
+    response = await game_rpc_service.handle(db_session, game.id, context, frame)
+    assert not response["ok"]
+    assert response["result"]["retry_after"] >= 1
+    assert "Слишком много запросов" in response["error"]
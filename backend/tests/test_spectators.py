@@ -0,0 +1,119 @@
+"""
+Tests for spectator rooms
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.core.pubsub import InProcessPubSub
+from app.services.spectator_service import SpectatorHub
+from app.services.websocket_service import ConnectionManager
+
+
+def _snapshot() -> dict:
+    return {
+        "id": 1,
+        "status": "in_progress",
+        "participants": [
+            {
+                "username": "alice",
+                "current_article": "Start",
+                "steps_count": 0,
+                "is_finished": False,
+            },
+            {
+                "username": "bob",
+                "current_article": "Start",
+                "steps_count": 0,
+                "is_finished": False,
+            },
+        ],
+    }
+
+
+async def _load_snapshot() -> dict:
+    return _snapshot()
+
+
+@pytest.mark.asyncio
+async def test_spectators_get_snapshot_then_throttled_deltas():
+    """Test viewers get a compact snapshot and one coalesced delta per tick"""
+    pubsub = InProcessPubSub()
+    manager = ConnectionManager(pubsub=pubsub)
+    hub = SpectatorHub(pubsub=pubsub, throttle_ms=50)
+
+    spectator = await hub.join(1, _load_snapshot)
+    snapshot = json.loads(spectator.queue.get_nowait())
+    assert snapshot == {
+        "type": "snapshot",
+        "status": "in_progress",
+        "participants": {"0": "alice", "1": "bob"},
+        "articles": {"0": "Start"},
+        "state": [[0, 0, 0, False], [1, 0, 0, False]],
+    }
+
+    # Второй зритель получает снимок из памяти комнаты
+    async def fail_snapshot() -> dict:
+        raise AssertionError("room state is reused")
+
+    second = await hub.join(1, fail_snapshot)
+    assert json.loads(second.queue.get_nowait())["type"] == "snapshot"
+
+    await manager.notify_player_move(1, "alice", "Middle", 1)
+    await manager.notify_player_move(1, "alice", "Target", 2)
+    await manager.notify_player_won(1, "alice", time=12, steps=2)
+
+    delta = json.loads(await asyncio.wait_for(spectator.queue.get(), 1))
+    assert delta == {
+        "type": "delta",
+        "articles": {"1": "Middle", "2": "Target"},
+        "state": [[0, 2, 2, True]],
+        "events": [{"type": "player_won", "participant": 0, "time": 12, "steps": 2}],
+    }
+
+    await hub.leave(1, spectator)
+    await hub.leave(1, second)
+    assert hub.rooms == {}
+    assert pubsub._handlers == {}
+
+
+@pytest.mark.asyncio
+async def test_slow_spectator_is_dropped():
+    """Test a viewer whose queue is full is closed and removed from the room"""
+    pubsub = InProcessPubSub()
+    manager = ConnectionManager(pubsub=pubsub)
+    hub = SpectatorHub(pubsub=pubsub, throttle_ms=10, max_queue_size=2)
+
+    spectator = await hub.join(1, _load_snapshot)
+    for step in range(1, 4):
+        await manager.notify_player_move(1, "bob", f"Article {step}", step)
+        await asyncio.sleep(0.03)
+
+    assert spectator.closed
+    assert hub.rooms[1].viewers == set()
+    assert await spectator.queue.get() is None
+
+
+@pytest.mark.asyncio
+async def test_spectate_stream_sends_sse_frames(test_user, db_session):
+    """Test the SSE endpoint streams the snapshot and leaves the room on close"""
+    from app.api.v1.games import spectate_game_stream
+    from app.services.spectator_service import spectator_hub
+    from tests.conftest import TestSessionLocal
+    from tests.test_game import _create_started_game
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+
+    response = await spectate_game_stream(game_id, TestSessionLocal)
+    assert response.media_type == "text/event-stream"
+
+    frames = response.body_iterator
+    first = await frames.__anext__()
+    assert first.startswith("data: ")
+    snapshot = json.loads(first[len("data: ") :])
+    assert snapshot["participants"] == {"0": "testuser"}
+
+    await frames.aclose()
+    assert game_id not in spectator_hub.rooms
@@ -0,0 +1,643 @@
+"""
+Tests for websocket connection manager
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.services.websocket_service import SLOW_CONSUMER_CLOSE_CODE, ConnectionManager
+
+
+class FakeWebSocket:
+    """Minimal websocket double recording sent frames"""
+
+    def __init__(self, send_delay: float = 0.0, subprotocols: list[str] = ()):
+        self.send_delay = send_delay
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.sent: list[str] = []
+        self.sent_bytes: list[bytes] = []
+        self.accepted = False
+        self.subprotocol: str | None = None
+        self.close_code: int | None = None
+        # Входящие кадры клиента; None означает разрыв соединения
+        self.inbound: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def accept(self, subprotocol: str | None = None) -> None:
+        self.accepted = True
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data: str) -> None:
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.sent.append(data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.sent_bytes.append(data)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.close_code = code
+
+    async def receive_text(self) -> str:
+        frame = await self.inbound.get()
+        if frame is None:
+            raise WebSocketDisconnect()
+        return frame
+
+    def responses(self) -> list[dict]:
+        frames = [json.loads(m) for m in self.sent]
+        return [f for f in frames if f["type"] == "response"]
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> None:
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_delivers_to_all_connections():
+    """Test a broadcast reaches every socket in the game and no others"""
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(3)]
+    connections = [await manager.connect(ws, 1) for ws in sockets]
+    other = FakeWebSocket()
+    await manager.connect(other, 2)
+
+    await manager.broadcast_to_game({"type": "player_move", "steps": 1}, 1)
+    for connection in connections:
+        await connection.queue.join()
+
+    for ws in sockets:
+        assert [json.loads(m) for m in ws.sent] == [
+            {"type": "player_move", "steps": 1, "seq": 1}
+        ]
+    assert other.sent == []
+
+    manager.disconnect(sockets[0], 1)
+    assert len(manager.active_connections[1]) == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_dropped():
+    """Test a client that cannot keep up is disconnected without delaying others"""
+    manager = ConnectionManager(max_queue_size=2)
+    fast = FakeWebSocket()
+    slow = FakeWebSocket(send_delay=10)
+    fast_connection = await manager.connect(fast, 1)
+    await manager.connect(slow, 1)
+
+    for step in range(5):
+        await manager.broadcast_to_game({"type": "player_move", "steps": step}, 1)
+        await asyncio.sleep(0)
+    await fast_connection.queue.join()
+    await asyncio.sleep(0)
+
+    assert len(fast.sent) == 5
+    assert slow.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert manager.active_connections[1] == {fast_connection}
+
+
+@pytest.mark.asyncio
+async def test_broadcast_crosses_workers_through_pubsub():
+    """Test events published on one worker reach sockets held by another"""
+    from app.core.pubsub import InProcessPubSub
+    from app.services.websocket_service import game_channel
+
+    pubsub = InProcessPubSub()
+    worker_a = ConnectionManager(pubsub=pubsub)
+    worker_b = ConnectionManager(pubsub=pubsub)
+
+    ws_a = FakeWebSocket()
+    ws_b = FakeWebSocket()
+    connection_a = await worker_a.connect(ws_a, 1)
+    connection_b = await worker_b.connect(ws_b, 1)
+
+    await worker_a.broadcast_to_game({"type": "game_started"}, 1)
+    await connection_a.queue.join()
+    await connection_b.queue.join()
+
+    assert len(ws_a.sent) == 1
+    assert len(ws_b.sent) == 1
+
+    # Последний локальный сокет уходит - воркер отписывается от канала
+    worker_b.disconnect(ws_b, 1)
+    await asyncio.sleep(0)
+    assert len(pubsub._handlers[game_channel(1)]) == 1
+
+
+@pytest.mark.asyncio
+async def test_websocket_rpc_move(test_user, db_session, monkeypatch):
+    """Test an authenticated socket makes moves and gets replies by request id"""
+    from app.api.v1.games import game_websocket
+    from app.core.security import create_access_token
+    from app.services.game_service import game_service
+    from app.services.wikipedia_service import wikipedia_service
+    from tests.conftest import TestSessionLocal
+    from tests.test_game import _create_started_game
+
+    async def is_link_valid(from_article: str, to_article: str) -> bool:
+        return True
+
+    async def get_article_links(title: str, limit: int = 500) -> list[str]:
+        return [f"{title} link"]
+
+    monkeypatch.setattr(wikipedia_service, "is_link_valid", is_link_valid)
+    monkeypatch.setattr(wikipedia_service, "get_article_links", get_article_links)
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+    ws = FakeWebSocket()
+    token = create_access_token(test_user.id)
+    endpoint = asyncio.create_task(game_websocket(ws, game_id, TestSessionLocal, token))
+
+    frames = [
+        {"id": 1, "type": "available_links"},
+        {"id": 2, "type": "move", "article": "Middle"},
+        {"id": 3, "type": "move"},
+        {"id": 4, "type": "ping"},
+    ]
+    for number, frame in enumerate(frames, start=1):
+        await ws.inbound.put(json.dumps(frame))
+        await _wait_for(lambda n=number: len(ws.responses()) == n)
+
+    # Ход не через этот сокет (HTTP или другая вкладка)
+    await game_service.make_move(db_session, game_id, test_user.id, "Other")
+    await ws.inbound.put(json.dumps({"id": 5, "type": "available_links"}))
+    await _wait_for(lambda: len(ws.responses()) == 5)
+    await ws.inbound.put(None)
+    await endpoint
+
+    responses = {r["id"]: r for r in ws.responses()}
+    assert responses[1]["result"]["available_links"] == ["Start link"]
+    assert responses[2]["ok"]
+    assert responses[2]["result"]["current_article"] == "Middle"
+    assert responses[2]["result"]["steps_count"] == 1
+    assert responses[3] == {
+        "type": "response",
+        "id": 3,
+        "ok": False,
+        "result": None,
+        "error": "Не указана статья",
+    }
+    assert responses[4]["result"] == {"pong": True}
+    assert responses[5]["result"]["available_links"] == ["Other link"]
+
+    # Ход разослан всем сокетам игры
+    moves = [json.loads(m) for m in ws.sent if '"player_move"' in m]
+    assert moves[0]["article"] == "Middle"
+
+
+@pytest.mark.asyncio
+async def test_websocket_rpc_requires_auth(test_user, db_session):
+    """Test anonymous sockets cannot move and invalid tokens are rejected"""
+    from app.api.v1.games import game_websocket
+    from tests.conftest import TestSessionLocal
+    from tests.test_game import _create_started_game
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+
+    rejected = FakeWebSocket()
+    await game_websocket(rejected, game_id, TestSessionLocal, "invalid")
+    assert rejected.close_code == 1008
+    assert not rejected.accepted
+
+    ws = FakeWebSocket()
+    endpoint = asyncio.create_task(game_websocket(ws, game_id, TestSessionLocal, None))
+    await ws.inbound.put(json.dumps({"id": 1, "type": "move", "article": "Target"}))
+    await _wait_for(lambda: len(ws.responses()) == 1)
+    await ws.inbound.put(None)
+    await endpoint
+
+    assert ws.responses()[0]["error"] == "Требуется авторизация"
+
+
+@pytest.mark.asyncio
+async def test_websocket_does_not_hold_db_connections(tmp_path):
+    """Test many open sockets leave the pool free for HTTP requests"""
+    from httpx import ASGITransport, AsyncClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.api.v1.games import game_websocket
+    from app.core.database import Base, get_db
+    from app.main import app
+    from app.models.game import Game
+    from app.models.user import User
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        pool_size=2,
+        max_overflow=0,
+        pool_timeout=1,
+    )
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        user = User(username="pool", email="pool@example.com", hashed_password="x")
+        session.add(user)
+        await session.flush()
+        game = Game(
+            mode="single",
+            start_article="Start",
+            target_article="Target",
+            max_steps=10,
+            time_limit=600,
+            max_players=1,
+            creator_id=user.id,
+        )
+        session.add(game)
+        await session.commit()
+        game_id = game.id
+
+    sockets = [FakeWebSocket() for _ in range(20)]
+    endpoints = [
+        asyncio.create_task(game_websocket(ws, game_id, session_factory, None))
+        for ws in sockets
+    ]
+    await _wait_for(lambda: all(ws.accepted for ws in sockets))
+
+    assert engine.pool.checkedout() == 0
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            for _ in range(5):
+                response = await client.get(f"/api/v1/games/{game_id}")
+                assert response.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+        for ws in sockets:
+            await ws.inbound.put(None)
+        await asyncio.gather(*endpoints)
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_events():
+    """Test a reconnecting client receives only events after its last seq"""
+    from app.core.pubsub import InProcessPubSub
+
+    manager = ConnectionManager(pubsub=InProcessPubSub(history_size=5))
+    for step in range(1, 4):
+        await manager.broadcast_to_game({"type": "player_move", "steps": step}, 1)
+
+    async def load_snapshot() -> dict:
+        raise AssertionError("snapshot is not needed")
+
+    ws = FakeWebSocket()
+    connection = await manager.connect(ws, 1, resuming=True)
+    await manager.resume(ws, 1, 1, load_snapshot)
+    await manager.broadcast_to_game({"type": "player_move", "steps": 4}, 1)
+    await connection.queue.join()
+
+    assert [json.loads(m)["seq"] for m in ws.sent] == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_resume_falls_back_to_snapshot():
+    """Test a gap larger than the ring buffer is covered by a snapshot"""
+    from app.core.pubsub import InProcessPubSub
+
+    manager = ConnectionManager(pubsub=InProcessPubSub(history_size=5))
+    for step in range(1, 9):
+        await manager.broadcast_to_game({"type": "player_move", "steps": step}, 1)
+
+    async def load_snapshot() -> dict:
+        return {"id": 1, "status": "in_progress", "participants": []}
+
+    ws = FakeWebSocket()
+    connection = await manager.connect(ws, 1, resuming=True)
+    await manager.resume(ws, 1, 2, load_snapshot)
+    await connection.queue.join()
+
+    assert [json.loads(m) for m in ws.sent] == [
+        {
+            "type": "snapshot",
+            "seq": 8,
+            "game": {"id": 1, "status": "in_progress", "participants": []},
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_redis_pubsub_publishes_events_in_one_script_call():
+    """Test seq, history and publish go to Redis as a single atomic script"""
+    from app.core.pubsub import RedisPubSub
+
+    class ScriptClient:
+        """Redis double running the publish script logic in Python"""
+
+        def __init__(self):
+            self.calls: list[tuple[list, list]] = []
+            self.seq = 0
+
+        def pubsub(self):
+            return None
+
+        def register_script(self, script: str):
+            async def run(keys: list, args: list) -> int:
+                self.calls.append((keys, args))
+                self.seq += 1
+                return self.seq
+
+            return run
+
+    client = ScriptClient()
+    pubsub = RedisPubSub(client, history_size=5, history_ttl=60)
+
+    assert await pubsub.publish_event("game:1", {"type": "game_started"}) == 1
+    [(keys, args)] = client.calls
+    assert keys == ["game:1:seq", "game:1:history"]
+    prefix, history_size, history_ttl, channel = args
+    # Скрипт дописывает номер и закрывающую скобку к префиксу
+    assert json.loads(f"{prefix}1}}") == {"type": "game_started", "seq": 1}
+    assert (history_size, history_ttl, channel) == (5, 60, "game:1")
+
+
+@pytest.mark.asyncio
+async def test_websocket_resume_sends_game_snapshot(test_user, db_session):
+    """Test the endpoint answers an unknown since with a compact snapshot"""
+    from app.api.v1.games import game_websocket
+    from tests.conftest import TestSessionLocal
+    from tests.test_game import _create_started_game
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+
+    ws = FakeWebSocket()
+    endpoint = asyncio.create_task(
+        game_websocket(ws, game_id, TestSessionLocal, None, since=5)
+    )
+    await _wait_for(lambda: len(ws.sent) == 1)
+    await ws.inbound.put(None)
+    await endpoint
+
+    snapshot = json.loads(ws.sent[0])
+    assert snapshot["type"] == "snapshot"
+    assert snapshot["game"]["participants"] == [
+        {
+            "username": "testuser",
+            "current_article": "Start",
+            "steps_count": 0,
+            "is_finished": False,
+        }
+    ]
+
+
+@pytest.mark.asyncio
+async def test_moves_are_batched_per_tick():
+    """Test batched games send one moves_batch per tick and flush before a win"""
+    manager = ConnectionManager()
+    ws = FakeWebSocket()
+    connection = await manager.connect(ws, 1)
+
+    for step in range(3):
+        await manager.notify_player_move(1, f"player{step}", "A", 1, batch_tick_ms=50)
+    assert ws.sent == []
+
+    await _wait_for(lambda: len(ws.sent) == 1)
+    batch = json.loads(ws.sent[0])
+    assert batch["type"] == "moves_batch"
+    assert [move["username"] for move in batch["moves"]] == [
+        "player0",
+        "player1",
+        "player2",
+    ]
+
+    # Победа отправляется сразу, накопленный ход уходит перед ней
+    await manager.notify_player_move(1, "player0", "Target", 2, batch_tick_ms=50)
+    await manager.notify_player_won(1, "player0", time=10, steps=2)
+    await connection.queue.join()
+
+    assert [json.loads(m)["type"] for m in ws.sent[1:]] == ["moves_batch", "player_won"]
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_reaps_silent_connections():
+    """Test connections that miss pongs are closed and live ones get a ping"""
+    from app.services.websocket_service import HEARTBEAT_TIMEOUT_CLOSE_CODE
+
+    manager = ConnectionManager(heartbeat_interval=0.01, max_missed_pongs=2)
+    silent = FakeWebSocket()
+    alive = FakeWebSocket()
+    await manager.connect(silent, 1)
+    alive_connection = await manager.connect(alive, 1)
+
+    await asyncio.sleep(0.03)
+    manager.touch(alive)
+    await manager.heartbeat()
+    await alive_connection.queue.join()
+    await asyncio.sleep(0)
+
+    assert silent.close_code == HEARTBEAT_TIMEOUT_CLOSE_CODE
+    assert [json.loads(m) for m in alive.sent] == [{"type": "ping"}]
+    assert manager.metrics()["wikirush_ws_connections"] == 1
+    assert manager.metrics()["wikirush_ws_reaped_total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_finished_game_rooms_are_closed():
+    """Test rooms of finished games and their event history are cleaned up"""
+    from app.core.pubsub import InProcessPubSub
+
+    pubsub = InProcessPubSub()
+    manager = ConnectionManager(pubsub=pubsub, finished_room_ttl=0)
+    ws = FakeWebSocket()
+    await manager.connect(ws, 1)
+    await manager.broadcast_to_game({"type": "game_started"}, 2)
+
+    await manager.notify_game_finished(1)
+    await manager.heartbeat()
+    await asyncio.sleep(0)
+
+    assert ws.close_code == 1000
+    assert manager.active_connections == {}
+    assert manager.metrics()["wikirush_ws_rooms"] == 0
+
+    # История игры без подписчиков удаляется по простою
+    assert await pubsub.prune(max_idle=0) == 1
+    assert await pubsub.get_history("wikirush:game:2") == []
+
+
+@pytest.mark.asyncio
+async def test_finished_game_rooms_are_closed_on_every_worker():
+    """Test game_finished published on one worker closes rooms on the others"""
+    from app.core.pubsub import InProcessPubSub
+
+    pubsub = InProcessPubSub()
+    worker_a = ConnectionManager(pubsub=pubsub, finished_room_ttl=0)
+    worker_b = ConnectionManager(pubsub=pubsub, finished_room_ttl=0)
+    ws_a = FakeWebSocket()
+    ws_b = FakeWebSocket()
+    await worker_a.connect(ws_a, 1)
+    await worker_b.connect(ws_b, 1)
+
+    await worker_a.broadcast_to_game({"type": "player_move", "article": "x"}, 1)
+    assert worker_b._finished_at == {}
+
+    await worker_a.notify_game_finished(1)
+    await worker_a.heartbeat()
+    await worker_b.heartbeat()
+    await asyncio.sleep(0)
+
+    assert ws_a.close_code == 1000
+    assert ws_b.close_code == 1000
+    assert worker_b.active_connections == {}
+
+
+@pytest.mark.asyncio
+async def test_last_winning_move_finishes_game_room(
+    client, auth_headers, test_user, test_achievements, db_session, monkeypatch
+):
+    """Test the last winning move finishes the game and schedules its room cleanup"""
+    from app.models.game import Game, GameStatus
+    from app.services.websocket_service import websocket_manager
+    from app.services.wikipedia_service import wikipedia_service
+    from tests.test_game import _create_started_game
+
+    async def is_link_valid(from_article: str, to_article: str) -> bool:
+        return True
+
+    monkeypatch.setattr(wikipedia_service, "is_link_valid", is_link_valid)
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+    ws = FakeWebSocket()
+    await websocket_manager.connect(ws, game_id)
+
+    try:
+        response = await client.post(
+            f"/api/v1/games/{game_id}/move",
+            json={"article": "Target"},
+            headers=auth_headers,
+        )
+        assert response.json()["is_target_reached"]
+        await _wait_for(lambda: any('"game_finished"' in m for m in ws.sent))
+        assert game_id in websocket_manager._finished_at
+
+        db_session.expire_all()
+        game = await db_session.get(Game, game_id)
+        assert game.status == GameStatus.FINISHED.value
+        assert game.finished_at is not None
+    finally:
+        websocket_manager.disconnect(ws, game_id)
+
+
+@pytest.mark.asyncio
+async def test_finish_game_closes_room_but_start_does_not(
+    test_user, test_achievements, db_session
+):
+    """Test only finish_game (not start_game) schedules the room for cleanup"""
+    from app.models.game import GameStatus
+    from app.services.game_service import game_service
+    from app.services.websocket_service import websocket_manager
+    from tests.test_game import _create_started_game
+
+    game, _ = await _create_started_game(db_session, test_user.id)
+    game_id = game.id
+    game.status = GameStatus.WAITING.value
+    await db_session.commit()
+
+    ws = FakeWebSocket()
+    await websocket_manager.connect(ws, game_id)
+    try:
+        await game_service.start_game(db_session, game_id)
+        assert game_id not in websocket_manager._finished_at
+
+        await game_service.finish_game(db_session, game_id)
+        assert game_id in websocket_manager._finished_at
+    finally:
+        websocket_manager.disconnect(ws, game_id)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client):
+    """Test connection gauges are exported in Prometheus text format"""
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE wikirush_ws_connections gauge" in response.text
+    assert "wikirush_ws_outbound_queued_bytes " in response.text
+    assert "# TYPE wikirush_ws_reaped_total counter" in response.text
+
+
+@pytest.mark.asyncio
+async def test_msgpack_subprotocol_gets_compact_frames():
+    """Test msgpack clients get coded arrays without text, JSON clients get JSON"""
+    import msgpack
+
+    from app.services.ws_protocol import MSGPACK_SUBPROTOCOL, negotiate
+
+    manager = ConnectionManager()
+    compact = FakeWebSocket(subprotocols=["wikirush.msgpack.v1", "wikirush.json.v1"])
+    verbose = FakeWebSocket()
+    subprotocol = negotiate(compact.scope["subprotocols"])
+    assert subprotocol == MSGPACK_SUBPROTOCOL
+
+    compact_connection = await manager.connect(compact, 1, subprotocol=subprotocol)
+    verbose_connection = await manager.connect(verbose, 1)
+    assert compact.subprotocol == MSGPACK_SUBPROTOCOL
+
+    await manager.notify_player_joined(1, "alice")
+    await manager.notify_player_move(1, "alice", "Статья", 1)
+    await manager.notify_player_move(1, "alice", "Цель", 2, batch_tick_ms=50)
+    await manager.flush_moves(1)
+    await compact_connection.queue.join()
+    await verbose_connection.queue.join()
+
+    assert [msgpack.unpackb(frame) for frame in compact.sent_bytes] == [
+        [1, 1, "alice"],
+        [3, 2, "alice", "Статья", 1],
+        [4, 3, [["alice", "Цель", 2]]],
+    ]
+    assert compact.sent == []
+    assert json.loads(verbose.sent[0])["message"] == "alice присоединился к игре"
+    assert sum(map(len, compact.sent_bytes)) * 2 < sum(
+        len(m.encode()) for m in verbose.sent
+    )
+
+
+@pytest.mark.asyncio
+async def test_achievements_are_pushed_to_the_player(
+    test_user, test_achievements, db_session, monkeypatch
+):
+    """Test achievements granted by a winning move reach the player's socket"""
+    from app.api.v1.games import game_websocket
+    from app.core.security import create_access_token
+    from app.services.wikipedia_service import wikipedia_service
+    from tests.conftest import TestSessionLocal
+    from tests.test_game import _create_started_game
+
+    async def is_link_valid(from_article: str, to_article: str) -> bool:
+        return True
+
+    monkeypatch.setattr(wikipedia_service, "is_link_valid", is_link_valid)
+
+    user_id = test_user.id
+    game, _ = await _create_started_game(db_session, user_id)
+    game_id = game.id
+
+    ws = FakeWebSocket()
+    token = create_access_token(user_id)
+    endpoint = asyncio.create_task(game_websocket(ws, game_id, TestSessionLocal, token))
+    await ws.inbound.put(json.dumps({"id": 1, "type": "move", "article": "Target"}))
+    # Единственный игрок дошел до цели - ход завершает игру
+    await _wait_for(lambda: any('"game_finished"' in m for m in ws.sent))
+    await ws.inbound.put(None)
+    await endpoint
+
+    unlocked = [json.loads(m) for m in ws.sent if '"achievement_unlocked"' in m]
+    assert [event["code"] for event in unlocked] == ["first_win", "first_game"]
+    assert unlocked[0]["points"] == 15